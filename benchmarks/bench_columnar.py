@@ -0,0 +1,90 @@
+"""
+Benchmark of whole-guild score recomputes.
+
+Scores every user of a synthetic guild with the reference scoring functions, the single-pass
+breakdown, and the columnar engine with and without NumPy. The guild has a few prolific
+posters and a long tail of occasional ones, each post with a handful of reactions. Before
+timing, the totals of every engine are checked against the reference functions.
+
+Usage: python -m benchmarks.bench_columnar [--users N] [--posts N] [--repeat R]
+"""
+
+import argparse
+import math
+import random
+import timeit
+from datetime import datetime, timedelta, timezone
+
+from leaderboard_manager.columnar import ColumnarScores, np
+from leaderboard_manager.config import CONTENT_TYPES, REACTION_POINTS
+from leaderboard_manager.models import Post, User
+from leaderboard_manager.scoring import calculate_score_breakdown, calculate_total_score
+
+REACTION_TYPES = list(REACTION_POINTS) + ['curator_pick']
+
+
+def build_users(n_users, n_posts, seed=0):
+    """Build ``n_users`` users sharing ``n_posts`` posts, with about 5 reactions per post."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    users = [User(f"user{index}") for index in range(n_users)]
+    # Pareto weights give a few prolific posters and a long tail
+    weights = [rng.paretovariate(1.2) for _ in users]
+    for user in rng.choices(users, weights, k=n_posts):
+        post = Post(rng.choice(CONTENT_TYPES[1:]), now - timedelta(hours=rng.expovariate(1 / 48)))
+        for _ in range(rng.randint(0, 10)):
+            post.add_reaction(rng.choice(REACTION_TYPES), rng.randrange(n_users))
+        user.add_post(post)
+    return users
+
+
+def check(users, columns, use_numpy, now):
+    """Assert that the columnar totals match `calculate_total_score` for every user."""
+    columns.use_numpy = use_numpy
+    totals = columns.scores(now=now)
+    for user in users:
+        expected = calculate_total_score(user, now=now)
+        assert math.isclose(totals[user.username], expected, rel_tol=1e-9, abs_tol=1e-9), \
+            f"{user.username}: columnar total {totals[user.username]} != reference {expected}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--posts', type=int, default=200_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    users = build_users(args.users, args.posts)
+    reactions = sum(len(post.reactions) for user in users for post in user.posts)
+    print(f"{len(users)} users, {args.posts} posts, {reactions} reactions")
+
+    started = timeit.default_timer()
+    columns = ColumnarScores.from_users(users, use_numpy=False)
+    print(f"{'building the columns':>24}: {timeit.default_timer() - started:8.3f} s")
+
+    now = datetime.now(timezone.utc)
+    for use_numpy in (False, True) if np is not None else (False,):
+        check(users, columns, use_numpy, now)
+    print(f"{'totals':>24}: match the reference functions")
+
+    def columnar(use_numpy):
+        columns.use_numpy = use_numpy
+        return columns.breakdown()
+
+    candidates = {
+        'reference functions': lambda: [calculate_total_score(user) for user in users],
+        'single-pass breakdown': lambda: [calculate_score_breakdown(user) for user in users],
+        'columnar, pure Python': lambda: columnar(False),
+    }
+    if np is not None:
+        candidates['columnar, NumPy'] = lambda: columnar(True)
+    else:
+        print("NumPy is not installed; skipping the NumPy engine")
+    for name, function in candidates.items():
+        best = min(timeit.repeat(function, number=1, repeat=args.repeat))
+        print(f"{name:>24}: {best:8.3f} s, {best / len(users) * 1e6:8.2f} us/user")
+
+
+if __name__ == '__main__':
+    main()
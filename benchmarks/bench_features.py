@@ -0,0 +1,106 @@
+"""
+Micro-benchmark of message feature extraction.
+
+Times ``ingest.classify_content``, which the crawl runs on every message, and compares the URL
+counter it relies on (leaderboard_manager.features.count_urls) against the previous
+``URL_PATTERN.findall`` over every message. The corpus is shaped like the messages of sharing
+channels: mostly short chat, some links, some markdown-wrapped or multiple links, a few long
+messages, and attachments on some of them.
+
+Usage: python -m benchmarks.bench_features [--messages N] [--repeat R]
+"""
+
+import argparse
+import random
+import re
+import timeit
+
+from leaderboard_manager.features import URL_PATTERN, count_urls
+from leaderboard_manager.ingest import classify_content
+from leaderboard_manager.tests.mock_data import FakeAttachment
+
+# The pattern the cog used before the feature extractor
+OLD_URL_PATTERN = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+
+WORDS = ("look at this new piece I made last night, what do you think? the colours came out "
+         "really nice and I tried a new brush for the shading on the sky lol :sparkles: <@1234> "
+         "omg this is amazing!! love it so much").split()
+LINKS = [
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://open.spotify.com/track/4uLU6hMCjMI75M1A2tKUQC?si=abc123",
+    "https://twitter.com/someone/status/1712345678901234567",
+    "https://cdn.discordapp.com/attachments/1137690004097880146/1155522318202851460/image.png",
+    "http://example.com/gallery/2023/10/index.html#top",
+]
+# Fraction of messages with attachments, and the attachments they carry
+ATTACHMENT_FRACTION = 0.2
+ATTACHMENTS = [
+    FakeAttachment('image.png', 'image/png', 'https://cdn.discordapp.com/image.png'),
+    FakeAttachment('clip.mov', None, 'https://cdn.discordapp.com/clip.mov'),
+    FakeAttachment('project.zip', 'application/zip', 'https://cdn.discordapp.com/project.zip'),
+]
+
+
+def build_corpus(size, seed=0):
+    """Build ``size`` message contents with a realistic mix of chat and links."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        words = rng.choices(WORDS, k=rng.randint(1, 25))
+        kind = rng.random()
+        if kind < 0.65:
+            pass
+        elif kind < 0.85:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(LINKS))
+        elif kind < 0.92:
+            words.append(f"<{rng.choice(LINKS)}>")
+        elif kind < 0.97:
+            words.append(f"[my stuff]({rng.choice(LINKS)}) and {rng.choice(LINKS)}")
+        else:
+            words = rng.choices(WORDS, k=300)
+        corpus.append(" ".join(words))
+    return corpus
+
+
+def build_messages(corpus, seed=0):
+    """Pair the contents of a corpus with the attachments of their messages."""
+    rng = random.Random(seed)
+    return [(content, [rng.choice(ATTACHMENTS)] if rng.random() < ATTACHMENT_FRACTION else [])
+            for content in corpus]
+
+
+def old_count_urls(content):
+    return len(OLD_URL_PATTERN.findall(content))
+
+
+def plain_count_urls(content):
+    return len(URL_PATTERN.findall(content))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--messages', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages)
+    candidates = {
+        'old pattern': old_count_urls,
+        'new pattern': plain_count_urls,
+        'new pattern + pre-check': count_urls,
+    }
+    for name, function in candidates.items():
+        best = min(timeit.repeat(lambda: [function(content) for content in corpus],
+                                 number=1, repeat=args.repeat))
+        urls = sum(function(content) for content in corpus)
+        print(f"{name:>24}: {best / len(corpus) * 1e9:8.1f} ns/message, {urls} URLs")
+
+    messages = build_messages(corpus)
+    best = min(timeit.repeat(lambda: [classify_content(content, attachments) for content, attachments in messages],
+                             number=1, repeat=args.repeat))
+    posts = sum(classify_content(content, attachments) is not None for content, attachments in messages)
+    print(f"{'classify_content':>24}: {best / len(messages) * 1e9:8.1f} ns/message, {posts} posts")
+
+
+if __name__ == '__main__':
+    main()
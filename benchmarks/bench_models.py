@@ -0,0 +1,88 @@
+"""
+Memory benchmark of the post and reaction models.
+
+Builds the same posts and reactions with the previous plain classes, with the slotted models
+of leaderboard_manager.models, and with the slotted models packing reactions into a
+ReactionArray, and reports the memory each takes per reaction as measured by tracemalloc.
+Reactor ids are drawn from a shared pool of user ids, so their int objects are not counted.
+
+Usage: python -m benchmarks.bench_models [--posts N] [--reactions R]
+"""
+
+import argparse
+import gc
+import random
+import tracemalloc
+from datetime import datetime, timezone
+
+from leaderboard_manager.config import CONTENT_TYPES
+from leaderboard_manager.models import REACTION_TYPE_NAMES, Post
+
+
+class LegacyPost:
+    """The post model before slots and interning."""
+
+    def __init__(self, content_type, timestamp):
+        self.content_type = content_type
+        self.timestamp = timestamp
+        self.reactions = []
+
+    def add_reaction(self, reaction_type, reactor):
+        self.reactions.append(LegacyReaction(reaction_type, reactor))
+
+
+class LegacyReaction:
+    def __init__(self, type, reactor):
+        self.type = type
+        self.reactor = reactor
+
+
+def build_posts(post_class, n_posts, n_reactions, seed=0, **options):
+    rng = random.Random(seed)
+    reactors = [rng.getrandbits(60) for _ in range(1000)]
+    timestamp = datetime.now(timezone.utc)
+    posts = []
+    for _ in range(n_posts):
+        post = post_class(rng.choice(CONTENT_TYPES), timestamp, **options)
+        for _ in range(n_reactions):
+            post.add_reaction(rng.choice(REACTION_TYPE_NAMES), rng.choice(reactors))
+        posts.append(post)
+    return posts
+
+
+def measure(build):
+    """Return the bytes allocated by ``build()`` that are still held by its result."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--posts', type=int, default=20_000)
+    parser.add_argument('--reactions', type=int, default=20, help='Reactions per post')
+    args = parser.parse_args()
+
+    total = args.posts * args.reactions
+    # The cost of the posts alone is subtracted, leaving the cost of their reactions
+    candidates = {
+        'plain classes': (LegacyPost, {}),
+        'slotted': (Post, {}),
+        'slotted + ReactionArray': (Post, {'compact': True}),
+    }
+    baseline = None
+    for name, (post_class, options) in candidates.items():
+        empty = measure(lambda: build_posts(post_class, args.posts, 0, **options))
+        full = measure(lambda: build_posts(post_class, args.posts, args.reactions, **options))
+        per_reaction = (full - empty) / total
+        baseline = baseline or per_reaction
+        print(f"{name:>24}: {per_reaction:6.1f} bytes/reaction ({baseline / per_reaction:4.1f}x), "
+              f"{empty / args.posts:6.1f} bytes/post")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark of event loop lag during board rebuilds.
+
+Builds a synthetic guild with one large channel, then rebuilds its monthly and all-time boards
+inline and through the worker pool while a probe task measures how late the event loop wakes
+it up. The boards of both runs must match, and the pooled run must keep the worst lag below
+``--max-lag`` seconds.
+
+Usage: python -m benchmarks.bench_offload [--users N] [--posts N] [--workers N] [--max-lag S]
+"""
+
+import argparse
+import asyncio
+import gc
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+from leaderboard_manager.buckets import DAY_SLOTS, SECONDS_PER_DAY
+from leaderboard_manager.config import CONTENT_TYPES, REACTION_POINTS
+from leaderboard_manager.guild import GuildState
+from leaderboard_manager.ingest import PostBatch
+from leaderboard_manager.models import Post
+from leaderboard_manager.offload import Offloader
+
+REACTION_TYPES = list(REACTION_POINTS) + ['curator_pick']
+CHANNEL_ID = 1
+# Seconds the probe sleeps between two wake-ups
+PROBE_INTERVAL = 0.001
+
+
+def build_state(n_users, n_posts, seed=0):
+    """Build a guild whose only channel has ``n_users`` users sharing ``n_posts`` posts."""
+    rng = random.Random(seed)
+    now = time.time()
+    users = [f"user{index}" for index in range(n_users)]
+    weights = [rng.paretovariate(1.2) for _ in users]
+    batch = PostBatch()
+    for message_id, user in enumerate(rng.choices(users, weights, k=n_posts)):
+        timestamp = now - rng.uniform(0, DAY_SLOTS * SECONDS_PER_DAY)
+        post = Post(rng.choice(CONTENT_TYPES[1:]), datetime.fromtimestamp(timestamp, timezone.utc), compact=True)
+        for _ in range(rng.randint(0, 6)):
+            post.add_reaction(rng.choice(REACTION_TYPES), rng.randrange(n_users))
+        batch.append(message_id, CHANNEL_ID, user, post)
+    state = GuildState(0, [])
+    state.ingest(batch)
+    return state
+
+
+async def probe(lags, stop):
+    """Record how late every wake-up of a short sleep comes, until ``stop`` is set."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - started - PROBE_INTERVAL)
+
+
+async def measure(build):
+    """Run ``build`` under the probe and return its result, duration and the recorded lags."""
+    lags = []
+    stop = asyncio.Event()
+    task = asyncio.create_task(probe(lags, stop))
+    await asyncio.sleep(PROBE_INTERVAL)
+    started = time.perf_counter()
+    result = await build()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await task
+    return result, elapsed, sorted(lags)
+
+
+def report(name, elapsed, lags):
+    worst = lags[-1] if lags else 0.0
+    p99 = lags[int(len(lags) * 0.99)] if lags else 0.0
+    print(f"{name:<18} {elapsed:8.3f}s  max lag {worst * 1000:8.1f}ms  p99 lag {p99 * 1000:8.1f}ms")
+    return worst
+
+
+async def run(args):
+    started = time.perf_counter()
+    state = build_state(args.users, args.posts)
+    # Full collections of the synthetic state would show up as lag in both runs alike
+    gc.freeze()
+    channel_key = f"<#{CHANNEL_ID}>"
+    print(f"{len(state.data[channel_key])} users, {args.posts} posts, built in {time.perf_counter() - started:.1f}s")
+
+    offloader = Offloader(args.workers, min_users=0)
+    # Start the workers up front, so that the first pooled run does not pay for it
+    await asyncio.get_running_loop().run_in_executor(offloader._executor(), time.sleep, 0)
+    passed = True
+    try:
+        for days in (30, None):
+            name = 'alltime' if days is None else f'{days}d'
+
+            async def inline():
+                return state.get_board(channel_key, days)
+
+            state.boards = {}
+            inline_board, elapsed, lags = await measure(inline)
+            report(f"{name} inline", elapsed, lags)
+            state.boards = {}
+            pooled_board, elapsed, lags = await measure(lambda: offloader.build_board(state, channel_key, days))
+            worst = report(f"{name} pooled", elapsed, lags)
+
+            if inline_board.scores != pooled_board.scores or list(inline_board.order) != list(pooled_board.order):
+                print(f"{name}: the pooled board differs from the inline board")
+                passed = False
+            if worst > args.max_lag:
+                print(f"{name}: pooled lag {worst * 1000:.1f}ms is over {args.max_lag * 1000:.1f}ms")
+                passed = False
+    finally:
+        offloader.shutdown()
+    print("PASS" if passed else "FAIL")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=50_000)
+    parser.add_argument('--posts', type=int, default=500_000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--max-lag', type=float, default=0.05)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == '__main__':
+    main()
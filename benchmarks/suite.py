@@ -0,0 +1,263 @@
+"""
+Benchmark suite of the scoring and leaderboard paths.
+
+Runs every case on synthetic guilds of several sizes (in messages) generated by
+leaderboard_manager.tests.mock_data, and records for each the best and median time over
+``--repeat`` runs and the peak memory allocated by one more run, traced with tracemalloc.
+Nothing connects to Discord: the cog crawls fake channels and answers fake contexts.
+
+Results are written as JSON with ``--output``. With ``--compare``, they are checked against
+a stored baseline and the run fails if any case got slower or hungrier than ``--threshold``
+allows.
+
+Usage: python -m benchmarks.suite [--sizes 1000,10000,100000] [--repeat N] [--only SUBSTRING]
+       [--output FILE] [--compare BASELINE] [--threshold FRACTION]
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+# The cog reads its configuration when it is created
+os.environ['LEADERBOARD_DB'] = ':memory:'
+os.environ['LEADERBOARD_WORKERS'] = '0'
+os.environ.setdefault('LEADERBOARD_CURATOR_ROLE', 'Curator')
+
+from cogs.leaderboard import Leaderboards  # noqa: E402
+from leaderboard_manager import scoring  # noqa: E402
+from leaderboard_manager.cache import RenderCache  # noqa: E402
+from leaderboard_manager.guild import READY  # noqa: E402
+from leaderboard_manager.leaderboard import format_leaderboard, generate_leaderboard  # noqa: E402
+from leaderboard_manager.tests.mock_data import FakeUser, SyntheticGuild  # noqa: E402
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+# Differences below these are noise, whatever the ratio
+MIN_SECONDS = 0.001
+MIN_BYTES = 64 * 1024
+# Number of leaderboard pages rendered per time frame by the rendering case
+RENDERED_PAGES = 5
+
+CASES = {}
+
+
+def case(name):
+    """Register a benchmark case. The case is called with a `Fixture` and returns the callable to time."""
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+class Namespace:
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class FakeContext:
+    """Stands in for commands.Context, keeping the sent messages."""
+
+    def __init__(self, guild):
+        self.guild = guild
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(message)
+
+
+class Fixture:
+    """The synthetic guild of one size, and what the cases build from it, created on first use."""
+
+    def __init__(self, size, loop):
+        self.size = size
+        self.loop = loop
+        self.now = time.time()
+        self.guild = SyntheticGuild(size, seed=0, now=self.now)
+        self._users = None
+        self._cog = None
+
+    @property
+    def users(self):
+        if self._users is None:
+            self._users = list(self.guild.build_users().values())
+        return self._users
+
+    def new_cog(self):
+        return Leaderboards(Namespace(user=FakeUser(0, 'bot'), guilds=[]))
+
+    async def crawl(self, cog):
+        for channel in self.guild.channels:
+            await cog.get_history_of_channel(channel)
+        return cog
+
+    @property
+    def cog(self):
+        """A cog that has crawled the whole guild."""
+        if self._cog is None:
+            self._cog = self.loop.run_until_complete(self.crawl(self.new_cog()))
+            self._cog.guilds[self.guild.guild.id].status = READY
+        return self._cog
+
+    def close(self):
+        if self._cog is not None:
+            self.loop.run_until_complete(self._cog.cog_unload())
+
+
+def scoring_case(function, *args):
+    def setup(fixture):
+        users = fixture.users
+        return lambda: [function(user, *args) for user in users]
+    return setup
+
+
+for _name, _args in (('calculate_base_post_points', ()), ('calculate_reaction_points', ()),
+                     ('calculate_diversity_multiplier', ()), ('calculate_unique_reactor_bonus', ()),
+                     ('calculate_curator_bonus', ()), ('calculate_frequency_decay', ('daily',)),
+                     ('calculate_consistency_bonus', ()), ('calculate_total_score', ('weekly',)),
+                     ('calculate_score_breakdown', ('weekly',))):
+    case(f"scoring.{_name}")(scoring_case(getattr(scoring, _name), *_args))
+
+
+@case('leaderboard.generate_leaderboard')
+def generate_case(fixture):
+    users = fixture.users
+    return lambda: [format_leaderboard(generate_leaderboard(users, timeframe)) for timeframe in ('weekly', 'alltime')]
+
+
+@case('cog.get_history_of_channel')
+def crawl_case(fixture):
+    async def crawl():
+        cog = await fixture.crawl(fixture.new_cog())
+        await cog.cog_unload()
+    return lambda: fixture.loop.run_until_complete(crawl())
+
+
+@case('cog.leaderboard')
+def render_case(fixture):
+    cog = fixture.cog
+    state = cog.guilds[fixture.guild.guild.id]
+    context = FakeContext(fixture.guild.guild)
+    channel_key = f"<#{fixture.guild.channels[0].id}>"
+
+    async def render():
+        # Every run renders its pages anew instead of answering from the cache
+        state.rendered = RenderCache()
+        for time_frame in ('weekly', 'alltime'):
+            for page in range(1, RENDERED_PAGES + 1):
+                flags = Namespace(time_frame=time_frame, channel_name=channel_key, page=page)
+                await cog.leaderboard.callback(cog, context, flags=flags)
+        context.sent.clear()
+
+    # Build the boards up front; the case measures rendering
+    fixture.loop.run_until_complete(render())
+    return lambda: fixture.loop.run_until_complete(render())
+
+
+def measure(run, repeat):
+    """Time ``run`` ``repeat`` times, then trace the peak memory of one more run."""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    run()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return {'seconds_min': min(timings), 'seconds_median': statistics.median(timings), 'peak_bytes': peak}
+
+
+def run_suite(sizes, repeat, only=None):
+    results = []
+    loop = asyncio.new_event_loop()
+    try:
+        for size in sizes:
+            fixture = Fixture(size, loop)
+            try:
+                for name, setup in CASES.items():
+                    if only and only not in name:
+                        continue
+                    result = {'case': name, 'size': size, **measure(setup(fixture), repeat)}
+                    print(f"{name:<45} {size:>9} {result['seconds_min'] * 1000:11.2f}ms "
+                          f"{result['seconds_median'] * 1000:11.2f}ms {result['peak_bytes'] / 2 ** 20:9.2f}MiB")
+                    results.append(result)
+            finally:
+                fixture.close()
+    finally:
+        loop.close()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results with a baseline.
+
+    Returns
+    -------
+    list of str
+        A description of every regression: a case whose best time or peak memory grew by more
+        than ``threshold`` (a fraction) and by more than the noise floor.
+    """
+
+    previous = {(result['case'], result['size']): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        base = previous.get((result['case'], result['size']))
+        if base is None:
+            continue
+        for key, floor, unit, scale in (('seconds_min', MIN_SECONDS, 'ms', 1000),
+                                        ('peak_bytes', MIN_BYTES, 'MiB', 2 ** -20)):
+            old, new = base[key], result[key]
+            if new > old * (1 + threshold) and new - old > floor:
+                regressions.append(f"{result['case']} at {result['size']}: {key} {old * scale:.2f}{unit} -> "
+                                   f"{new * scale:.2f}{unit} ({new / old - 1 if old else float('inf'):+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma separated numbers of messages")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', help="run only the cases whose name contains this")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="JSON results to compare with")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="fraction by which a case may grow before it counts as a regression")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    print(f"{'case':<45} {'size':>9} {'best':>13} {'median':>13} {'peak':>12}")
+    results = run_suite(sizes, args.repeat, args.only)
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'repeat': args.repeat,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
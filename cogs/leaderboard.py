@@ -1,156 +1,902 @@
+import asyncio
+import json
 import logging
-import re
-from collections import defaultdict
+import os
+import random
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 
-# Regex pattern to match URLs
-URL_PATTERN = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+from leaderboard_manager.buckets import day_number, parse_time_frame
+from leaderboard_manager.config import EMOJI_REACTION_TYPES, HOT_SCORE_HALF_LIFE
+from leaderboard_manager.crawler import ChannelProgress, HistoryCrawler
+from leaderboard_manager.guild import BACKFILLING, FAILED, PENDING, READY, GuildState
+from leaderboard_manager.ingest import EmojiTable, classify_content, ingest_messages
+from leaderboard_manager.metrics import REGISTRY
+from leaderboard_manager.offload import Offloader
+from leaderboard_manager.snapshots import Snapshot, format_movement, rank_movements
+from leaderboard_manager.store import MessageStore
 
+# Name of the category whose channels are tracked by the leaderboard, unless configured otherwise
+SHARING_CATEGORY = "🫶____SHARING____🫶"
 
+# Number of messages discord.py fetches per history request; messages are scored and committed a page at a time
+HISTORY_PAGE_SIZE = 100
+# Number of stored posts loaded and scored at a time when a guild starts up, between which
+# the event loop gets to run
+STORE_LOAD_PAGE_SIZE = 2000
+# Number of users shown by the leaderboard command
+LEADERBOARD_SIZE = 10
+# Number of users shown above and below the member by the rank command
+RANK_NEIGHBOURS = 2
+# Time frame of the boards ranked by hot score
+HOT_TIME_FRAME = 'hot'
+# Time frames whose boards are snapshotted, and the number of snapshots listed by the snapshots command
+SNAPSHOT_TIME_FRAMES = ('daily', 'weekly', 'monthly', 'alltime')
+SNAPSHOT_LIST_SIZE = 10
+# Seconds between two checks for boards due a snapshot
+SNAPSHOT_CHECK_INTERVAL = 600
+# Seconds between two writes of LEADERBOARD_METRICS_FILE
+METRICS_EXPORT_INTERVAL = 60
+
+
+def load_sharing_categories():
+    """Read the names of the tracked categories of every guild.
+
+    LEADERBOARD_CATEGORIES may hold a JSON object mapping guild ids to lists of category
+    names, such as ``{"123": ["Sharing"], "default": ["Art", "Music"]}``. The 'default'
+    entry applies to every guild that is not listed and falls back to SHARING_CATEGORY.
+
+    Returns
+    -------
+    dict
+        Lists of category names by guild id (as a string) and 'default'.
+    """
+    categories = {'default': [SHARING_CATEGORY]}
+    raw = os.getenv('LEADERBOARD_CATEGORIES')
+    if raw:
+        categories.update(json.loads(raw))
+    return categories
+
+
+def load_emoji_map():
+    """Read the emoji of every reaction type.
+
+    LEADERBOARD_EMOJI_MAP may hold a JSON object mapping reaction types to lists of emoji, or
+    the path of a file holding one, such as ``{"heart": ["❤️", "💖"], "wow": ["<:omg:1234>"]}``.
+    Custom emoji are given as ``<:name:id>`` or by id. Every type listed replaces the emoji
+    of that type in EMOJI_REACTION_TYPES; a file is read again on every call.
+
+    Returns
+    -------
+    dict
+        Lists of emoji by reaction type.
+    """
+    mapping = dict(EMOJI_REACTION_TYPES)
+    raw = os.getenv('LEADERBOARD_EMOJI_MAP')
+    if raw:
+        if not raw.lstrip().startswith('{'):
+            with open(raw, encoding='utf-8') as file:
+                raw = file.read()
+        mapping.update(json.loads(raw))
+    return mapping
+
+
+# Without a channel_name, commands are about the channel they are sent in, or the first tracked
+# channel of the guild when that one is not tracked
 class LeaderboardFlags(commands.FlagConverter):
     time_frame: str = commands.flag(default='daily', description='The time frame to display the leaderboard for')
-    channel_name: str = commands.flag(default='<#1137690004097880146>',
-                                      description='The channel to display the leaderboard for')
+    channel_name: Optional[str] = commands.flag(default=None, description='The channel to display the leaderboard for')
+    page: int = commands.flag(default=1, description='The page of the leaderboard to display')
+
+
+class RankFlags(commands.FlagConverter):
+    time_frame: str = commands.flag(default='daily', description='The time frame to look up the rank in')
+    channel_name: Optional[str] = commands.flag(default=None, description='The channel to look up the rank in')
+    around: int = commands.flag(default=RANK_NEIGHBOURS, description='The number of users to show above and below')
+
+
+class SnapshotFlags(commands.FlagConverter):
+    time_frame: str = commands.flag(default='weekly', description='The time frame of the snapshots to list')
+    channel_name: Optional[str] = commands.flag(default=None, description='The channel of the snapshots to list')
 
 
 class Leaderboards(commands.Cog):
     def __init__(self, client):
         self.client = client
-        self.data = {
-            'daily': {},
-            'weekly': {},
-            'monthly': {}
-        }
+        self.categories = load_sharing_categories()
+        # guild id -> GuildState
+        self.guilds = {}
+        # guild id -> task backfilling the guild
+        self.backfills = {}
+        # shard id -> number of disconnections so far; a crawl spanning one may have missed messages
+        self.disconnects = Counter()
+        self.store = MessageStore(os.getenv('LEADERBOARD_DB', 'leaderboard.db'))
+        # Fraction of scored posts that are logged, at INFO level so that the bot's logging shows them
+        self.debug_sample = float(os.getenv('LEADERBOARD_DEBUG_SAMPLE', '0'))
+        # Whose reactions backfills look up, at one request per emoji of every message: 'all'
+        # (for the unique reactor bonus), 'curator' for the curator pick emoji only (for the
+        # curator bonus) or 'none'. Other reactions are recorded from their counts alone.
+        fetch_reactors = os.getenv('LEADERBOARD_FETCH_REACTORS', 'curator').lower()
+        self.fetch_reactors = {'1': 'all', '0': 'none'}.get(fetch_reactors, fetch_reactors)
+        # Name of the role whose members' picks earn the curator bonus
+        self.curator_role = os.getenv('LEADERBOARD_CURATOR_ROLE')
+        # Reaction types by emoji, recompiled by the emoji command; the table it replaced is
+        # kept so that removals of reactions it typed still find them
+        self.emoji_table = EmojiTable(load_emoji_map())
+        self.previous_emoji_table = None
+        self.metrics_file = os.getenv('LEADERBOARD_METRICS_FILE')
+        # Half-life of the hot scores, in hours; 0 turns the hot boards off
+        half_life = float(os.getenv('LEADERBOARD_HOT_HALF_LIFE', HOT_SCORE_HALF_LIFE / 3600))
+        self.half_life = half_life * 3600 if half_life > 0 else None
+        # Hours between two snapshots of every board; 0 takes none
+        self.snapshot_interval = float(os.getenv('LEADERBOARD_SNAPSHOT_INTERVAL', '24')) * 3600
+        # (guild id, channel_key, time_frame) -> (snapshot id, taken at, {user: rank}) of the
+        # latest snapshot of a board, or None if it has none
+        self.latest_snapshots = {}
+        # Worker processes that rebuild large boards off the event loop; 0 rebuilds them inline
+        self.offloader = Offloader(int(os.getenv('LEADERBOARD_WORKERS', '2')))
+        self.score_seconds = REGISTRY.histogram('leaderboard_score_seconds', 'Time spent scoring one page of messages')
+        self.command_seconds = REGISTRY.histogram('leaderboard_command_seconds',
+                                                  'Time spent answering the leaderboard command')
+        REGISTRY.add_collector(self.collect_metrics)
+
+    async def cog_load(self):
+        if self.metrics_file:
+            self.export_metrics.start()
+        if self.snapshot_interval > 0:
+            self.take_snapshots.start()
+
+    async def cog_unload(self):
+        self.export_metrics.cancel()
+        self.take_snapshots.cancel()
+        REGISTRY.remove_collector(self.collect_metrics)
+        for task in self.backfills.values():
+            task.cancel()
+        self.offloader.shutdown()
+        self.store.close()
+
+    def collect_metrics(self, registry):
+        """Refresh the gauges derived from the state of every guild."""
+        hits = sum(state.rendered.hits for state in self.guilds.values())
+        misses = sum(state.rendered.misses for state in self.guilds.values())
+        registry.gauge('leaderboard_render_cache_hits', 'Leaderboard pages served from the cache').set(hits)
+        registry.gauge('leaderboard_render_cache_misses', 'Leaderboard pages rendered').set(misses)
+        registry.gauge('leaderboard_render_cache_hit_ratio', 'Share of leaderboard pages served from the cache').set(
+            hits / (hits + misses) if hits + misses else 0.0)
+        registry.gauge('leaderboard_scored_messages', 'Messages currently scored').set(
+            sum(len(state.messages) for state in self.guilds.values()))
+        registry.gauge('leaderboard_guilds', 'Guilds with leaderboard state').set(len(self.guilds))
+
+    @tasks.loop(seconds=METRICS_EXPORT_INTERVAL)
+    async def export_metrics(self):
+        REGISTRY.write(self.metrics_file)
+
+    @tasks.loop(seconds=SNAPSHOT_CHECK_INTERVAL)
+    async def take_snapshots(self):
+        """Snapshot every board of a fully backfilled guild whose latest snapshot is older than the interval."""
+        now = time.time()
+        taken = 0
+        for state in list(self.guilds.values()):
+            if state.status != READY:
+                continue
+            for channel_key in list(state.data):
+                for time_frame in SNAPSHOT_TIME_FRAMES:
+                    latest = self.latest_snapshot(state.guild_id, channel_key, time_frame)
+                    if latest is not None and now - latest[1] < self.snapshot_interval:
+                        continue
+                    board = await self.offloader.build_board(state, channel_key, parse_time_frame(time_frame))
+                    if not len(board):
+                        continue
+                    snapshot = Snapshot.from_board(board, now)
+                    snapshot_id = self.store.save_snapshot(state.guild_id, channel_key, time_frame, snapshot)
+                    self.latest_snapshots[(state.guild_id, channel_key, time_frame)] = (
+                        snapshot_id, now, snapshot.rank_map())
+                    taken += 1
+        if taken:
+            self.store.commit()
+            logging.info(f"Took {taken} leaderboard snapshots")
+
+    def latest_snapshot(self, guild_id, channel_key, time_frame):
+        """Return ``(snapshot id, taken at, {user: rank})`` of the latest snapshot of a board, or None."""
+        key = (guild_id, channel_key, time_frame)
+        if key not in self.latest_snapshots:
+            found = self.store.latest_snapshot(guild_id, channel_key, time_frame)
+            self.latest_snapshots[key] = (found[0], found[1].taken_at, found[1].rank_map()) if found else None
+        return self.latest_snapshots[key]
+
+    def get_state(self, guild_id):
+        """Return the state of a guild, creating it if needed."""
+        state = self.guilds.get(guild_id)
+        if state is None:
+            categories = self.categories.get(str(guild_id), self.categories['default'])
+            state = self.guilds[guild_id] = GuildState(guild_id, categories, self.half_life)
+        return state
+
+    def tracked_state(self, guild_id, channel_id, event=None):
+        """Return the state of a guild if the channel is tracked in it, otherwise None.
+
+        While the stored messages of the guild are being loaded, an ``event`` given as a
+        ``(listener, payload)`` pair is deferred until they are, and None is returned: the
+        message it is about may not be loaded yet.
+        """
+        state = self.guilds.get(guild_id)
+        if state is None or channel_id not in state.channels:
+            return None
+        if event is not None and state.deferred is not None:
+            state.deferred.append(event)
+            return None
+        return state
 
     @commands.Cog.listener()
     async def on_ready(self):
+        """Start the backfills that on_shard_ready has not started.
+
+        Every shard has caught its guilds up by the time the bot is ready, so the channels are
+        not cleared again here; guilds whose backfill is running or complete are left alone.
+        """
         logging.info(f'{self.client.user} has connected to Discord!')
-        guilds = list(self.client.guilds)
-        guild = guilds[0]
-        categories = list(guild.categories)
-        for category in categories:
-            if category.name != "🫶____SHARING____🫶":
+        for guild in self.client.guilds:
+            self.start_backfill(guild)
+
+    @commands.Cog.listener()
+    async def on_shard_ready(self, shard_id):
+        """Start backfilling the guilds of a shard as soon as it is ready, without waiting for the others."""
+        logging.info(f"Shard {shard_id} is ready")
+        for guild in self.client.guilds:
+            if guild.shard_id == shard_id:
+                self.catch_up(guild)
+
+    @commands.Cog.listener()
+    async def on_shard_disconnect(self, shard_id):
+        """Hold the checkpoints of the guilds of a shard back until their channels are crawled again.
+
+        Events of a session that is not resumed are never delivered, so messages sent while
+        the shard is disconnected only come back through a crawl. Until it has run, live
+        messages must not move the checkpoints past them.
+        """
+        self.disconnects[shard_id] += 1
+        for guild in self.client.guilds:
+            if guild.shard_id == shard_id and guild.id in self.guilds:
+                self.guilds[guild.id].caught_up.clear()
+
+    @commands.Cog.listener()
+    async def on_shard_resumed(self, shard_id):
+        """Catch the guilds of a shard up again after its session was resumed.
+
+        A resumed session replays the events that were missed, but the channels lost track
+        of the present on disconnecting and nothing else crawls them again; the crawl only
+        fetches the messages after their checkpoints.
+        """
+        logging.info(f"Shard {shard_id} resumed")
+        for guild in self.client.guilds:
+            if guild.shard_id == shard_id:
+                self.catch_up(guild)
+
+    def catch_up(self, guild):
+        """Backfill a guild, or crawl what it missed when it was backfilled in an earlier session.
+
+        on_shard_ready fires when Discord starts a new session of a shard, after which the
+        events sent in the meantime are not delivered; the channels are crawled from their
+        checkpoints to fetch them. on_shard_resumed catches up the channels that lost track of
+        the present on disconnecting.
+        """
+        state = self.guilds.get(guild.id)
+        if state is not None:
+            state.caught_up.clear()
+        self.start_backfill(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild):
+        self.start_backfill(guild)
+
+    def start_backfill(self, guild):
+        """Backfill a guild in a background task, unless it is running or has completed.
+
+        Only the channels that are not caught up are crawled, from their stored checkpoints:
+        a backfill that was cancelled or failed resumes where it stopped, and a completed one
+        only crawls again the channels that lost track of the present, see `on_shard_disconnect`.
+
+        Returns
+        -------
+        bool
+            Whether a backfill was started.
+        """
+        task = self.backfills.get(guild.id)
+        if task is not None and not task.done():
+            return False
+        state = self.get_state(guild.id)
+        if state.status == READY and state.channels.keys() <= state.caught_up:
+            return False
+        task = self.backfills[guild.id] = asyncio.create_task(self.backfill_guild(guild))
+        task.add_done_callback(lambda done: self.backfill_done(state, done))
+        return True
+
+    def cancel_backfill(self, guild_id):
+        """Cancel the running backfill of a guild, if any. Returns whether one was cancelled."""
+        task = self.backfills.get(guild_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    @staticmethod
+    def backfill_done(state, task):
+        """Settle the status of a guild once its backfill task has finished."""
+        if task.cancelled():
+            logging.info(f"Backfill of guild {state.guild_id} cancelled")
+            state.status = PENDING
+        elif task.exception() is not None:
+            logging.error(f"Backfill of guild {state.guild_id} failed. Reason: {task.exception()}")
+            state.status = PENDING
+        elif state.channels.keys() - state.caught_up:
+            logging.warning(f"Backfill of guild {state.guild_id} left channels partially crawled")
+            state.status = FAILED
+        else:
+            logging.info(f"Backfill of guild {state.guild_id} done")
+            state.status = READY
+
+    async def backfill_guild(self, guild):
+        """Track the channels of a guild's sharing categories and crawl their history."""
+        state = self.get_state(guild.id)
+        state.status = BACKFILLING
+        channels = []
+        for category in guild.categories:
+            if category.name not in state.categories:
                 continue
-            logging.info(f"Found category: {category.name}")
-            channels = list(category.channels)
-            for channel in channels:
-                # self.data['daily'][channel.name] = {}
-                # self.data['weekly'][channel.name] = {}
-                # self.data['monthly'][channel.name] = {}
-                #
-                # logging.info(f"Channel: {channel}")
-                # logging.info(f"Channel name: {channel.name}")
-                # logging.info(f"Channel type: {channel.type}")
-                # logging.info(f"Channel id: {channel.id}")
-
-                contained = dir(channel)
-                logging.info(f"Channel contains: {contained}")
+            logging.info(f"Found category: {category.name} in {guild.name}")
+            for channel in category.channels:
+                # Forum channels have no history of their own, only their threads do
+                if not isinstance(channel, discord.abc.Messageable):
+                    continue
                 logging.info(f"Found channel: {channel.name}")
-                result = await self.get_history_of_channel(channel)
-                channel_key = "<#" + str(channel.id) + ">"
-                self.data['daily'][channel_key] = result
-                self.data['weekly'][channel_key] = result
-                self.data['monthly'][channel_key] = result
-                logging.info(f"Result: {self.data}")
+                self.track_channel(channel)
+                channels.append(channel)
+        if not state.loaded:
+            await self.load_stored_messages(state, channels)
+            state.loaded = True
+        # Channels may lose track of the present again during the crawl, when the bot is
+        # disconnected; they are crawled again until every channel either caught up or failed
+        while True:
+            pending = [channel for channel in channels if channel.id not in state.caught_up]
+            if not pending:
+                break
+            state.crawler = HistoryCrawler()
+            progress = await state.crawler.crawl(pending, self.get_history_of_channel)
+            failed = [channel.name for channel in pending if progress[channel.id].error is not None]
+            if failed:
+                logging.warning(f"Channels of guild {guild.id} left partially crawled: {', '.join(failed)}")
+                break
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        if message.guild is None:
+            return
+        state = self.tracked_state(message.guild.id, message.channel.id)
+        if state is None:
+            return
+        await self.ingest_page(state, [message])
+        # Until the channel's backfill has finished, the checkpoint must only be moved by the
+        # backfill itself, or an interrupted crawl would skip the rest of the history.
+        if message.channel.id in state.caught_up:
+            self.store.set_checkpoint(message.channel.id, message.id)
+        self.store.commit()
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload):
+        """Re-score an edited message.
+
+        The raw variant of ``on_message_edit`` is used so that edits of messages that
+        fell out of the client's message cache are still picked up. A message that did not
+        share anything before the edit is scored as a new post.
+        """
+        state = self.tracked_state(payload.guild_id, payload.channel_id, (self.on_raw_message_edit, payload))
+        if state is None:
+            return
+        message = payload.message
+        if payload.message_id not in state.messages:
+            await self.ingest_page(state, [message])
+        else:
+            content_type = classify_content(message.content, message.attachments)
+            state.edit_message(payload.message_id, content_type)
+            if content_type is None:
+                self.store.delete_messages([payload.message_id])
+            else:
+                self.store.update_content(payload.message_id, content_type)
+        self.store.commit()
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        state = self.tracked_state(payload.guild_id, payload.channel_id, (self.on_raw_message_delete, payload))
+        if state is not None and state.remove_messages([payload.message_id]):
+            self.store.delete_messages([payload.message_id])
+            self.store.commit()
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        state = self.tracked_state(payload.guild_id, payload.channel_id, (self.on_raw_bulk_message_delete, payload))
+        if state is None:
+            return
+        self.store.delete_messages(state.remove_messages(payload.message_ids))
+        self.store.commit()
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        state = self.tracked_state(payload.guild_id, payload.channel_id, (self.on_raw_reaction_add, payload))
+        if state is None:
+            return
+        kind = self.emoji_table.reaction_type(payload.emoji, payload.burst, self.is_curator(payload.member))
+        reactor = payload.user_id if self.looks_up_reactors(payload.emoji) else None
+        if state.add_reaction(payload.message_id, kind, reactor):
+            self.store.add_reaction(payload.message_id, kind, reactor)
+            self.store.commit()
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        state = self.tracked_state(payload.guild_id, payload.channel_id, (self.on_raw_reaction_remove, payload))
+        if state is None:
+            return
+        # The member is not part of removal events, so the reaction may have been a curator pick
+        if payload.burst:
+            kinds = {'super'}
+        else:
+            kinds = set(self.emoji_table.lookup(payload.emoji))
+            if self.previous_emoji_table is not None:
+                kinds.update(self.previous_emoji_table.lookup(payload.emoji))
+        reaction = state.remove_reaction(payload.message_id, payload.user_id, kinds)
+        if reaction is not None:
+            self.store.remove_reaction(payload.message_id, reaction.type, reaction.reactor)
+            self.store.commit()
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear(self, payload):
+        state = self.tracked_state(payload.guild_id, payload.channel_id, (self.on_raw_reaction_clear, payload))
+        if state is not None and state.replace_reactions(payload.message_id) is not None:
+            self.store.replace_reactions(payload.message_id)
+            self.store.commit()
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear_emoji(self, payload):
+        """Rescore the reactions of a message after one of its emoji was cleared.
+
+        Several emoji may share a reaction type, so the reactions of the cleared emoji cannot
+        be told apart from the others by their type; the message is fetched again and all its
+        reactions are rescored instead.
+        """
+        state = self.tracked_state(payload.guild_id, payload.channel_id, (self.on_raw_reaction_clear_emoji, payload))
+        if state is None or payload.message_id not in state.messages:
+            return
+        try:
+            message = await state.channels[payload.channel_id].fetch_message(payload.message_id)
+        except discord.HTTPException as error:
+            logging.warning(f"Could not fetch message {payload.message_id} to rescore its reactions: {error}")
+            return
+        # Reactors are looked up for the same emoji as in backfills, which are the ones whose
+        # live reactions recorded theirs
+        batch = await ingest_messages([message], None, self.get_reactors, self.is_curator, self.emoji_table)
+        post = state.replace_reactions(payload.message_id, batch.posts[0].reactions if batch.posts else ())
+        if post is None:
+            # The message was deleted while it was fetched
+            return
+        self.store.replace_reactions(payload.message_id, post.reactions)
+        self.store.commit()
 
     @commands.command(name='leaderboard')
+    @commands.guild_only()
     async def leaderboard(self, ctx, *, flags: LeaderboardFlags):
-        time_frame = flags.time_frame
-        channel_name = flags.channel_name
         """
         Command to display the leaderboard.
         """
-        logging.info('Received leaderboard command!')
-
-        # # Define mock data for each time frame and channel
-        # mock_data = {
-        #     'daily': {
-        #         '<#1155522318202851460>': {'@User1': 10, '@User2': 9, '@User3': 8},
-        #         '#music': {'@User4': 15, '@User5': 12},
-        #         '#art-and-photography': {'@User6': 20, '@User7': 18},
-        #     },
-        #     'weekly': {
-        #         '<#1155522318202851460>': {'@User1': 100, '@User2': 90, '@User3': 85},
-        #         '#music': {'@User4': 150, '@User5': 120},
-        #         '#art-and-photography': {'@User6': 200, '@User7': 180},
-        #     },
-        #     'monthly': {
-        #         '<#1155522318202851460>': {'@User1': 400, '@User2': 350, '@User3': 300},
-        #         '#music': {'@User4': 500, '@User5': 480},
-        #         '#art-and-photography': {'@User6': 600, '@User7': 580},
-        #     }
-        # }
-
-        logging.info(f"Time frame: {time_frame}")
-        logging.info(f"Channel name: {channel_name}")
+        started = time.perf_counter()
+        logging.debug('Received leaderboard command!')
 
-        # Validate time frame and channel name
-        if time_frame.lower() not in self.data:
-            await ctx.send("Invalid time frame. Please choose 'daily', 'weekly', or 'monthly'.")
-            return
-        logging.info(f"AAAAA {self.data[time_frame.lower()]=}")
-        logging.info(f"AAAAA {channel_name.lower()=}")
-        if channel_name.lower() not in self.data[time_frame.lower()]:
-            valid_channels = list(self.data[time_frame.lower()].keys())
-            await ctx.send("Invalid channel name. Please choose one of the following: " + ", ".join(valid_channels))
+        state = self.get_state(ctx.guild.id)
+        time_frame = flags.time_frame
+        channel_name = self.channel_of(ctx, state, flags.channel_name)
+        logging.debug(f"Time frame: {time_frame}")
+        logging.debug(f"Channel name: {channel_name}")
+
+        board = await self.find_board(ctx, state, time_frame, channel_name)
+        if board is None:
             return
 
-        # Fetch and sort the appropriate data
-        selected_data = self.data[time_frame.lower()][channel_name.lower()]
-        sorted_data = {k: v for k, v in sorted(selected_data.items(), key=lambda item: item[1], reverse=True)}
+        page = max(flags.page, 1)
+        # Ranks are compared with the latest snapshot of the board, if it has any
+        latest = None
+        if time_frame.lower() in SNAPSHOT_TIME_FRAMES:
+            latest = self.latest_snapshot(state.guild_id, channel_name.lower(), time_frame.lower())
+        key = (time_frame.lower(), channel_name.lower(), page, latest and latest[0])
+        message = state.rendered.get(key, board.version)
+        if message is None:
+            # Create the leaderboard message
+            start = (page - 1) * LEADERBOARD_SIZE
+            lines = [f"🏆 **{time_frame.capitalize()} Leaderboard for {channel_name}** 🏆"]
+            if page > 1:
+                lines[0] += f" (page {page})"
+            for user, points in board.top(LEADERBOARD_SIZE, start):
+                # Tied users share a rank, as in the rank command and the snapshots
+                rank = board.rank_of(user)
+                line = f"{rank}. **{user}**: {points:g} points"
+                if latest is not None:
+                    previous = latest[2].get(user)
+                    line += " " + format_movement(None if previous is None else previous - rank)
+                lines.append(line.rstrip())
+            message = "\n".join(lines) + "\n"
+            state.rendered.put(key, board.version, message)
 
-        # Create the leaderboard message
-        names = list(sorted_data.keys())
-        values = list(sorted_data.values())
-        message = f"🏆 **{time_frame.capitalize()} Leaderboard for {channel_name}** 🏆\n"
-        for i in range(len(names)):
-            message += f"{i + 1}. **{names[i]}**: {values[i]} points\n"
+        if state.status != READY:
+            # Boards are live but the history has not been fully processed; say so
+            message += f"⏳ *Partial results. {state.describe_backfill()}*\n"
 
+        self.command_seconds.observe(time.perf_counter() - started)
         await ctx.send(message)
 
         # await ctx.send(content="Here's the leaderboard:", file=file)
 
-    async def get_history_of_channel(self, channel):
-        """Fetch and process the entire message history of a specific channel.
+    @commands.command(name='rank')
+    @commands.guild_only()
+    async def rank(self, ctx, member: Optional[discord.Member] = None, *, flags: RankFlags):
+        """
+        Command to show where a member (by default yourself) stands on a leaderboard.
+        """
+        member = member or ctx.author
+        state = self.get_state(ctx.guild.id)
+        channel_name = self.channel_of(ctx, state, flags.channel_name)
+        board = await self.find_board(ctx, state, flags.time_frame, channel_name)
+        if board is None:
+            return
+
+        user = member.name
+        rank = board.rank_of(user)
+        if rank is None:
+            await ctx.send(f"**{user}** has no points on the {flags.time_frame} leaderboard for "
+                           f"{channel_name} yet.")
+            return
+        lines = [f"📊 **{user}** is ranked #{rank} of {len(board)} on the {flags.time_frame} leaderboard "
+                 f"for {channel_name}"]
+        # Capped like the page size of the leaderboard command, so the message stays within Discord's limit
+        around = min(max(flags.around, 0), LEADERBOARD_SIZE)
+        for neighbour_rank, neighbour, points in board.users_around(user, around):
+            line = f"{neighbour_rank}. **{neighbour}**: {points:g} points"
+            lines.append(f"{line} ⬅️" if neighbour == user else line)
+        message = "\n".join(lines) + "\n"
+        if state.status != READY:
+            message += f"⏳ *Partial results. {state.describe_backfill()}*\n"
+        await ctx.send(message)
+
+    @staticmethod
+    def channel_of(ctx, state, channel_name):
+        """Return the channel a command is about: the one named, else the channel the command was
+        sent in if it is tracked, else the first tracked channel of the guild ('' if it has none)."""
+        if channel_name:
+            return channel_name
+        channel_key = f"<#{ctx.channel.id}>"
+        if channel_key in state.data:
+            return channel_key
+        return next(iter(state.data), "")
+
+    async def find_board(self, ctx, state, time_frame, channel_name):
+        """Return the board of a time frame and channel, or explain to the user why there is none.
+
+        Returns
+        -------
+        Board or None
+            The board, or None if the guild has no data yet or the time frame or channel is
+            invalid, in which case a message has been sent.
+        """
+        if state.status == PENDING and not state.data:
+            await ctx.send("The leaderboard is still starting up, please try again shortly.")
+            return None
+
+        # Validate time frame and channel name
+        hot = time_frame.lower() == HOT_TIME_FRAME and state.half_life is not None
+        if not hot:
+            try:
+                days = parse_time_frame(time_frame)
+            except ValueError:
+                frames = "'daily', 'weekly', 'monthly', 'alltime'" + (", 'hot'" if state.half_life is not None else "")
+                await ctx.send(f"Invalid time frame. Please choose {frames} or a number of days such as '14d'.")
+                return None
+        if channel_name.lower() not in state.data:
+            valid_channels = list(state.data.keys())
+            await ctx.send("Invalid channel name. Please choose one of the following: " + ", ".join(valid_channels))
+            return None
+        if hot:
+            return state.get_hot_board(channel_name.lower())
+        return await self.offloader.build_board(state, channel_name.lower(), days)
+
+    async def get_history_of_channel(self, channel, progress=None):
+        """Fetch and process the message history of a specific channel.
+
+        The history is walked oldest first, starting after the channel's stored checkpoint,
+        so a restart only fetches the messages posted since the last shutdown. Messages are
+        scored a history page at a time through :meth:`ingest_page`, and the checkpoint is
+        committed together with the scored page.
+
+        Messages that already arrived through the live listeners while the history was
+        being walked are not counted twice.
 
         Parameters
         ----------
         channel : discord.TextChannel
             The channel whose message history we want to fetch and process.
+        progress : ChannelProgress, optional
+            Progress tracker of the crawl, provided by the `HistoryCrawler` running it.
+
+        Returns
+        -------
+        dict
+            The all-time score in the channel of every user who posted in the fetched messages,
+            sorted from highest to lowest.
         """
-        user_scores = defaultdict(int)  # A dictionary to keep track of each user's score
+        state = self.get_state(channel.guild.id)
+        users = set()
+        disconnects = self.disconnects[channel.guild.shard_id]
 
-        async for message in channel.history(limit=None):
-            # Ignore messages from the bot itself
-            if message.author == self.client.user:
-                continue
+        if progress is None:
+            progress = ChannelProgress(channel.name)
+        # Channel names repeat across guilds and change over time; ids do neither
+        labels = {'guild': channel.guild.id, 'channel': channel.id}
+        crawled = REGISTRY.counter('leaderboard_crawled_messages_total', 'Messages fetched by backfills', **labels)
+        crawl_rate = REGISTRY.gauge('leaderboard_crawl_messages_per_second', 'Backfill throughput', **labels)
+        checkpoint = self.store.get_checkpoint(channel.id)
+        after = discord.Object(id=checkpoint) if checkpoint is not None else None
+        progress.begin(checkpoint if checkpoint is not None else channel.id, channel.last_message_id)
+        page = []
+        async for message in channel.history(limit=None, after=after, oldest_first=True):
+            page.append(message)
+            progress.advance(message.id)
+            crawled.inc()
+            if len(page) == HISTORY_PAGE_SIZE:
+                users.update((await self.ingest_page(state, page)).authors)
+                self.store.set_checkpoint(channel.id, message.id)
+                self.store.commit()
+                crawl_rate.set(progress.rate)
+                page = []
+                await progress.page_done()
+        if page:
+            users.update((await self.ingest_page(state, page)).authors)
+            self.store.set_checkpoint(channel.id, page[-1].id)
+        self.store.commit()
+        crawl_rate.set(progress.rate)
+        if self.disconnects[channel.guild.shard_id] == disconnects:
+            state.caught_up.add(channel.id)
+        logging.info(f"Fetched {progress.fetched} new messages from {channel.name}")
+
+        channel_data = state.data.get("<#" + str(channel.id) + ">", {})
+        today = day_number(time.time())
+        scores = {user: channel_data[user].score(None, today) for user in users if user in channel_data}
+        return dict(sorted(scores.items(), key=lambda item: item[1], reverse=True))
+
+    def track_channel(self, channel):
+        """Start scoring live traffic in a channel and create its (empty) boards."""
+        state = self.get_state(channel.guild.id)
+        state.channels[channel.id] = channel
+        channel_key = "<#" + str(channel.id) + ">"
+        state.data.setdefault(channel_key, {})
+
+    async def load_stored_messages(self, state, channels):
+        """Rebuild the boards of the given channels of a guild from the posts in the store.
+
+        Posts are loaded and scored STORE_LOAD_PAGE_SIZE at a time, yielding to the event loop
+        in between. Live events about existing messages are deferred meanwhile and handled
+        once every post is loaded, or once loading stopped: the events about the posts loaded
+        so far still apply.
+        """
+        channel_ids = [channel.id for channel in channels]
+        loaded = 0
+        after = None
+        state.deferred = []
+        try:
+            while True:
+                batch = self.store.load_posts(channel_ids, after, STORE_LOAD_PAGE_SIZE)
+                if not batch:
+                    break
+                loaded += len(state.ingest(batch))
+                after = batch.message_ids[-1]
+                await asyncio.sleep(0)
+        except BaseException:
+            logging.warning(f"Loading the stored posts of guild {state.guild_id} stopped after {loaded} posts; "
+                            f"replaying {len(state.deferred)} deferred events")
+            raise
+        else:
+            logging.info(f"Loaded {loaded} stored posts of guild {state.guild_id}")
+        finally:
+            deferred, state.deferred = state.deferred, None
+            for listener, payload in deferred:
+                try:
+                    await listener(payload)
+                except Exception as e:
+                    logging.error(f"Failed to handle a deferred {listener.__name__} event. Reason: {e}")
 
-            user = message.author.name  # You can also use `message.author.id` if you want a unique identifier
-
-            # Check for attachments (images, etc.)
-            if message.attachments:
-                user_scores[user] += len(message.attachments)
-                for attachment in message.attachments:
-                    logging.info(f"Found attachment: {attachment.url}")
-
-            # Check for URLs using regex
-            urls = URL_PATTERN.findall(message.content)
-            if urls:
-                user_scores[user] += len(urls)
-                logging.info(f"Found URLs: {urls}")
-
-            # Check for reactions
-            if message.reactions:
-                for reaction in message.reactions:
-                    # Assume each reaction counts as 1 point for the user who posted the message
-                    user_scores[user] += reaction.count
-                    logging.info(f"Found reaction: {reaction.emoji} x {reaction.count}")
-
-        # Now user_scores contains the scores for each user
-        sorted_scores = {k: v for k, v in sorted(user_scores.items(), key=lambda item: item[1], reverse=True)}
-        return sorted_scores
+    async def ingest_page(self, state, messages):
+        """Score a page of messages and persist the posts among them.
+
+        Messages are turned into posts by the leaderboard_manager ingest pipeline and
+        scored with the rules of leaderboard_manager.config. Messages sent by the bot, plain
+        chat and messages that are already scored are skipped. The caller is responsible for
+        committing the store.
+
+        Parameters
+        ----------
+        state : GuildState
+            The state of the guild the messages were posted in.
+        messages : list of discord.Message
+            The page of messages, such as one history page or a single live message.
+
+        Returns
+        -------
+        PostBatch
+            The posts that were added.
+        """
+        batch = await ingest_messages(messages, self.client.user, self.get_reactors, self.is_curator, self.emoji_table)
+        with self.score_seconds.time():
+            added = state.ingest(batch)
+        if self.debug_sample:
+            for message_id, user, post in zip(added.message_ids, added.authors, added.posts):
+                if random.random() < self.debug_sample:
+                    logging.info(f"Scored message {message_id} by {user}: {post.content_type} post, "
+                                  f"{len(post.reactions)} reactions")
+        self.store.save_batch(added)
+        return added
+
+    async def get_reactors(self, reaction):
+        """Return the ``(user, burst)`` pairs of everyone who reacted with a reaction, or None if not looked up."""
+        if not self.looks_up_reactors(reaction.emoji):
+            return None
+        return await self.list_reactors(reaction)
+
+    def looks_up_reactors(self, emoji):
+        """Whether the reactors of an emoji are recorded, as set by LEADERBOARD_FETCH_REACTORS.
+
+        Backfills only know the reactors they look up, so live reactions only record theirs
+        for the same emoji; the unique reactor bonus then does not depend on which reactions
+        the bot saw live.
+        """
+        if self.fetch_reactors == 'curator':
+            return self.curator_role is not None and self.emoji_table.lookup(emoji)[1] == 'curator_pick'
+        return self.fetch_reactors != 'none'
+
+    async def list_reactors(self, reaction):
+        """Return the ``(user, burst)`` pairs of everyone who reacted with a reaction."""
+        reactors = []
+        if reaction.normal_count:
+            reactors.extend([(await self.as_member(reaction, user), False)
+                             async for user in reaction.users(type=discord.ReactionType.normal)])
+        if reaction.burst_count:
+            reactors.extend([(user, True) async for user in reaction.users(type=discord.ReactionType.burst)])
+        return reactors
+
+    async def as_member(self, reaction, user):
+        """Return the member behind a user who reacted, so that their roles can be checked.
+
+        Reaction.users only yields members found in the member cache, which the bot does not
+        fill without the members intent; other reactors come as plain users without roles and
+        are looked up. Users who left the guild, and every reactor when no curator role is
+        configured, are returned as they are.
+        """
+        if self.curator_role is None or hasattr(user, 'roles'):
+            return user
+        guild = reaction.message.guild
+        member = guild.get_member(user.id)
+        if member is None:
+            try:
+                member = await guild.fetch_member(user.id)
+            except discord.HTTPException:
+                return user
+        return member
+
+    def is_curator(self, member):
+        """Whether a member holds the curator role. Without a configured role, nobody does."""
+        if self.curator_role is None or member is None:
+            return False
+        return any(role.name == self.curator_role for role in getattr(member, 'roles', ()))
+
+    @commands.command(name='snapshots')
+    @commands.guild_only()
+    async def snapshots(self, ctx, *, flags: SnapshotFlags):
+        """
+        Command to list the latest snapshots of a leaderboard.
+        """
+        time_frame = flags.time_frame.lower()
+        channel_name = self.channel_of(ctx, self.get_state(ctx.guild.id), flags.channel_name)
+        channel_key = channel_name.lower()
+        rows = self.store.list_snapshots(ctx.guild.id, channel_key, time_frame, SNAPSHOT_LIST_SIZE)
+        if not rows:
+            await ctx.send(f"No snapshots of the {time_frame} leaderboard for {channel_name} yet.")
+            return
+        lines = [f"🗂️ **Snapshots of the {time_frame} leaderboard for {channel_name}**"]
+        lines.extend(f"#{snapshot_id}: {datetime.fromtimestamp(taken_at, timezone.utc):%Y-%m-%d %H:%M} UTC"
+                     for snapshot_id, taken_at in rows)
+        lines.append("Show one with `snapshot <number>`.")
+        await ctx.send("\n".join(lines) + "\n")
+
+    @commands.command(name='snapshot')
+    @commands.guild_only()
+    async def snapshot(self, ctx, snapshot_id: int, page: int = 1):
+        """
+        Command to show a past leaderboard, with the rank movements since the snapshot before it.
+        """
+        found = self.store.load_snapshot(snapshot_id)
+        if found is None or found[0] != ctx.guild.id:
+            await ctx.send(f"There is no snapshot #{snapshot_id} in this server.")
+            return
+        _, channel_key, time_frame, snapshot = found
+        page = max(page, 1)
+        start = (page - 1) * LEADERBOARD_SIZE
+        rows = snapshot.top(LEADERBOARD_SIZE, start)
+        if not rows:
+            await ctx.send(f"Snapshot #{snapshot_id} has {len(snapshot)} users, there is no page {page}.")
+            return
+
+        previous = self.store.latest_snapshot(ctx.guild.id, channel_key, time_frame, before=snapshot.taken_at)
+        movements = rank_movements(previous[1], snapshot)[start:start + LEADERBOARD_SIZE] if previous else None
+        taken_at = datetime.fromtimestamp(snapshot.taken_at, timezone.utc)
+        lines = [f"🗂️ **{time_frame.capitalize()} Leaderboard for {channel_key}** as of {taken_at:%Y-%m-%d %H:%M} UTC"]
+        if page > 1:
+            lines[0] += f" (page {page})"
+        for index, (rank, user, points) in enumerate(rows):
+            line = f"{rank}. **{user}**: {points:g} points"
+            if movements is not None:
+                line += " " + format_movement(movements[index])
+            lines.append(line.rstrip())
+        await ctx.send("\n".join(lines) + "\n")
+
+    @commands.command(name='backfill')
+    @commands.guild_only()
+    @commands.is_owner()
+    async def backfill(self, ctx, action: str = 'status'):
+        """
+        Command to show (status), cancel (cancel) or resume (resume) the backfill of this server (owner only).
+        """
+        state = self.get_state(ctx.guild.id)
+        action = action.lower()
+        if action == 'cancel':
+            cancelled = self.cancel_backfill(ctx.guild.id)
+            await ctx.send("Backfill cancelled." if cancelled else "No backfill is running.")
+        elif action == 'resume':
+            started = self.start_backfill(ctx.guild)
+            await ctx.send("Backfill resumed." if started else "The backfill is already running or done.")
+        else:
+            await ctx.send(f"Backfill {state.status}. {state.describe_backfill()}")
+
+    @commands.command(name='emoji')
+    @commands.is_owner()
+    async def emoji(self, ctx, action: str = 'show'):
+        """
+        Command to show (show) or reload (reload) the reaction types of the emoji (owner only).
+        """
+        if action.lower() == 'reload':
+            try:
+                table = EmojiTable(load_emoji_map())
+            except (OSError, ValueError) as error:
+                await ctx.send(f"The emoji configuration was not reloaded: {error}")
+                return
+            self.previous_emoji_table, self.emoji_table = self.emoji_table, table
+            await ctx.send("Emoji configuration reloaded. Reactions already scored keep their type.")
+            return
+        lines = ["**Reaction types by emoji**"]
+        for kind, emoji_list in self.emoji_table.mapping.items():
+            if isinstance(emoji_list, (str, int)):
+                emoji_list = [emoji_list]
+            lines.append(f"{kind}: {' '.join(map(str, emoji_list)) or '-'}")
+        await ctx.send("\n".join(lines) + "\n")
+
+    @commands.command(name='metrics')
+    @commands.is_owner()
+    async def metrics(self, ctx):
+        """
+        Command to dump the bot's metrics (owner only).
+        """
+        text = REGISTRY.render()
+        # Stay within Discord's message length limit
+        if len(text) > 1900:
+            text = text[:1900] + "\n..."
+        await ctx.send(f"```\n{text}```")
 
     @commands.command()
     async def command(self, ctx):
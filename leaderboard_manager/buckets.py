@@ -0,0 +1,338 @@
+"""
+Buckets Module
+--------------
+
+This module keeps a user's activity in per-day buckets, so that the score over any recent
+window of days can be answered by summing a handful of buckets instead of filtering posts.
+
+Days are numbered since the Unix epoch, in UTC. The buckets of a user live in a ring of
+DAY_SLOTS slots: a slot is reused when a newer day maps onto it, and activity older than the
+ring only count towards the all-time totals.
+
+Every user also gets an `ActivityBitmap` of the days they posted on, from which streaks and
+active days are computed with bit operations.
+
+Functions:
+- day_number: Converts a Unix timestamp to a day number.
+- parse_time_frame: Converts a time frame name such as 'weekly' or '14d' to a number of days.
+
+Classes:
+- ActivityBitmap: The days on which a user posted, as a bitset indexed by day number.
+- DayBuckets: A ring buffer of a user's activity per day, plus their all-time totals.
+"""
+
+import re
+from array import array
+
+from .config import CONTENT_TYPES
+from .scoring import combine_score
+
+# Number of day slots kept per user; windows may span at most this many days
+DAY_SLOTS = 32
+SECONDS_PER_DAY = 86400
+
+# Named time frames and the number of days they span; None means all time
+TIME_FRAMES = {
+    'daily': 1,
+    'weekly': 7,
+    'monthly': 30,
+    'alltime': None,
+}
+DAYS_PATTERN = re.compile(r'(\d+)d')
+
+
+def day_number(timestamp):
+    """
+    Return the number of the UTC day a Unix timestamp falls on.
+
+    Parameters
+    ----------
+    timestamp : float
+        Seconds since the Unix epoch.
+
+    Returns
+    -------
+    int
+        Days since the Unix epoch.
+    """
+
+    return int(timestamp // SECONDS_PER_DAY)
+
+
+def parse_time_frame(time_frame):
+    """
+    Convert a time frame to the number of days it spans.
+
+    Parameters
+    ----------
+    time_frame : str
+        One of TIME_FRAMES, or a number of days such as '14d'.
+
+    Returns
+    -------
+    int or None
+        The number of days, or None for the all-time frame.
+
+    Raises
+    ------
+    ValueError
+        If the time frame is unknown or spans more than DAY_SLOTS days.
+    """
+
+    time_frame = time_frame.lower()
+    if time_frame in TIME_FRAMES:
+        return TIME_FRAMES[time_frame]
+    match = DAYS_PATTERN.fullmatch(time_frame)
+    if match is None:
+        raise ValueError(f"Unknown time frame: {time_frame}")
+    days = int(match.group(1))
+    if not 1 <= days <= DAY_SLOTS:
+        raise ValueError(f"Time frames must span between 1 and {DAY_SLOTS} days")
+    return days
+
+
+class ActivityBitmap:
+    """
+    The days on which a user posted, as the bits of an int indexed by day number.
+
+    Bit 0 stands for the `origin` day, the earliest day seen. The number of posts of every day
+    is kept alongside, so that a day's bit is only cleared once its last post is removed.
+    """
+
+    __slots__ = ('origin', 'bits', 'counts')
+
+    def __init__(self):
+        self.origin = None
+        self.bits = 0
+        # Posts per day since the origin
+        self.counts = array('I')
+
+    def add(self, day, sign=1):
+        """Add (or with a negative sign, remove) a post made on a given day."""
+        if self.origin is None:
+            self.origin = day
+        elif day < self.origin:
+            if sign < 0:
+                return
+            shift = self.origin - day
+            self.bits <<= shift
+            self.counts[0:0] = array('I', bytes(4 * shift))
+            self.origin = day
+        index = day - self.origin
+        if index >= len(self.counts):
+            if sign < 0:
+                return
+            self.counts.extend(array('I', bytes(4 * (index + 1 - len(self.counts)))))
+        count = max(self.counts[index] + sign, 0)
+        self.counts[index] = count
+        if count:
+            self.bits |= 1 << index
+        else:
+            self.bits &= ~(1 << index)
+
+    def active_days(self, first, last):
+        """Return the number of days between ``first`` and ``last`` (inclusive) with a post."""
+        if self.origin is None:
+            return 0
+        first = max(first - self.origin, 0)
+        last = last - self.origin
+        if last < first:
+            return 0
+        return bin((self.bits >> first) & ((1 << (last - first + 1)) - 1)).count('1')
+
+    def streak(self, today):
+        """
+        Return the number of consecutive days with a post up to ``today``.
+
+        A streak that ran until yesterday still counts while the user has not posted today.
+        """
+
+        if self.origin is None:
+            return 0
+        end = today - self.origin
+        if end < 0:
+            return 0
+        if not self.bits >> end & 1:
+            end -= 1
+            if end < 0 or not self.bits >> end & 1:
+                return 0
+        # The highest day without a post below the end of the streak bounds it
+        gaps = ~self.bits & ((1 << (end + 1)) - 1)
+        return end + 1 - gaps.bit_length()
+
+
+class DayBuckets:
+    """
+    A ring buffer of a user's activity per day, plus their all-time totals.
+
+    Every slot holds, for one day, the number of posts of each content type, the weighted sum
+    of the reactions on those posts and their number of curator picks. Distinct reactors cannot
+    be summed across days, so the days on which each reactor reacted are kept separately, and
+    the days with a post are kept in an `ActivityBitmap` for the consistency bonus.
+    """
+
+    __slots__ = ('days', 'posts', 'reaction_points', 'curator_picks',
+                 'total_posts', 'total_reaction_points', 'total_curator_picks', 'reactors', 'activity')
+
+    def __init__(self):
+        self.days = array('i', [-1] * DAY_SLOTS)
+        # Posts per slot and content type, at index slot * len(CONTENT_TYPES) + content type code
+        self.posts = array('H', bytes(2 * DAY_SLOTS * len(CONTENT_TYPES)))
+        self.reaction_points = array('d', bytes(8 * DAY_SLOTS))
+        self.curator_picks = array('H', bytes(2 * DAY_SLOTS))
+        self.total_posts = array('l', bytes(8 * len(CONTENT_TYPES)))
+        self.total_reaction_points = 0.0
+        self.total_curator_picks = 0
+        # reactor -> {day: number of reactions}
+        self.reactors = {}
+        self.activity = ActivityBitmap()
+
+    def _slot(self, day, claim):
+        """
+        Return the slot holding a day, or None if the day is older than the ring.
+
+        With ``claim``, a slot still holding a day that has fallen out of the ring is cleared
+        and handed over to the new day.
+        """
+
+        slot = day % DAY_SLOTS
+        held = self.days[slot]
+        if held == day:
+            return slot
+        if held > day or not claim:
+            return None
+        self.days[slot] = day
+        width = len(CONTENT_TYPES)
+        for index in range(slot * width, (slot + 1) * width):
+            self.posts[index] = 0
+        self.reaction_points[slot] = 0.0
+        self.curator_picks[slot] = 0
+        return slot
+
+    def add_post(self, day, content_type, sign=1):
+        """
+        Add (or with a negative sign, remove) a post made on a given day.
+
+        Parameters
+        ----------
+        day : int
+            The day number the post was made on.
+        content_type : int
+            The index of the post's content type in CONTENT_TYPES.
+        sign : int, optional
+            1 to add the post, -1 to remove it, by default 1.
+        """
+
+        self.total_posts[content_type] += sign
+        self.activity.add(day, sign)
+        slot = self._slot(day, sign > 0)
+        if slot is not None:
+            self.posts[slot * len(CONTENT_TYPES) + content_type] += sign
+
+    def add_reaction(self, day, points, reactor, curator_pick, sign=1):
+        """
+        Add (or with a negative sign, remove) a reaction on a post made on a given day.
+
+        Parameters
+        ----------
+        day : int
+            The day number the post was made on.
+        points : float
+            The weight of the reaction.
+        reactor : int or None
+            The id of the user who reacted, if known. Unknown reactors are not counted as
+            unique reactors.
+        curator_pick : bool
+            Whether the reaction is a curator pick.
+        sign : int, optional
+            1 to add the reaction, -1 to remove it, by default 1.
+        """
+
+        self.total_reaction_points += sign * points
+        self.total_curator_picks += sign * curator_pick
+        slot = self._slot(day, sign > 0)
+        if slot is not None:
+            self.reaction_points[slot] += sign * points
+            self.curator_picks[slot] += sign * curator_pick
+        if reactor is None:
+            return
+        reactor_days = self.reactors.setdefault(reactor, {})
+        count = reactor_days.get(day, 0) + sign
+        if count > 0:
+            reactor_days[day] = count
+        else:
+            reactor_days.pop(day, None)
+            if not reactor_days:
+                del self.reactors[reactor]
+
+    def __getstate__(self):
+        # The reactor days are packed into flat arrays, which pickle far smaller and faster
+        # than a dict of dicts when buckets are shipped to worker processes
+        reactors = list(self.reactors)
+        lengths = array('I', [len(self.reactors[reactor]) for reactor in reactors])
+        days = array('i')
+        counts = array('I')
+        for reactor in reactors:
+            reactor_days = self.reactors[reactor]
+            days.extend(reactor_days)
+            counts.extend(reactor_days.values())
+        return (self.days, self.posts, self.reaction_points, self.curator_picks, self.total_posts,
+                self.total_reaction_points, self.total_curator_picks, self.activity, reactors, lengths, days, counts)
+
+    def __setstate__(self, state):
+        (self.days, self.posts, self.reaction_points, self.curator_picks, self.total_posts,
+         self.total_reaction_points, self.total_curator_picks, self.activity, reactors, lengths, days,
+         counts) = state
+        self.reactors = {}
+        start = 0
+        for reactor, length in zip(reactors, lengths):
+            self.reactors[reactor] = dict(zip(days[start:start + length], counts[start:start + length]))
+            start += length
+
+    def window(self, days, today):
+        """
+        Aggregate the activity of the last ``days`` days, up to and including ``today``.
+
+        Parameters
+        ----------
+        days : int or None
+            The length of the window, at most DAY_SLOTS. None aggregates all time.
+        today : int
+            The day number of the last day of the window.
+
+        Returns
+        -------
+        tuple
+            ``(post_count, reaction_points, content_type_count, recent_post_count,
+            unique_reactor_count, curator_pick_count, streak_days)``, the arguments of
+            `scoring.combine_score`. Recent posts are the posts made on ``today``, and the
+            streak counts only the days within the window.
+        """
+
+        width = len(CONTENT_TYPES)
+        slot = today % DAY_SLOTS
+        recent = sum(self.posts[slot * width:(slot + 1) * width]) if self.days[slot] == today else 0
+        streak = self.activity.streak(today)
+        if days is None:
+            posts = self.total_posts
+            return (sum(posts), self.total_reaction_points, sum(1 for count in posts if count > 0), recent,
+                    len(self.reactors), self.total_curator_picks, streak)
+
+        first = today - days
+        posts = [0] * width
+        reaction_points = 0.0
+        curator_picks = 0
+        for slot, day in enumerate(self.days):
+            if first < day <= today:
+                for content_type in range(width):
+                    posts[content_type] += self.posts[slot * width + content_type]
+                reaction_points += self.reaction_points[slot]
+                curator_picks += self.curator_picks[slot]
+        reactors = sum(1 for reactor_days in self.reactors.values()
+                       if any(first < day <= today for day in reactor_days))
+        return (sum(posts), reaction_points, sum(1 for count in posts if count > 0), recent, reactors,
+                curator_picks, min(streak, days))
+
+    def score(self, days, today):
+        """Return the score of the user over the last ``days`` days, up to and including ``today``."""
+        return combine_score(*self.window(days, today))
@@ -0,0 +1,73 @@
+"""
+Cache Module
+------------
+
+This module caches rendered leaderboard messages, so that repeating a leaderboard command
+costs a dictionary lookup instead of a re-render.
+
+Entries are stamped with the version of the board they were rendered from. A board gets a new
+version whenever one of its scores changes, which makes every entry rendered from an older
+version stale.
+"""
+
+from collections import OrderedDict
+
+# Number of rendered messages kept before the least recently used ones are dropped
+DEFAULT_MAX_ENTRIES = 256
+
+
+class RenderCache:
+    """
+    Least recently used cache of rendered messages, validated by board versions.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        The number of entries kept, by default DEFAULT_MAX_ENTRIES.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, version):
+        """
+        Return the message cached under a key, if it was rendered from the given version.
+
+        Parameters
+        ----------
+        key : hashable
+            The key of the entry, such as ``(time_frame, channel, page)``.
+        version : int
+            The current version of the board the entry was rendered from.
+
+        Returns
+        -------
+        str or None
+            The cached message, or None on a miss.
+        """
+
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, version, message):
+        """Cache a message rendered from the given board version."""
+        self.entries[key] = (version, message)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    @property
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
@@ -0,0 +1,328 @@
+"""
+Columnar Module
+---------------
+
+This module scores every user of a guild at once from columnar storage of their posts and
+reactions, for full recomputes where walking millions of `Post` and `Reaction` objects is too
+slow.
+
+Posts are stored as parallel columns of user index, timestamp and content type code, and
+reactions as columns of post index, reaction type code and reactor code. When NumPy is
+installed the columns are grouped per user with `bincount` and `unique`; otherwise the same
+columns are scored by a pure-Python pass. Both follow the rules of leaderboard_manager.config,
+exactly like the functions of the scoring module.
+
+Classes:
+- ColumnarScores: Columnar store of posts and reactions, scoring all users at once.
+"""
+
+import time
+from array import array
+
+from .buckets import SECONDS_PER_DAY, day_number
+from .config import (
+    BASE_POST_POINT,
+    REACTION_POINTS,
+    DIVERSITY_MULTIPLIER,
+    FREQUENCY_DECAY_THRESHOLD,
+    FREQUENCY_DECAY_RATE,
+    UNIQUE_REACTOR_BONUS,
+    CURATOR_BONUS,
+    CONSISTENCY_BONUS,
+    CONSISTENCY_STREAK_DAYS)
+from .scoring import timeframe_cutoff
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the pure-Python path is used without it
+    np = None
+
+# Names of the score components, in the order of the scoring module's breakdown
+COMPONENTS = ('base_post_points', 'reaction_points', 'diversity_multiplier', 'frequency_decay',
+              'unique_reactor_bonus', 'curator_bonus', 'consistency_bonus', 'total')
+
+
+def _unique(values):
+    """
+    Return the distinct values of an integer array, sorted.
+
+    Equivalent to ``np.unique(values)``, whose hash-based implementation in recent NumPy
+    releases is several times slower than a plain sort on the large integer keys used here.
+    """
+
+    values = np.sort(values)
+    if len(values) == 0:
+        return values
+    keep = np.empty(len(values), dtype=bool)
+    keep[0] = True
+    np.not_equal(values[1:], values[:-1], out=keep[1:])
+    return values[keep]
+
+
+class ColumnarScores:
+    """
+    Posts and reactions of many users, stored column by column.
+
+    Columns are `array` buffers, which NumPy reads without copying. Content types, reaction
+    types and reactors are interned to small integer codes as they are added.
+
+    Parameters
+    ----------
+    use_numpy : bool, optional
+        Whether to score with NumPy, by default whenever it is installed.
+    """
+
+    def __init__(self, use_numpy=None):
+        self.use_numpy = np is not None if use_numpy is None else use_numpy and np is not None
+        self.usernames = []
+        self.user_codes = {}
+        self.content_type_codes = {}
+        self.reaction_type_codes = {}
+        self.reactor_codes = {}
+        # Post columns
+        self.post_user = array('i')
+        self.post_time = array('d')
+        self.post_content_type = array('h')
+        # Reaction columns
+        self.reaction_post = array('i')
+        self.reaction_type = array('h')
+        self.reaction_reactor = array('i')
+
+    @classmethod
+    def from_users(cls, users, use_numpy=None):
+        """
+        Build the columns from `User` objects.
+
+        Parameters
+        ----------
+        users : iterable of User
+            The users, with their posts and reactions.
+        use_numpy : bool, optional
+            Whether to score with NumPy, by default whenever it is installed.
+
+        Returns
+        -------
+        ColumnarScores
+            The columns of every post and reaction of the users.
+        """
+
+        columns = cls(use_numpy)
+        for user in users:
+            columns.add_user(user.username)
+            for post in user.posts:
+                index = columns.add_post(user.username, post.content_type, post.timestamp.timestamp())
+                for reaction in post.reactions:
+                    columns.add_reaction(index, reaction.type, reaction.reactor)
+        return columns
+
+    def __len__(self):
+        return len(self.usernames)
+
+    @staticmethod
+    def _intern(codes, value):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+        return code
+
+    def add_user(self, username):
+        """Add a user without posts, so they are scored too. Returns the index of the user."""
+        code = self.user_codes.get(username)
+        if code is None:
+            code = self.user_codes[username] = len(self.usernames)
+            self.usernames.append(username)
+        return code
+
+    def add_post(self, username, content_type, timestamp):
+        """
+        Add a post.
+
+        Parameters
+        ----------
+        username : str
+            The author of the post.
+        content_type : str
+            The content type of the post.
+        timestamp : float
+            When the post was made, in seconds since the Unix epoch.
+
+        Returns
+        -------
+        int
+            The index of the post, for `add_reaction`.
+        """
+
+        self.post_user.append(self.add_user(username))
+        self.post_time.append(timestamp)
+        self.post_content_type.append(self._intern(self.content_type_codes, content_type))
+        return len(self.post_user) - 1
+
+    def add_reaction(self, post, reaction_type, reactor):
+        """Add a reaction of the given type by a reactor on the post with index ``post``."""
+        self.reaction_post.append(post)
+        self.reaction_type.append(self._intern(self.reaction_type_codes, reaction_type))
+        self.reaction_reactor.append(self._intern(self.reactor_codes, reactor))
+
+    def _reaction_weights(self):
+        """The points of every reaction type code, and the code of curator picks (-1 if none)."""
+        weights = [0.0] * len(self.reaction_type_codes)
+        for reaction_type, code in self.reaction_type_codes.items():
+            weights[code] = REACTION_POINTS.get(reaction_type, REACTION_POINTS['generic'])
+        return weights, self.reaction_type_codes.get('curator_pick', -1)
+
+    def breakdown(self, timeframe='daily', now=None):
+        """
+        Calculate every score component of every user.
+
+        Parameters
+        ----------
+        timeframe : str, optional
+            The timeframe for the frequency decay, by default 'daily'.
+        now : datetime, optional
+            The time the timeframe ends at, by default the current time. Naive posts are
+            compared with a naive ``now``, aware posts with an aware one.
+
+        Returns
+        -------
+        dict
+            For every name of COMPONENTS, the values of all users in the order of `usernames`,
+            as NumPy arrays or lists.
+        """
+
+        cutoff = timeframe_cutoff(timeframe, now=now)
+        cutoff = cutoff.timestamp() if cutoff is not None else None
+        today = day_number(time.time() if now is None else now.timestamp())
+        if self.use_numpy:
+            return self._breakdown_numpy(cutoff, today)
+        return self._breakdown_python(cutoff, today)
+
+    def scores(self, timeframe='daily', now=None):
+        """
+        Calculate the total score of every user.
+
+        Parameters
+        ----------
+        timeframe : str, optional
+            The timeframe for the frequency decay, by default 'daily'.
+        now : datetime, optional
+            The time the timeframe ends at, by default the current time.
+
+        Returns
+        -------
+        dict
+            The total score of every user, by username.
+        """
+
+        return dict(zip(self.usernames, self.breakdown(timeframe, now)['total']))
+
+    def _breakdown_numpy(self, cutoff, today):
+        n_users = len(self.usernames)
+        post_user = np.frombuffer(self.post_user, dtype=np.int32)
+        post_content_type = np.frombuffer(self.post_content_type, dtype=np.int16)
+        reaction_post = np.frombuffer(self.reaction_post, dtype=np.int32)
+        reaction_type = np.frombuffer(self.reaction_type, dtype=np.int16)
+        reaction_reactor = np.frombuffer(self.reaction_reactor, dtype=np.int32)
+        weights, curator_code = self._reaction_weights()
+
+        base_post_points = np.bincount(post_user, minlength=n_users) * BASE_POST_POINT
+        reaction_user = post_user[reaction_post]
+        reaction_points = np.bincount(reaction_user, weights=np.asarray(weights, dtype=np.float64)[reaction_type],
+                                      minlength=n_users)
+
+        # Distinct (user, content type) and (user, reactor) pairs, each encoded as one integer
+        # and counted per user
+        width = max(len(self.content_type_codes), 1)
+        pairs = _unique(post_user.astype(np.int64) * width + post_content_type)
+        diversity_multiplier = np.where(np.bincount(pairs // width, minlength=n_users) > 1, DIVERSITY_MULTIPLIER, 1)
+        width = max(len(self.reactor_codes), 1)
+        pairs = _unique(reaction_user.astype(np.int64) * width + reaction_reactor)
+        unique_reactors = np.bincount(pairs // width, minlength=n_users)
+
+        if cutoff is None:
+            recent_posts = np.zeros(n_users, dtype=np.int64)
+        else:
+            recent = np.frombuffer(self.post_time, dtype=np.float64) > cutoff
+            recent_posts = np.bincount(post_user[recent], minlength=n_users)
+        frequency_decay = (np.maximum(recent_posts - FREQUENCY_DECAY_THRESHOLD, 0)
+                           * BASE_POST_POINT * FREQUENCY_DECAY_RATE)
+        unique_reactor_bonus = unique_reactors * UNIQUE_REACTOR_BONUS
+        curator_bonus = np.bincount(reaction_user[reaction_type == curator_code], minlength=n_users) * CURATOR_BONUS
+        consistency_bonus = self._streaks_numpy(post_user, today) // CONSISTENCY_STREAK_DAYS * CONSISTENCY_BONUS
+
+        total = ((base_post_points + reaction_points) * diversity_multiplier - frequency_decay
+                 + unique_reactor_bonus + curator_bonus + consistency_bonus)
+        return dict(zip(COMPONENTS, (base_post_points, reaction_points, diversity_multiplier, frequency_decay,
+                                     unique_reactor_bonus, curator_bonus, consistency_bonus, total)))
+
+    def _streaks_numpy(self, post_user, today):
+        """The number of consecutive days with a post up to today (or yesterday) of every user."""
+        streaks = np.zeros(len(self.usernames), dtype=np.int64)
+        days = np.floor_divide(np.frombuffer(self.post_time, dtype=np.float64), SECONDS_PER_DAY).astype(np.int64)
+        past = days <= today
+        if not past.any():
+            return streaks
+        days = days[past]
+        first = days.min()
+        span = today - first + 1
+        # Distinct (user, day) pairs, sorted by user and then by day
+        pairs = _unique(post_user[past].astype(np.int64) * span + (days - first))
+        users, days = pairs // span, pairs % span + first
+        # Runs of consecutive days start at every new user and every gap
+        starts = np.ones(len(pairs), dtype=bool)
+        starts[1:] = (users[1:] != users[:-1]) | (days[1:] - days[:-1] != 1)
+        positions = np.arange(len(pairs))
+        run_lengths = positions - np.maximum.accumulate(np.where(starts, positions, 0)) + 1
+        # The last run of every user is their streak if it reaches today or yesterday
+        last = np.ones(len(pairs), dtype=bool)
+        last[:-1] = users[1:] != users[:-1]
+        current = last & (days >= today - 1)
+        streaks[users[current]] = run_lengths[current]
+        return streaks
+
+    def _breakdown_python(self, cutoff, today):
+        n_users = len(self.usernames)
+        post_user = self.post_user
+        weights, curator_code = self._reaction_weights()
+
+        post_counts = [0] * n_users
+        recent_posts = [0] * n_users
+        content_types = [set() for _ in range(n_users)]
+        active_days = [set() for _ in range(n_users)]
+        for user, timestamp, content_type in zip(post_user, self.post_time, self.post_content_type):
+            post_counts[user] += 1
+            content_types[user].add(content_type)
+            active_days[user].add(day_number(timestamp))
+            if cutoff is not None and timestamp > cutoff:
+                recent_posts[user] += 1
+
+        reaction_points = [0] * n_users
+        reactors = [set() for _ in range(n_users)]
+        curator_picks = [0] * n_users
+        for post, reaction_type, reactor in zip(self.reaction_post, self.reaction_type, self.reaction_reactor):
+            user = post_user[post]
+            reaction_points[user] += weights[reaction_type]
+            reactors[user].add(reactor)
+            if reaction_type == curator_code:
+                curator_picks[user] += 1
+
+        breakdown = {name: [] for name in COMPONENTS}
+        for user in range(n_users):
+            base_post_points = post_counts[user] * BASE_POST_POINT
+            diversity_multiplier = DIVERSITY_MULTIPLIER if len(content_types[user]) > 1 else 1
+            excess = recent_posts[user] - FREQUENCY_DECAY_THRESHOLD
+            frequency_decay = excess * BASE_POST_POINT * FREQUENCY_DECAY_RATE if excess > 0 else 0
+            unique_reactor_bonus = len(reactors[user]) * UNIQUE_REACTOR_BONUS
+            curator_bonus = curator_picks[user] * CURATOR_BONUS
+            days = active_days[user]
+            day = today if today in days else today - 1
+            streak = 0
+            while day - streak in days:
+                streak += 1
+            consistency_bonus = streak // CONSISTENCY_STREAK_DAYS * CONSISTENCY_BONUS
+            total = ((base_post_points + reaction_points[user]) * diversity_multiplier - frequency_decay
+                     + unique_reactor_bonus + curator_bonus + consistency_bonus)
+            for name, value in zip(COMPONENTS, (base_post_points, reaction_points[user], diversity_multiplier,
+                                                frequency_decay, unique_reactor_bonus, curator_bonus,
+                                                consistency_bonus, total)):
+                breakdown[name].append(value)
+        return breakdown
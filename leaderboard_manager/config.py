@@ -12,4 +12,13 @@ FREQUENCY_DECAY_THRESHOLD = 5
 FREQUENCY_DECAY_RATE = 0.5
 UNIQUE_REACTOR_BONUS = 0.5
 CONSISTENCY_BONUS = 10
+CONSISTENCY_STREAK_DAYS = 7  # The consistency bonus is awarded for every this many consecutive days with a post
 CURATOR_BONUS = 15
+EMOJI_REACTION_TYPES = {  # Reaction emoji scored as each reaction type; unlisted emoji are 'generic'
+    'heart': ('❤️',),
+    'wow': ('😮',),
+    'laugh': ('😂',),
+    'curator_pick': ('🏅',)  # Only when a curator reacts with it
+}
+HOT_SCORE_HALF_LIFE = 24 * 60 * 60  # Seconds after which a post and its reactions count half on the hot board
+CONTENT_TYPES = ('text', 'link', 'image', 'video', 'audio', 'file')  # Kinds of posts, for the diversity multiplier
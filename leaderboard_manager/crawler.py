@@ -0,0 +1,349 @@
+"""
+Crawler Module
+--------------
+
+This module crawls the history of several channels concurrently while keeping the number of
+in-flight history requests bounded.
+
+The bound adapts to Discord's rate limits, and every report of one halves it; every run of
+clean history pages raises it again by one, up to a maximum. discord.py does not expose rate
+limits through its public API, so they are read from two places:
+- The 'discord.http' logger. discord.py logs 429 responses at WARNING, and the far more
+  common pre-emptive waits on an exhausted bucket at DEBUG. The watcher lowers the logger to
+  DEBUG for the duration of the crawl and drops the records the logger would not have let
+  through, so the logging configuration of the bot is unaffected. Records are recognised by
+  their message templates (MARKERS), which are tied to the wording of discord.py; the tests
+  check them against the installed version.
+- The exceptions of failed crawls: a `discord.RateLimited` (raised when a wait would exceed
+  the client's max_ratelimit_timeout) or an HTTP 429.
+
+Classes:
+- AdaptiveLimiter: Semaphore-like limiter whose limit can change while tasks are waiting.
+- RateLimitWatcher: Logger filter that backs a limiter off when discord.py is rate limited.
+- ChannelProgress: Progress, throughput and ETA of the crawl of a single channel.
+- HistoryCrawler: Runs the crawl of many channels concurrently and reports progress.
+"""
+
+import asyncio
+import logging
+import time
+
+# Concurrency a crawl starts with, and the bounds it adapts between
+DEFAULT_CONCURRENCY = 4
+MAX_CONCURRENCY = 8
+# Number of clean history pages after which the concurrency limit is raised by one
+GROW_AFTER_PAGES = 20
+# Seconds between two progress reports
+REPORT_INTERVAL = 10.0
+
+# Discord snowflakes store their creation time (in ms since the Discord epoch) above this bit
+SNOWFLAKE_TIMESTAMP_SHIFT = 22
+
+
+class AdaptiveLimiter:
+    """
+    Limit the number of concurrent holders, with a limit that can shrink and grow at runtime.
+
+    Parameters
+    ----------
+    limit : int
+        The initial number of concurrent holders.
+    minimum : int, optional
+        The lowest the limit can be backed off to, by default 1.
+    maximum : int, optional
+        The highest the limit can grow to, by default `limit`.
+    """
+
+    def __init__(self, limit, minimum=1, maximum=None):
+        self.limit = limit
+        self.minimum = minimum
+        self.maximum = maximum if maximum is not None else limit
+        self.active = 0
+        self.clean_pages = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def release(self):
+        async with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.release()
+
+    async def cycle(self):
+        """
+        Give the slot of the caller up between two requests and take one again.
+
+        This lets waiting tasks in when the limit has grown, and holds the caller back when it
+        has shrunk below the number of active holders.
+        """
+
+        self.clean_pages += 1
+        if self.clean_pages >= GROW_AFTER_PAGES and self.limit < self.maximum:
+            self.clean_pages = 0
+            self.limit += 1
+            logging.debug(f"Crawl concurrency raised to {self.limit}")
+        await self.release()
+        await self.acquire()
+
+    def backoff(self):
+        """Halve the limit after a rate limit was hit."""
+        self.clean_pages = 0
+        limit = max(self.minimum, self.limit // 2)
+        if limit != self.limit:
+            self.limit = limit
+            logging.info(f"Rate limited, crawl concurrency lowered to {self.limit}")
+
+
+def is_rate_limit(error):
+    """Whether an exception reports a rate limit: a discord.RateLimited or an HTTP 429."""
+    return hasattr(error, 'retry_after') or getattr(error, 'status', None) == 429
+
+
+class RateLimitWatcher:
+    """
+    Back an `AdaptiveLimiter` off whenever discord.py reports that it is being rate limited.
+
+    Use it as a context manager around a crawl. While any watcher is active, the 'discord.http'
+    logger is lowered to DEBUG so that the pre-emptive rate limits reach it, and filtered;
+    records below the level the logger had are dropped after being looked at. The crawls of
+    several guilds can run at once and share the logger, so the watchers are counted: the
+    level is saved when the first one enters and restored when the last one exits, and every
+    rate limit backs off the limiters of all the active watchers, as they share the client.
+
+    Parameters
+    ----------
+    limiter : AdaptiveLimiter
+        The limiter to back off.
+    """
+
+    LOGGER = 'discord.http'
+    # Beginnings of the message templates of discord.py's rate limit records, matched against
+    # the unformatted template so that response bodies logged at DEBUG are never formatted
+    MARKERS = ('We are being rate limited.', 'Global rate limit has been hit.',
+               'A rate limit bucket (%s) has been exhausted.')
+
+    # The watchers active in this process, and the levels the logger had before the first one
+    _active = []
+    _level = None
+    _effective_level = None
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+
+    @classmethod
+    def filter(cls, record):
+        message = record.msg
+        if isinstance(message, str) and message.startswith(cls.MARKERS):
+            for watcher in cls._active:
+                watcher.limiter.backoff()
+        return record.levelno >= cls._effective_level
+
+    def __enter__(self):
+        cls = type(self)
+        if not cls._active:
+            logger = logging.getLogger(self.LOGGER)
+            cls._level = logger.level
+            cls._effective_level = logger.getEffectiveLevel()
+            logger.setLevel(logging.DEBUG)
+            logger.addFilter(cls.filter)
+        cls._active.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        cls = type(self)
+        cls._active.remove(self)
+        if not cls._active:
+            logger = logging.getLogger(self.LOGGER)
+            logger.removeFilter(cls.filter)
+            logger.setLevel(cls._level)
+
+
+class ChannelProgress:
+    """
+    Track how far the crawl of a channel has come.
+
+    Messages are crawled oldest first, so the progress is estimated from the snowflake ids of
+    the crawled messages: they grow with time, from the id the crawl started after up to the
+    id of the last message of the channel.
+
+    Parameters
+    ----------
+    name : str
+        Name of the channel, used in reports.
+    limiter : AdaptiveLimiter, optional
+        The limiter whose slot the crawl holds, cycled after every history page.
+    """
+
+    def __init__(self, name, limiter=None):
+        self.name = name
+        self.limiter = limiter
+        self.start_id = None
+        self.end_id = None
+        self.last_id = None
+        self.fetched = 0
+        self.started_at = None
+        self.finished_at = None
+        # The exception the crawl failed with, if it did
+        self.error = None
+
+    def begin(self, start_id, end_id):
+        """
+        Start tracking the crawl.
+
+        Parameters
+        ----------
+        start_id : int
+            The id the crawl starts after (a checkpoint or the id of the channel itself).
+        end_id : int or None
+            The id of the last message of the channel, if known.
+        """
+
+        self.start_id = start_id
+        self.end_id = end_id
+        self.started_at = time.monotonic()
+
+    def advance(self, message_id):
+        self.last_id = message_id
+        self.fetched += 1
+
+    async def page_done(self):
+        """Mark the end of a history page, letting the limiter adapt before the next request."""
+        if self.limiter is not None:
+            await self.limiter.cycle()
+
+    def finish(self):
+        self.finished_at = time.monotonic()
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def fraction(self):
+        """The estimated fraction of the channel crawled so far, or None if unknown."""
+        if self.finished_at is not None:
+            return 1.0
+        if self.last_id is None or self.end_id is None or self.end_id <= self.start_id:
+            return None
+        start = self.start_id >> SNOWFLAKE_TIMESTAMP_SHIFT
+        span = (self.end_id >> SNOWFLAKE_TIMESTAMP_SHIFT) - start
+        if span <= 0:
+            return None
+        return min(1.0, ((self.last_id >> SNOWFLAKE_TIMESTAMP_SHIFT) - start) / span)
+
+    @property
+    def rate(self):
+        """Messages crawled per second."""
+        elapsed = self.elapsed
+        return self.fetched / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """Estimated seconds until the crawl of the channel is done, or None if unknown."""
+        fraction = self.fraction
+        if not fraction:
+            return None
+        return self.elapsed * (1 - fraction) / fraction
+
+    def __str__(self):
+        fraction = self.fraction
+        eta = self.eta
+        done = f"{fraction:.0%}" if fraction is not None else "?"
+        remaining = f"{eta:.0f}s" if eta is not None else "?"
+        return f"#{self.name}: {self.fetched} messages, {done}, {self.rate:.1f} msg/s, ETA {remaining}"
+
+
+class HistoryCrawler:
+    """
+    Crawl the history of many channels concurrently.
+
+    Parameters
+    ----------
+    concurrency : int, optional
+        The number of channels crawled at once to begin with, by default DEFAULT_CONCURRENCY.
+    max_concurrency : int, optional
+        The number of channels the limit may grow to, by default MAX_CONCURRENCY.
+    report_interval : float, optional
+        Seconds between two progress reports, by default REPORT_INTERVAL.
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, max_concurrency=MAX_CONCURRENCY,
+                 report_interval=REPORT_INTERVAL):
+        self.concurrency = concurrency
+        self.max_concurrency = max(concurrency, max_concurrency)
+        self.report_interval = report_interval
+        self.progress = {}
+
+    async def crawl(self, channels, fetch):
+        """
+        Crawl channels concurrently.
+
+        Parameters
+        ----------
+        channels : iterable of discord.TextChannel
+            The channels to crawl.
+        fetch : callable
+            Coroutine function called as ``fetch(channel, progress)`` for every channel. It must
+            call ``progress.begin`` before its first request, ``progress.advance`` for every
+            message and ``await progress.page_done()`` after every history page.
+
+        Returns
+        -------
+        dict
+            The `ChannelProgress` of every channel, by channel id. Channels whose crawl failed
+            have the exception in `ChannelProgress.error`; the crawl of the others goes on.
+        """
+
+        limiter = AdaptiveLimiter(self.concurrency, maximum=self.max_concurrency)
+        channels = {channel.id: channel for channel in channels}
+        self.progress = {channel_id: ChannelProgress(channel.name, limiter)
+                         for channel_id, channel in channels.items()}
+
+        async def run(channel_id):
+            progress = self.progress[channel_id]
+            async with limiter:
+                try:
+                    await fetch(channels[channel_id], progress)
+                except Exception as e:
+                    progress.error = e
+                    if is_rate_limit(e):
+                        limiter.backoff()
+                    logging.error(f"Failed to crawl #{progress.name}. Reason: {e}")
+                finally:
+                    progress.finish()
+
+        started = time.monotonic()
+        reporter = asyncio.create_task(self._report())
+        try:
+            with RateLimitWatcher(limiter):
+                await asyncio.gather(*(run(channel_id) for channel_id in channels))
+        finally:
+            reporter.cancel()
+
+        elapsed = time.monotonic() - started
+        total = sum(progress.fetched for progress in self.progress.values())
+        logging.info(f"Crawled {total} messages from {len(channels)} channels in {elapsed:.1f}s "
+                     f"({total / elapsed if elapsed > 0 else 0.0:.1f} msg/s)")
+        return self.progress
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            running = [progress for progress in self.progress.values()
+                       if progress.started_at is not None and progress.finished_at is None]
+            done = sum(progress.finished_at is not None for progress in self.progress.values())
+            logging.info(f"Crawl progress: {done}/{len(self.progress)} channels done")
+            for progress in running:
+                logging.info(f"Crawl progress: {progress}")
@@ -0,0 +1,38 @@
+"""
+Features Module
+---------------
+
+This module extracts the features a message is scored on. Extraction runs for every message of
+every backfill, so it is kept to a few cheap operations per message.
+
+Functions:
+- count_urls: Counts the URLs in a message's content.
+"""
+
+import re
+
+# An http(s) URL: a scheme, a host character, then anything up to whitespace or a character
+# that delimits links in Discord markdown (<https://...>, [text](https://...), `code`).
+# Matching is case-sensitive; IGNORECASE doubles the cost of every match.
+URL_PATTERN = re.compile(r'https?://[^\s/$.?#<>()\[\]"\'`][^\s<>()\[\]"\'`]*')
+
+
+def count_urls(content):
+    """
+    Count the URLs in a message's content.
+
+    Parameters
+    ----------
+    content : str
+        The content of the message.
+
+    Returns
+    -------
+    int
+        The number of URLs found.
+    """
+
+    # Most messages have no link at all; a substring check is far cheaper than the regex
+    if 'http' not in content:
+        return 0
+    return len(URL_PATTERN.findall(content))
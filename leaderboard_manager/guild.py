@@ -0,0 +1,402 @@
+"""
+Guild Module
+------------
+
+This module holds the leaderboard state of a single guild. Every guild the bot serves gets its
+own `GuildState`, so guilds are scored, backfilled and rendered independently of each other.
+
+Messages enter the state as `PostBatch` pages built by the ingest module; the activity of every
+post is added to its author's `DayBuckets`, and the author is rescored once per page. Unless
+they are disabled, the running hot scores of the hot module are kept alongside.
+"""
+
+import time
+
+from .buckets import DayBuckets, day_number
+from .cache import RenderCache
+from .config import BASE_POST_POINT, HOT_SCORE_HALF_LIFE
+from .hot import HotBoard, HotScore, hot_points
+from .ingest import PostBatch, reaction_weight
+from .ranking import Board
+
+# Backfill states of a guild
+PENDING = 'pending'
+BACKFILLING = 'backfilling'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class GuildState:
+    """
+    Leaderboard state of one guild.
+
+    Parameters
+    ----------
+    guild_id : int
+        The id of the guild.
+    categories : list of str
+        Names of the categories whose channels are tracked.
+    half_life : float or None, optional
+        The half-life of the hot scores in seconds, by default HOT_SCORE_HALF_LIFE. None does
+        not keep hot scores.
+    """
+
+    def __init__(self, guild_id, categories, half_life=HOT_SCORE_HALF_LIFE):
+        self.guild_id = guild_id
+        self.categories = categories
+        # Tracked channels, by id
+        self.channels = {}
+        # Channels whose history has been processed up to the present
+        self.caught_up = set()
+        # message id -> [channel_key, user, day, post]
+        self.messages = {}
+        # channel_key -> user -> DayBuckets of their activity in the channel
+        self.data = {}
+        # channel_key -> days of the time frame -> Board. Boards are built the first time
+        # they are shown and kept up to date from then on, until the day changes.
+        self.boards = {}
+        self.boards_day = None
+        self.half_life = half_life
+        # channel_key -> user -> HotScore of their activity in the channel
+        self.hot = {}
+        # channel_key -> HotBoard, built the first time it is shown. Hot boards stay valid
+        # across days, since decay does not change their order.
+        self.hot_boards = {}
+        # Rendered leaderboard messages by (time_frame, channel_key, page)
+        self.rendered = RenderCache()
+        # PENDING until the backfill starts, BACKFILLING while it runs, READY once every
+        # tracked channel has been crawled up to the present, FAILED if some could not be
+        self.status = PENDING
+        # The crawler of the running (or last) backfill, for its progress
+        self.crawler = None
+        # Whether the stored messages have been loaded into the boards
+        self.loaded = False
+        # While they are being loaded, the (listener, payload) events held back until they are
+        self.deferred = None
+        # channel_key -> sets collecting the users rescored while a board of the channel is
+        # being rebuilt elsewhere, see `begin_rebuild`
+        self.rebuilding = {}
+
+    def describe_backfill(self):
+        """
+        Describe how far the backfill of the guild has come.
+
+        Returns
+        -------
+        str
+            A one-line, human readable summary.
+        """
+
+        if self.status == READY:
+            return "History fully processed."
+        if self.status == FAILED:
+            failed = len(self.channels.keys() - self.caught_up)
+            return f"History partially processed: {failed} channels could not be crawled."
+        if self.status == PENDING or self.crawler is None:
+            return "Waiting to process the history of this server."
+        progress = self.crawler.progress.values()
+        done = sum(channel.finished_at is not None for channel in progress)
+        fetched = sum(channel.fetched for channel in progress)
+        return f"Processing history: {done}/{len(progress)} channels done, {fetched} messages so far."
+
+    def get_board(self, channel_key, days):
+        """
+        Return the ranked board of a channel over a time frame, building it if needed.
+
+        Parameters
+        ----------
+        channel_key : str
+            The channel of the board.
+        days : int or None
+            The length of the time frame in days, None for all time.
+
+        Returns
+        -------
+        Board
+            The board, kept up to date by `ingest` and the live helpers from now on.
+        """
+
+        board = self.cached_board(channel_key, days)
+        if board is None:
+            today = self.boards_day
+            board = self.boards.setdefault(channel_key, {})[days] = Board(
+                {user: buckets.score(days, today) for user, buckets in self.data.get(channel_key, {}).items()})
+        return board
+
+    def get_hot_board(self, channel_key):
+        """
+        Return the board of a channel ranked by hot score, building it if needed.
+
+        Raises
+        ------
+        ValueError
+            If the state keeps no hot scores.
+        """
+
+        if self.half_life is None:
+            raise ValueError("Hot scores are disabled")
+        board = self.hot_boards.get(channel_key)
+        if board is None:
+            board = self.hot_boards[channel_key] = HotBoard(self.half_life, self.hot.get(channel_key))
+        return board
+
+    def cached_board(self, channel_key, days):
+        """Return the board of a channel over a time frame if it is built, otherwise None."""
+        today = day_number(time.time())
+        if today != self.boards_day:
+            # Windows have moved on; boards are rebuilt from the buckets on demand
+            self.boards = {}
+            self.boards_day = today
+        return self.boards.get(channel_key, {}).get(days)
+
+    def begin_rebuild(self, channel_key):
+        """
+        Start collecting the users of a channel whose score changes while one of its boards is
+        rebuilt outside of the state, such as in a worker process.
+
+        Returns
+        -------
+        set
+            The set the users are collected in, to pass to `finish_rebuild`.
+        """
+
+        touched = set()
+        self.rebuilding.setdefault(channel_key, []).append(touched)
+        return touched
+
+    def end_rebuild(self, channel_key, touched):
+        """Stop collecting users into a set returned by `begin_rebuild`."""
+        sets = self.rebuilding.get(channel_key, [])
+        if touched in sets:
+            sets.remove(touched)
+        if not sets:
+            self.rebuilding.pop(channel_key, None)
+
+    def finish_rebuild(self, channel_key, days, today, board, touched):
+        """
+        Install a board rebuilt from a snapshot of the buckets.
+
+        The users in ``touched`` are rescored on the board, since their buckets changed after
+        the snapshot was taken.
+
+        Parameters
+        ----------
+        channel_key : str
+            The channel of the board.
+        days : int or None
+            The length of the time frame in days, None for all time.
+        today : int
+            The day number the board was rebuilt for.
+        board : Board
+            The rebuilt board.
+        touched : set
+            The set returned by `begin_rebuild`.
+
+        Returns
+        -------
+        Board
+            The installed board, or the board that was built in the meantime.
+        """
+
+        self.end_rebuild(channel_key, touched)
+        users = self.data.get(channel_key, {})
+        for user in touched:
+            if user in users:
+                board.set(user, users[user].score(days, today))
+        if today != self.boards_day:
+            # The day changed while the board was rebuilt; use it once but do not keep it
+            return board
+        return self.boards.setdefault(channel_key, {}).setdefault(days, board)
+
+    def ingest(self, batch):
+        """
+        Add a page of posts to the buckets of their authors and rescore each author once.
+
+        Posts of messages that are already scored are skipped, so a message seen by both the
+        live listeners and a backfill only counts once.
+
+        Parameters
+        ----------
+        batch : PostBatch
+            The posts to add.
+
+        Returns
+        -------
+        PostBatch
+            The posts that were added.
+        """
+
+        added = PostBatch()
+        touched = set()
+        for message_id, channel_id, user, post in zip(batch.message_ids, batch.channel_ids, batch.authors,
+                                                      batch.posts):
+            if message_id in self.messages:
+                continue
+            channel_key = "<#" + str(channel_id) + ">"
+            day = day_number(post.timestamp.timestamp())
+            entry = self.messages[message_id] = [channel_key, user, day, post]
+            self._apply_post(entry, 1)
+            touched.add((channel_key, user, day))
+            added.append(message_id, channel_id, user, post)
+        for channel_key, user, day in touched:
+            self._rescore(channel_key, user, day)
+        return added
+
+    def remove_messages(self, message_ids):
+        """Remove the posts of deleted messages. Returns the ids of the messages that were scored."""
+        removed = []
+        for message_id in message_ids:
+            entry = self.messages.pop(message_id, None)
+            if entry is not None:
+                self._apply_post(entry, -1)
+                self._rescore(entry[0], entry[1], entry[2])
+                removed.append(message_id)
+        return removed
+
+    def edit_message(self, message_id, content_type):
+        """
+        Rescore an edited message whose content type may have changed.
+
+        Parameters
+        ----------
+        message_id : int
+            The id of the scored message.
+        content_type : str or None
+            The new content type, or None if the message no longer shares anything, in which
+            case it is removed.
+
+        Returns
+        -------
+        bool
+            Whether the message was scored.
+        """
+
+        entry = self.messages.get(message_id)
+        if entry is None:
+            return False
+        if content_type is None:
+            self.remove_messages([message_id])
+            return True
+        post = entry[3]
+        if post.content_type != content_type:
+            buckets = self.data[entry[0]][entry[1]]
+            buckets.add_post(entry[2], post.content_type_code, -1)
+            post.content_type = content_type
+            buckets.add_post(entry[2], post.content_type_code)
+            self._rescore(entry[0], entry[1], entry[2])
+        return True
+
+    def add_reaction(self, message_id, reaction_type, reactor):
+        """Add a reaction to a scored message. Returns whether the message is scored."""
+        entry = self.messages.get(message_id)
+        if entry is None:
+            return False
+        entry[3].add_reaction(reaction_type, reactor)
+        self._apply_reaction(entry, reaction_type, reactor, 1)
+        self._rescore(entry[0], entry[1], entry[2])
+        return True
+
+    def remove_reaction(self, message_id, reactor, reaction_types):
+        """
+        Remove a reaction from a scored message.
+
+        Reactions recorded without a known reactor are removed in place of the reactor's own
+        when the reactor has none left.
+
+        Parameters
+        ----------
+        message_id : int
+            The id of the message.
+        reactor : int
+            The id of the user who removed their reaction.
+        reaction_types : collection of str
+            The types the removed reaction may have been recorded with.
+
+        Returns
+        -------
+        Reaction or None
+            The removed reaction, or None if no matching reaction was found.
+        """
+
+        entry = self.messages.get(message_id)
+        if entry is None:
+            return None
+        reaction = entry[3].remove_reaction(reactor, reaction_types)
+        if reaction is None:
+            reaction = entry[3].remove_reaction(None, reaction_types)
+        if reaction is not None:
+            self._apply_reaction(entry, reaction.type, reaction.reactor, -1)
+            self._rescore(entry[0], entry[1], entry[2])
+        return reaction
+
+    def replace_reactions(self, message_id, reactions=()):
+        """
+        Replace the reactions of a scored message, such as when a moderator clears them.
+
+        Parameters
+        ----------
+        message_id : int
+            The id of the message.
+        reactions : iterable of Reaction, optional
+            The reactions the message is left with, by default none.
+
+        Returns
+        -------
+        Post or None
+            The post of the message, or None if the message is not scored.
+        """
+
+        entry = self.messages.get(message_id)
+        if entry is None:
+            return None
+        post = entry[3]
+        while post.reactions:
+            reaction = post.reactions.pop()
+            self._apply_reaction(entry, reaction.type, reaction.reactor, -1)
+        for reaction in reactions:
+            post.add_reaction(reaction.type, reaction.reactor)
+            self._apply_reaction(entry, reaction.type, reaction.reactor, 1)
+        self._rescore(entry[0], entry[1], entry[2])
+        return post
+
+    def _apply_post(self, entry, sign):
+        """Add (or with a negative sign, remove) a post and its reactions to its author's buckets."""
+        channel_key, user, day, post = entry
+        users = self.data.setdefault(channel_key, {})
+        buckets = users.get(user)
+        if buckets is None:
+            buckets = users[user] = DayBuckets()
+        buckets.add_post(day, post.content_type_code, sign)
+        points = BASE_POST_POINT
+        for reaction in post.reactions:
+            buckets.add_reaction(day, reaction_weight(reaction.type), reaction.reactor,
+                                 reaction.type == 'curator_pick', sign)
+            points += hot_points(reaction.type)
+        self._add_hot(channel_key, user, post, sign * points)
+
+    def _apply_reaction(self, entry, reaction_type, reactor, sign):
+        self.data[entry[0]][entry[1]].add_reaction(entry[2], reaction_weight(reaction_type), reactor,
+                                                   reaction_type == 'curator_pick', sign)
+        self._add_hot(entry[0], entry[1], entry[3], sign * hot_points(reaction_type))
+
+    def _add_hot(self, channel_key, user, post, points):
+        if self.half_life is None:
+            return
+        users = self.hot.setdefault(channel_key, {})
+        score = users.get(user)
+        if score is None:
+            score = users[user] = HotScore()
+        score.add(points, post.timestamp.timestamp(), self.half_life)
+
+    def _rescore(self, channel_key, user, day):
+        """Update the user's score on every built board of the channel whose time frame includes the day."""
+        buckets = self.data[channel_key][user]
+        for touched in self.rebuilding.get(channel_key, ()):
+            touched.add(user)
+        today = self.boards_day
+        for days, board in self.boards.get(channel_key, {}).items():
+            if days is None or today - days < day <= today:
+                board.set(user, buckets.score(days, today))
+        hot_board = self.hot_boards.get(channel_key)
+        if hot_board is not None:
+            hot_board.update(user, self.hot[channel_key][user])
@@ -0,0 +1,142 @@
+"""
+Hot Module
+----------
+
+This module keeps "hot" scores: scores in which every point decays continuously, losing half of
+its weight every HOT_SCORE_HALF_LIFE seconds, so that the leaders of a hot board are whoever is
+trending right now.
+
+A hot score is kept as a running ``(value, updated)`` pair, the value as of the time of the
+latest event, so that adding an event and reading the score are O(1) whatever the history.
+Every contribution decays from the time of its post: a new reaction on an old post adds the
+weight the reaction would have kept had it come with the post, and removing it takes away
+exactly as much.
+
+All scores decay by the same factor, so decay never changes their order. Hot boards are
+ranked by ``log2(value) + updated / half_life``, the logarithm of the value scaled to a common
+instant, which stays fixed as time passes; boards only change when an event comes in.
+
+Functions:
+- hot_points: Returns the points a reaction adds to the hot score of the author of the post.
+
+Classes:
+- HotScore: The running, decaying score of one user.
+- HotBoard: A Board ranked by hot score.
+"""
+
+import math
+import time
+
+from .config import CURATOR_BONUS
+from .ingest import reaction_weight
+from .ranking import Board
+
+# Hot values below this are rounding left-overs of removed events, and count as nothing
+HOT_EPSILON = 1e-9
+# Seconds during which a rendered hot board is shown before its values are decayed anew
+HOT_RENDER_INTERVAL = 60
+
+
+def hot_points(reaction_type):
+    """Return the points a reaction adds to the hot score; curator picks add the curator bonus too."""
+    return reaction_weight(reaction_type) + (CURATOR_BONUS if reaction_type == 'curator_pick' else 0)
+
+
+class HotScore:
+    """
+    The running, decaying score of one user.
+
+    The half-life is given on every call rather than kept by each of the many scores.
+    """
+
+    __slots__ = ('value', 'updated')
+
+    def __init__(self):
+        # The value as of `updated`, a Unix timestamp
+        self.value = 0.0
+        self.updated = 0.0
+
+    def add(self, points, timestamp, half_life):
+        """
+        Add (or with negative points, remove) points earned at a given time.
+
+        Parameters
+        ----------
+        points : float
+            The points, worth their full value at ``timestamp``.
+        timestamp : float
+            The Unix timestamp the points were earned at.
+        half_life : float
+            The half-life of the score, in seconds.
+        """
+
+        if timestamp >= self.updated:
+            self.value = self.value * 2.0 ** ((self.updated - timestamp) / half_life) + points
+            self.updated = timestamp
+        else:
+            self.value += points * 2.0 ** ((timestamp - self.updated) / half_life)
+        if self.value < HOT_EPSILON:
+            self.value = 0.0
+
+    def value_at(self, now, half_life):
+        """Return the score at the Unix timestamp ``now``."""
+        return self.value * 2.0 ** (min(self.updated - now, 0.0) / half_life)
+
+    def key(self, half_life):
+        """Return the rank key of the score, which does not change with time; 0 for no score."""
+        if not self.value:
+            return 0
+        return math.log2(self.value) + self.updated / half_life
+
+
+class HotBoard(Board):
+    """
+    A board ranked by hot score.
+
+    The board is ordered by the rank keys of the scores, and reports the values the scores
+    have decayed to at the time they are read.
+
+    Parameters
+    ----------
+    half_life : float
+        The half-life of the scores, in seconds.
+    scores : dict, optional
+        `HotScore` objects by user to start with.
+    """
+
+    def __init__(self, half_life, scores=None):
+        super().__init__()
+        self.half_life = half_life
+        for user, score in (scores or {}).items():
+            self.set(user, score.key(half_life))
+
+    @property
+    def version(self):
+        # The values shown decay even when no event comes in, so rendered copies of the board
+        # expire every HOT_RENDER_INTERVAL seconds
+        return self._version, int(time.time() // HOT_RENDER_INTERVAL)
+
+    @version.setter
+    def version(self, version):
+        self._version = version
+
+    def update(self, user, score):
+        """Move a user to the rank of their `HotScore`."""
+        self.set(user, score.key(self.half_life))
+
+    def value(self, key, now=None):
+        """Return the value of the score with a given rank key at ``now``, by default the current time."""
+        now = time.time() if now is None else now
+        return round(2.0 ** (key - now / self.half_life), 2)
+
+    def get(self, user):
+        key = self.scores.get(user)
+        return self.value(key) if key is not None else 0
+
+    def top(self, n, start=0):
+        now = time.time()
+        return [(user, self.value(key, now)) for user, key in super().top(n, start)]
+
+    def users_around(self, user, k):
+        now = time.time()
+        return [(rank, neighbour, self.value(key, now)) for rank, neighbour, key in super().users_around(user, k)]
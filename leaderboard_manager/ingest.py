@@ -0,0 +1,289 @@
+"""
+Ingest Module
+-------------
+
+This module turns pages of Discord messages into the `Post` and `Reaction` records the scoring
+engine works on. Messages are ingested a page at a time (the 100 messages a history request
+returns, or a single live message), and each page becomes one `PostBatch`.
+
+Only messages that share something, through attachments or links, become posts; plain chat in
+the sharing channels is not scored.
+
+Reactions are typed by an `EmojiTable`, which compiles the emoji of every reaction type into a
+single dict keyed by emoji identity, so that typing a reaction costs one lookup whatever the
+size of the configuration. A new table can be compiled and swapped in at any time; reactions
+keep the type they were scored with.
+
+Functions:
+- classify_content: Determines the content type of a message.
+- emoji_key: Returns the identity of an emoji.
+- reaction_type: Maps a Discord reaction onto the reaction types of REACTION_POINTS.
+- reaction_weight: Returns the points a reaction type is worth.
+- ingest_messages: Builds a PostBatch from a page of messages.
+
+Classes:
+- EmojiTable: Reaction types by emoji, compiled for lookups.
+- PostBatch: The posts of one page of messages.
+"""
+
+import os
+import re
+
+from .config import EMOJI_REACTION_TYPES, REACTION_POINTS
+from .features import count_urls
+from .models import REACTION_TYPE_NAMES, Post
+
+# Emoji presentation selector, which Discord clients add to some emoji and not others
+VARIATION_SELECTOR = '\ufe0f'
+# A custom emoji written out as <:name:id>, or <a:name:id> when animated
+CUSTOM_EMOJI = re.compile(r'<a?:\w+:(\d+)>')
+
+# Content types of attachments, by the first part of their MIME type and by file extension
+MIME_CONTENT_TYPES = {'image': 'image', 'video': 'video', 'audio': 'audio'}
+EXTENSION_CONTENT_TYPES = {
+    'png': 'image', 'jpg': 'image', 'jpeg': 'image', 'gif': 'image', 'webp': 'image',
+    'mp4': 'video', 'mov': 'video', 'webm': 'video',
+    'mp3': 'audio', 'wav': 'audio', 'ogg': 'audio', 'flac': 'audio',
+}
+
+
+def classify_content(content, attachments):
+    """
+    Determine the content type of a message.
+
+    Parameters
+    ----------
+    content : str
+        The content of the message.
+    attachments : sequence of discord.Attachment
+        The attachments of the message.
+
+    Returns
+    -------
+    str or None
+        The content type of the first attachment, 'link' if the content holds a URL, or None
+        if the message shares nothing.
+    """
+
+    if attachments:
+        attachment = attachments[0]
+        mime = (attachment.content_type or '').split('/', 1)[0]
+        if mime in MIME_CONTENT_TYPES:
+            return MIME_CONTENT_TYPES[mime]
+        extension = os.path.splitext(attachment.filename)[1][1:].lower()
+        return EXTENSION_CONTENT_TYPES.get(extension, 'file')
+    if count_urls(content):
+        return 'link'
+    return None
+
+
+def emoji_key(emoji):
+    """
+    Return the identity of an emoji.
+
+    Parameters
+    ----------
+    emoji : discord.Emoji or discord.PartialEmoji or str or int
+        The emoji, or its text: a unicode emoji, ``<:name:id>`` or a custom emoji id.
+
+    Returns
+    -------
+    int or str
+        The id of a custom emoji, whatever its name; the text of a unicode emoji, without
+        variation selectors.
+    """
+
+    emoji_id = getattr(emoji, 'id', None)
+    if emoji_id is not None:
+        return emoji_id
+    if isinstance(emoji, int):
+        return emoji
+    text = str(emoji)
+    if text.isdigit():
+        return int(text)
+    if text.startswith('<'):
+        match = CUSTOM_EMOJI.fullmatch(text)
+        if match:
+            return int(match.group(1))
+    return text.replace(VARIATION_SELECTOR, '')
+
+
+class EmojiTable:
+    """
+    Reaction types by emoji, compiled for lookups.
+
+    Every emoji maps to a pair of reaction types: its type, and its type when a curator reacts
+    with it, which differs for the curator pick emoji only. Super reactions are 'super'
+    whatever their emoji.
+
+    Parameters
+    ----------
+    mapping : dict, optional
+        Emoji by reaction type, as in EMOJI_REACTION_TYPES (the default). Emoji are given in
+        any form `emoji_key` accepts. An emoji listed under 'curator_pick' is a curator pick
+        when a curator reacts with it, and of the type it is listed under (or 'generic')
+        otherwise.
+
+    Raises
+    ------
+    ValueError
+        If the mapping names an unknown reaction type, or lists an emoji under two types.
+    """
+
+    __slots__ = ('mapping', 'entries')
+
+    # Types of an unlisted emoji
+    GENERIC = ('generic', 'generic')
+
+    def __init__(self, mapping=None):
+        self.mapping = EMOJI_REACTION_TYPES if mapping is None else mapping
+        # emoji key -> (reaction type, reaction type for a curator)
+        self.entries = {}
+        picks = []
+        for kind, emoji_list in self.mapping.items():
+            if kind not in REACTION_TYPE_NAMES or kind == 'super':
+                raise ValueError(f"Unknown reaction type {kind!r}")
+            if isinstance(emoji_list, (str, int)):
+                emoji_list = [emoji_list]
+            for emoji in emoji_list:
+                key = emoji_key(emoji)
+                if kind == 'curator_pick':
+                    picks.append(key)
+                    continue
+                if key in self.entries and self.entries[key][0] != kind:
+                    raise ValueError(f"Emoji {emoji} is listed as both {self.entries[key][0]} and {kind}")
+                self.entries[key] = (kind, kind)
+        for key in picks:
+            self.entries[key] = (self.entries.get(key, self.GENERIC)[0], 'curator_pick')
+
+    def lookup(self, emoji):
+        """Return the ``(reaction type, reaction type for a curator)`` pair of a normal reaction emoji."""
+        return self.entries.get(emoji_key(emoji), self.GENERIC)
+
+    def reaction_type(self, emoji, burst=False, curator=False):
+        """Return the reaction type of a reaction; see `reaction_type`."""
+        if burst:
+            return 'super'
+        return self.entries.get(emoji_key(emoji), self.GENERIC)[1 if curator else 0]
+
+
+# The table of the scoring configuration
+DEFAULT_EMOJI_TABLE = EmojiTable()
+
+
+def reaction_type(emoji, burst=False, curator=False, table=None):
+    """
+    Map a Discord reaction onto one of the reaction types of REACTION_POINTS.
+
+    Parameters
+    ----------
+    emoji : discord.Emoji or discord.PartialEmoji or str
+        The reaction emoji.
+    burst : bool, optional
+        Whether the reaction is a super reaction, by default False.
+    curator : bool, optional
+        Whether the reactor is a curator, by default False.
+    table : EmojiTable, optional
+        The emoji configuration, by default DEFAULT_EMOJI_TABLE.
+
+    Returns
+    -------
+    str
+        'super' for any super reaction, 'curator_pick' for a curator's curator pick emoji, the
+        type the emoji is listed under, or 'generic'.
+    """
+
+    return (table or DEFAULT_EMOJI_TABLE).reaction_type(emoji, burst, curator)
+
+
+def reaction_weight(reaction_type):
+    """Return the points a reaction of the given type is worth."""
+    return REACTION_POINTS.get(reaction_type, REACTION_POINTS['generic'])
+
+
+class PostBatch:
+    """
+    The posts of one page of messages, as parallel lists.
+
+    Attributes
+    ----------
+    message_ids : list of int
+    channel_ids : list of int
+    authors : list of str
+        Names of the authors.
+    posts : list of Post
+        The posts, with their reactions packed into arrays. Reactors are user ids, or None
+        when unknown.
+    """
+
+    __slots__ = ('message_ids', 'channel_ids', 'authors', 'posts')
+
+    def __init__(self):
+        self.message_ids = []
+        self.channel_ids = []
+        self.authors = []
+        self.posts = []
+
+    def __len__(self):
+        return len(self.posts)
+
+    def append(self, message_id, channel_id, author, post):
+        self.message_ids.append(message_id)
+        self.channel_ids.append(channel_id)
+        self.authors.append(author)
+        self.posts.append(post)
+
+
+async def ingest_messages(messages, ignore_author=None, fetch_reactors=None, is_curator=None, emoji_table=None):
+    """
+    Build the posts of a page of messages.
+
+    Parameters
+    ----------
+    messages : sequence of discord.Message
+        The page of messages.
+    ignore_author : discord.User, optional
+        An author whose messages are skipped, such as the bot itself.
+    fetch_reactors : callable, optional
+        Coroutine function called as ``fetch_reactors(reaction)`` for every reaction, returning
+        ``(reactor, burst)`` pairs, or None to skip looking up the reactors of that reaction.
+        Reactions whose reactors are not looked up are recorded from their counts, with None
+        reactors.
+    is_curator : callable, optional
+        Called with a reactor to tell whether they are a curator. Without it, nobody is.
+    emoji_table : EmojiTable, optional
+        The types of the reaction emoji, by default DEFAULT_EMOJI_TABLE.
+
+    Returns
+    -------
+    PostBatch
+        The posts of the messages that share something.
+    """
+
+    entries = (emoji_table or DEFAULT_EMOJI_TABLE).entries
+    batch = PostBatch()
+    for message in messages:
+        if message.author == ignore_author:
+            continue
+        content_type = classify_content(message.content, message.attachments)
+        if content_type is None:
+            continue
+        post = Post(content_type, message.created_at, compact=True)
+        for reaction in message.reactions:
+            # One lookup per emoji, shared by all its reactors
+            kinds = entries.get(emoji_key(reaction.emoji), EmojiTable.GENERIC)
+            reactors = None if fetch_reactors is None else await fetch_reactors(reaction)
+            if reactors is None:
+                for _ in range(reaction.normal_count):
+                    post.add_reaction(kinds[0], None)
+                for _ in range(reaction.burst_count):
+                    post.add_reaction('super', None)
+                continue
+            for reactor, burst in reactors:
+                if burst:
+                    post.add_reaction('super', reactor.id)
+                    continue
+                curator = is_curator is not None and is_curator(reactor)
+                post.add_reaction(kinds[1 if curator else 0], reactor.id)
+        batch.append(message.id, message.channel.id, message.author.name, post)
+    return batch
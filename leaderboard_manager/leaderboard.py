@@ -1,8 +1,111 @@
 # Leaderboard and Mock Data functions
-def generate_leaderboard(users, timeframe='daily'):
-    for user in users:
-        user.update_score()
+import heapq
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
 
-    sorted_users = sorted(users, key=lambda u: u.total_score, reverse=True)
-    for rank, user in enumerate(sorted_users, 1):
-        print(f"{rank}. {user.username} - {user.total_score} points")
+from .buckets import parse_time_frame
+from .scoring import calculate_score_breakdown, in_timezone
+
+# A row of a leaderboard. Tied users share a rank and the next rank is skipped ("1224" ranking).
+LeaderboardRow = namedtuple('LeaderboardRow', ['rank', 'user', 'score', 'breakdown'])
+
+
+class TimeframeView:
+    # The posts a user made within a time frame, scored by the scoring functions as if they
+    # were all of the user's posts
+    __slots__ = ('username', 'posts', 'timestamps', 'streak')
+
+    def __init__(self, user, count, streak):
+        self.username = user.username
+        self.posts = user.posts[len(user.posts) - count:]
+        self.timestamps = user.timestamps[len(user.timestamps) - count:]
+        self.streak = streak
+
+    def count_posts_since(self, cutoff):
+        return len(self.timestamps) - bisect_right(self.timestamps, cutoff)
+
+    def current_streak(self, now=None):
+        return self.streak
+
+
+def generate_leaderboard(users, timeframe='daily', limit=10, start=0, now=None):
+    """
+    Rank users by their score over a time frame and return one page of the ranking.
+
+    Only the ``start + limit`` best users are selected, without sorting everybody. For the
+    all-time frame, scores come from the users' incremental `User.update_score`, so only users
+    whose posts or reactions changed since the last call are recomputed. Shorter time frames
+    only score the posts made within them.
+
+    Parameters
+    ----------
+    users : iterable of User
+        The users to rank.
+    timeframe : str, optional
+        'daily', 'weekly', 'monthly', 'alltime' or a number of days such as '14d', by default
+        'daily'.
+    limit : int or None, optional
+        The number of rows to return, by default 10. None returns every ranked user.
+    start : int, optional
+        The number of rows to skip, for pages after the first, by default 0.
+    now : datetime, optional
+        The time the time frame ends at, by default the current time. Every user is scored
+        against the same instant.
+
+    Returns
+    -------
+    list of LeaderboardRow
+        The rows, best first. Users without posts in the time frame are not ranked, and tied
+        users keep their order in ``users``.
+
+    Raises
+    ------
+    ValueError
+        If the time frame is unknown.
+    """
+
+    days = parse_time_frame(timeframe)
+    if now is None:
+        now = datetime.now(timezone.utc)
+    if days is None:
+        candidates = [(user.update_score('daily', now), user, None) for user in users if user.posts]
+    else:
+        cutoff = now - timedelta(days=days)
+        # The cutoff in the timezone of the posts, by timezone; naive and aware posts both occur
+        cutoffs = {}
+        candidates = []
+        for user in users:
+            count = 0
+            if user.posts:
+                tzinfo = user.timestamps[0].tzinfo
+                if tzinfo not in cutoffs:
+                    cutoffs[tzinfo] = in_timezone(cutoff, tzinfo)
+                count = user.count_posts_since(cutoffs[tzinfo])
+            if count:
+                view = TimeframeView(user, count, min(user.current_streak(now), days))
+                breakdown = calculate_score_breakdown(view, 'daily', now)
+                candidates.append((breakdown['total'], user, breakdown))
+
+    if limit is None:
+        selected = sorted(candidates, key=lambda candidate: candidate[0], reverse=True)
+    else:
+        selected = heapq.nlargest(start + limit, candidates, key=lambda candidate: candidate[0])
+
+    rows = []
+    rank = 0
+    previous = None
+    for position, (score, user, breakdown) in enumerate(selected, 1):
+        if score != previous:
+            rank = position
+            previous = score
+        if position > start:
+            if breakdown is None:
+                breakdown = calculate_score_breakdown(user, 'daily', now)
+            rows.append(LeaderboardRow(rank, user, score, breakdown))
+    return rows
+
+
+def format_leaderboard(rows):
+    """Render leaderboard rows as text, one ``rank. username - score points`` line per row."""
+    return "\n".join(f"{row.rank}. {row.user.username} - {row.score:g} points" for row in rows)
@@ -0,0 +1,171 @@
+"""
+Metrics Module
+--------------
+
+This module provides a lightweight in-process metrics registry: counters, gauges and latency
+histograms, cheap enough to update on every crawled message.
+
+The registry renders to a Prometheus-style text format, which can be dumped through the
+bot's admin command or written to a local file.
+
+Classes:
+- Counter: A monotonically increasing value.
+- Gauge: A value that can go up and down.
+- Histogram: Counts of observations in cumulative buckets, plus their sum.
+- Registry: Named, labelled metrics and the collectors refreshing them.
+"""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the default latency buckets
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Counter:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Gauge:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Histogram:
+    """
+    Counts of observed values in cumulative buckets.
+
+    Parameters
+    ----------
+    buckets : sequence of float
+        Sorted upper bounds of the buckets. An implicit '+Inf' bucket catches the rest.
+    """
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    @contextmanager
+    def time(self):
+        """Observe the number of seconds the block takes."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            yield f"{name}_bucket", labels + (('le', le),), cumulative
+        yield f"{name}_count", labels, self.count
+        yield f"{name}_sum", labels, self.sum
+
+
+class Registry:
+    """
+    A set of named metrics, each with any number of label combinations.
+    """
+
+    def __init__(self):
+        # name -> [kind, help, {labels: metric}]
+        self.families = {}
+        self.collectors = []
+
+    def _get(self, kind, factory, name, help, labels):
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = [kind, help, {}]
+        elif family[0] != kind:
+            raise ValueError(f"Metric {name} is a {family[0]}, not a {kind}")
+        key = tuple(sorted(labels.items()))
+        metric = family[2].get(key)
+        if metric is None:
+            metric = family[2][key] = factory()
+        return metric
+
+    def counter(self, name, help='', **labels):
+        """Return the counter with the given name and labels, creating it if needed."""
+        return self._get('counter', Counter, name, help, labels)
+
+    def gauge(self, name, help='', **labels):
+        """Return the gauge with the given name and labels, creating it if needed."""
+        return self._get('gauge', Gauge, name, help, labels)
+
+    def histogram(self, name, help='', buckets=DEFAULT_BUCKETS, **labels):
+        """Return the histogram with the given name and labels, creating it if needed."""
+        return self._get('histogram', lambda: Histogram(buckets), name, help, labels)
+
+    def add_collector(self, collector):
+        """Register a function called before every render, to refresh gauges that are derived from other state."""
+        self.collectors.append(collector)
+
+    def remove_collector(self, collector):
+        self.collectors.remove(collector)
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text format.
+
+        Returns
+        -------
+        str
+            One ``name{label="value"} value`` line per sample, preceded by HELP and TYPE lines.
+        """
+
+        for collector in self.collectors:
+            collector(self)
+        lines = []
+        for name, (kind, help, metrics) in sorted(self.families.items()):
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in sorted(metrics.items()):
+                for sample, sample_labels, value in metric.samples(name, labels):
+                    if sample_labels:
+                        rendered = ",".join(f'{key}="{_escape(val)}"' for key, val in sample_labels)
+                        sample = f"{sample}{{{rendered}}}"
+                    lines.append(f"{sample} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write the rendered metrics to a local file, replacing its content."""
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(self.render())
+
+
+# The registry shared by the whole bot
+REGISTRY = Registry()
@@ -1,26 +1,242 @@
+from array import array
+from bisect import bisect_right
+from datetime import datetime
+
+from .buckets import ActivityBitmap, day_number
+from .config import CONTENT_TYPES, REACTION_POINTS
+from .scoring import combine_score, timeframe_cutoff
+
+# Content types and reaction types are interned to small integer codes, shared by every post
+# and reaction. Codes are handed out as new names are seen and never change afterwards.
+CONTENT_TYPE_NAMES = list(CONTENT_TYPES)
+CONTENT_TYPE_CODES = {name: code for code, name in enumerate(CONTENT_TYPE_NAMES)}
+REACTION_TYPE_NAMES = list(REACTION_POINTS) + ['curator_pick']
+REACTION_TYPE_CODES = {name: code for code, name in enumerate(REACTION_TYPE_NAMES)}
+# Reactor id stored in a ReactionArray for an unknown (None) reactor
+NO_REACTOR = -1
+
+
+def intern_type(name, names, codes):
+    # Returns the code of a type name, handing out a new one for a name never seen before
+    code = codes.get(name)
+    if code is None:
+        code = codes[name] = len(names)
+        names.append(name)
+    return code
+
+
 class User:
+    __slots__ = ('username', 'posts', 'timestamps', 'total_score', 'post_count', 'reaction_points',
+                 'content_types', 'reactors', 'curator_picks', 'activity', 'dirty', 'recent', 'recent_used')
+
     def __init__(self, username):
         self.username = username
+        # Posts in chronological order, with their timestamps in a parallel list for bisecting
         self.posts = []
+        self.timestamps = []
         self.total_score = 0
+        # Running aggregates of the posts and their reactions, kept up to date by add_post and
+        # by the posts' add_reaction and remove_reaction
+        self.post_count = 0
+        self.reaction_points = 0
+        self.content_types = {}  # content type -> number of posts
+        self.reactors = {}  # reactor -> number of reactions
+        self.curator_picks = 0
+        # The days with a post, for the consistency bonus
+        self.activity = ActivityBitmap()
+        # Whether the aggregates changed since the score was last updated
+        self.dirty = True
+        # (timeframe, cutoff range, recent post count) of the last count; the count holds for
+        # every cutoff in the range
+        self.recent = None
+        # The (recent post count, streak) total_score was last computed with
+        self.recent_used = None
+
+    def add_post(self, post):
+        # Inserts the post at its place in time; O(1) for the usual, newest, post
+        index = bisect_right(self.timestamps, post.timestamp)
+        self.timestamps.insert(index, post.timestamp)
+        self.posts.insert(index, post)
+        self.count_post(post, 1)
 
-    def update_score(self):
-        # This method will utilize functions from scoring.py
-        # Its implementation will be filled later
-        pass
+    def count_post(self, post, sign):
+        # Adds (or with a negative sign, removes) a post and its reactions to the aggregates
+        post.user = self if sign > 0 else None
+        self.post_count += sign
+        count = self.content_types.get(post.content_type, 0) + sign
+        if count > 0:
+            self.content_types[post.content_type] = count
+        else:
+            del self.content_types[post.content_type]
+        self.activity.add(day_number(post.timestamp.timestamp()), sign)
+        for reaction in post.reactions:
+            self.count_reaction(reaction, sign)
+        self.recent = None
+        self.dirty = True
+
+    def count_reaction(self, reaction, sign):
+        # Adds (or with a negative sign, removes) a reaction to the aggregates
+        self.reaction_points += sign * REACTION_POINTS.get(reaction.type, REACTION_POINTS['generic'])
+        count = self.reactors.get(reaction.reactor, 0) + sign
+        if count > 0:
+            self.reactors[reaction.reactor] = count
+        else:
+            del self.reactors[reaction.reactor]
+        if reaction.type == 'curator_pick':
+            self.curator_picks += sign
+        self.dirty = True
+
+    def rebuild_aggregates(self):
+        # Recounts the aggregates from scratch, after posts were added to or removed from the
+        # list directly
+        self.posts.sort(key=lambda post: post.timestamp)
+        self.timestamps = [post.timestamp for post in self.posts]
+        self.post_count = 0
+        self.reaction_points = 0
+        self.content_types = {}
+        self.reactors = {}
+        self.curator_picks = 0
+        self.activity = ActivityBitmap()
+        for post in self.posts:
+            self.count_post(post, 1)
+        self.dirty = True
+
+    def count_posts_since(self, cutoff):
+        # Number of posts made strictly after the cutoff, in O(log n)
+        if len(self.timestamps) != len(self.posts):
+            # Posts were appended to the list directly; sort them back into time order
+            self.rebuild_aggregates()
+        return len(self.timestamps) - bisect_right(self.timestamps, cutoff)
+
+    def update_score(self, timeframe='daily', now=None):
+        # Updates total_score from the aggregates, as scoring.calculate_total_score would. The
+        # score is only recombined when the aggregates changed, a post entered or left the
+        # frequency decay timeframe or the streak changed, so updating an unchanged user is cheap.
+        if self.post_count != len(self.posts):
+            self.rebuild_aggregates()
+        used = (self.count_recent_posts(timeframe, now), self.current_streak(now))
+        if self.dirty or used != self.recent_used:
+            self.total_score = combine_score(self.post_count, self.reaction_points, len(self.content_types),
+                                             used[0], len(self.reactors), self.curator_picks, used[1])
+            self.recent_used = used
+            self.dirty = False
+        return self.total_score
+
+    def current_streak(self, now=None):
+        # Number of consecutive days with a post up to now (or up to yesterday)
+        if self.post_count != len(self.posts):
+            self.rebuild_aggregates()
+        if now is None:
+            now = datetime.now(self.timestamps[0].tzinfo if self.timestamps else None)
+        return self.activity.streak(day_number(now.timestamp()))
+
+    def count_recent_posts(self, timeframe, now=None):
+        # Number of posts within the timeframe, reusing the last count while the cutoff stays
+        # between the same two posts
+        if not self.posts:
+            return 0
+        cutoff = timeframe_cutoff(timeframe, self.timestamps[0].tzinfo, now)
+        if cutoff is None:
+            return 0
+        recent = self.recent
+        if recent is not None and recent[0] == timeframe:
+            low, high = recent[1]
+            if (low is None or low <= cutoff) and (high is None or cutoff < high):
+                return recent[2]
+        index = bisect_right(self.timestamps, cutoff)
+        low = self.timestamps[index - 1] if index > 0 else None
+        high = self.timestamps[index] if index < len(self.timestamps) else None
+        self.recent = (timeframe, (low, high), len(self.timestamps) - index)
+        return self.recent[2]
 
 
 class Post:
-    def __init__(self, content_type, timestamp):
-        self.content_type = content_type
+    __slots__ = ('content_type_code', 'timestamp', 'reactions', 'user')
+
+    def __init__(self, content_type, timestamp, compact=False):
+        # With compact, reactions are packed into a ReactionArray instead of a list of objects
+        self.content_type_code = intern_type(content_type, CONTENT_TYPE_NAMES, CONTENT_TYPE_CODES)
         self.timestamp = timestamp
-        self.reactions = []
+        self.reactions = ReactionArray() if compact else []
+        # The user whose aggregates count this post, set by User.add_post
+        self.user = None
+
+    @property
+    def content_type(self):
+        return CONTENT_TYPE_NAMES[self.content_type_code]
+
+    @content_type.setter
+    def content_type(self, content_type):
+        # The post is taken out of its user's aggregates and counted again with the new type
+        user = self.user
+        if user is not None:
+            user.count_post(self, -1)
+        self.content_type_code = intern_type(content_type, CONTENT_TYPE_NAMES, CONTENT_TYPE_CODES)
+        if user is not None:
+            user.count_post(self, 1)
 
     def add_reaction(self, reaction_type, reactor):
-        self.reactions.append(Reaction(reaction_type, reactor))
+        reaction = Reaction(reaction_type, reactor)
+        self.reactions.append(reaction)
+        if self.user is not None:
+            self.user.count_reaction(reaction, 1)
+
+    def remove_reaction(self, reactor, reaction_types):
+        # Removes and returns the first reaction by the reactor of one of the given types, if any
+        for index, reaction in enumerate(self.reactions):
+            if reaction.reactor == reactor and reaction.type in reaction_types:
+                if self.user is not None:
+                    self.user.count_reaction(reaction, -1)
+                return self.reactions.pop(index)
+        return None
 
 
 class Reaction:
+    __slots__ = ('code', 'reactor')
+
     def __init__(self, type, reactor):
-        self.type = type
-        self.reactor = reactor
+        self.code = intern_type(type, REACTION_TYPE_NAMES, REACTION_TYPE_CODES)
+        # Reactors are kept as user ids; discord users and members are replaced by theirs
+        self.reactor = getattr(reactor, 'id', reactor)
+
+    @classmethod
+    def from_code(cls, code, reactor):
+        reaction = cls.__new__(cls)
+        reaction.code = code
+        reaction.reactor = reactor
+        return reaction
+
+    @property
+    def type(self):
+        return REACTION_TYPE_NAMES[self.code]
+
+
+class ReactionArray:
+    # The reactions of a post packed into two arrays, 9 bytes per reaction. It behaves like
+    # the list of Reaction objects it replaces; reactions are materialized as they are read.
+    __slots__ = ('codes', 'reactors')
+
+    def __init__(self):
+        self.codes = array('B')
+        self.reactors = array('q')
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        for code, reactor in zip(self.codes, self.reactors):
+            yield Reaction.from_code(code, None if reactor == NO_REACTOR else reactor)
+
+    def __getitem__(self, index):
+        reactor = self.reactors[index]
+        return Reaction.from_code(self.codes[index], None if reactor == NO_REACTOR else reactor)
+
+    def append(self, reaction):
+        self.codes.append(reaction.code)
+        self.reactors.append(NO_REACTOR if reaction.reactor is None else reaction.reactor)
+
+    def pop(self, index=-1):
+        reaction = self[index]
+        del self.codes[index]
+        del self.reactors[index]
+        return reaction
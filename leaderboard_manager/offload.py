@@ -0,0 +1,182 @@
+"""
+Offload Module
+--------------
+
+This module moves the CPU-heavy rebuilds of leaderboard boards off the event loop, into a
+pool of worker processes, so that the bot keeps answering the gateway while a large board is
+built from scratch.
+
+Rebuilding a board means scoring the `DayBuckets` of every user of a channel. Small channels
+are still scored inline, where it is cheaper than shipping the buckets to a worker. Large ones
+are pickled in batches, with the loop yielding between batches, scored by the workers in
+parallel and merged back into a `Board`.
+
+Users whose activity changes while their buckets are in flight are tracked by the
+`GuildState` and rescored on the merged board before it is installed.
+
+Functions:
+- rank_buckets: Scores a pickled batch of buckets; runs in the worker processes.
+
+Classes:
+- Offloader: Builds boards inline or in a process pool depending on their size.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .ranking import Board
+
+# Size of the buckets pickled and scored per worker task, counted in users plus their distinct
+# reactors, which make up most of the pickled data
+OFFLOAD_BATCH_WEIGHT = 2000
+# Channels with fewer users than this are scored inline
+OFFLOAD_MIN_USERS = 5000
+# Niceness added to the workers, so that the event loop wins when they compete for a core
+WORKER_NICENESS = 10
+
+
+def rank_buckets(payload, days, today):
+    """
+    Score a batch of users over a time frame.
+
+    Parameters
+    ----------
+    payload : bytes
+        A pickled list of ``(user, DayBuckets)`` pairs.
+    days : int or None
+        The length of the time frame in days, None for all time.
+    today : int
+        The day number of the last day of the time frame.
+
+    Returns
+    -------
+    list of tuple
+        ``(-score, user)`` pairs of the users with a positive score, sorted.
+    """
+
+    ranked = []
+    for user, buckets in pickle.loads(payload):
+        score = buckets.score(days, today)
+        if score > 0:
+            ranked.append((-score, user))
+    ranked.sort()
+    return ranked
+
+
+def _init_worker():
+    if hasattr(os, 'nice'):
+        os.nice(WORKER_NICENESS)
+
+
+class Offloader:
+    """
+    Build the boards of guilds, in a process pool when they are large.
+
+    Parameters
+    ----------
+    max_workers : int
+        The number of worker processes. 0 scores every board inline.
+    min_users : int, optional
+        The number of users from which a board is built in the pool, by default
+        OFFLOAD_MIN_USERS.
+    batch_weight : int, optional
+        The size of the buckets sent to a worker at once, by default OFFLOAD_BATCH_WEIGHT.
+    """
+
+    def __init__(self, max_workers, min_users=OFFLOAD_MIN_USERS, batch_weight=OFFLOAD_BATCH_WEIGHT):
+        self.max_workers = max_workers
+        self.min_users = min_users
+        self.batch_weight = batch_weight
+        # The pool is only started once a board is large enough to need it
+        self.executor = None
+        # (guild_id, channel_key, days) -> task building the board, shared by concurrent callers
+        self.building = {}
+
+    async def build_board(self, state, channel_key, days):
+        """
+        Return the board of a channel over a time frame, building it if needed.
+
+        Parameters
+        ----------
+        state : GuildState
+            The state of the guild.
+        channel_key : str
+            The channel of the board.
+        days : int or None
+            The length of the time frame in days, None for all time.
+
+        Returns
+        -------
+        Board
+            The board, kept up to date by the state from then on.
+        """
+
+        board = state.cached_board(channel_key, days)
+        if board is not None:
+            return board
+        if not self.max_workers or len(state.data.get(channel_key, ())) < self.min_users:
+            return state.get_board(channel_key, days)
+
+        key = (state.guild_id, channel_key, days)
+        task = self.building.get(key)
+        if task is None:
+            task = self.building[key] = asyncio.ensure_future(self._rebuild(state, channel_key, days))
+            task.add_done_callback(lambda _: self.building.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _rebuild(self, state, channel_key, days):
+        today = state.boards_day
+        touched = state.begin_rebuild(channel_key)
+        try:
+            loop = asyncio.get_running_loop()
+            futures = []
+            for batch in self._batches(list(state.data.get(channel_key, {}).items())):
+                payload = pickle.dumps(batch, pickle.HIGHEST_PROTOCOL)
+                futures.append(loop.run_in_executor(self._executor(), rank_buckets, payload, days, today))
+                # Let the gateway in between two batches
+                await asyncio.sleep(0)
+            runs = await asyncio.gather(*futures)
+        except (BrokenProcessPool, OSError) as e:
+            state.end_rebuild(channel_key, touched)
+            logging.error(f"Could not rebuild the {channel_key} board in the worker pool, scoring it inline. "
+                          f"Reason: {e}")
+            self.shutdown()
+            return state.get_board(channel_key, days)
+        except BaseException:
+            state.end_rebuild(channel_key, touched)
+            raise
+        board = Board.from_ranked(pair for run in runs for pair in run)
+        return state.finish_rebuild(channel_key, days, today, board, touched)
+
+    def _batches(self, items):
+        """Split ``(user, DayBuckets)`` pairs into batches of about `batch_weight`."""
+        batch = []
+        weight = 0
+        for item in items:
+            batch.append(item)
+            weight += 1 + len(item[1].reactors)
+            if weight >= self.batch_weight:
+                yield batch
+                batch = []
+                weight = 0
+        if batch:
+            yield batch
+
+    def _executor(self):
+        if self.executor is None:
+            # Forking would copy the pages of the whole state on write, and fork the threads of
+            # discord.py; spawned workers start from a fresh interpreter instead
+            self.executor = ProcessPoolExecutor(self.max_workers, multiprocessing.get_context('spawn'),
+                                                initializer=_init_worker)
+        return self.executor
+
+    def shutdown(self):
+        """Stop the worker processes; the pool is started again when next needed."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,156 @@
+"""
+Ranking Module
+--------------
+
+This module keeps the scores of a leaderboard in rank order as they change, so that showing
+the top of a board, or where a user stands on it, never needs to sort its whole population.
+
+Ranks are competition-style: users with the same score share a rank, and the ranks after them
+are skipped ("1224").
+
+Classes:
+- Board: Scores of one leaderboard, indexed by rank.
+"""
+
+from itertools import count
+
+from sortedcontainers import SortedList
+
+# Versions are drawn from one counter, so they never repeat even across rebuilt boards
+_versions = count(1)
+
+
+class Board:
+    """
+    Scores of one leaderboard, kept sorted from the highest to the lowest score.
+
+    Updating a score costs O(log n); reading ranks ``start`` to ``start + n`` costs
+    O(log n + n), and looking up the rank of a user O(log n). Users without points are not
+    ranked.
+
+    Every change of a score gives the board a new `version`, which rendered copies of the
+    board can be checked against.
+    """
+
+    def __init__(self, scores=None):
+        self.version = next(_versions)
+        self.scores = {}
+        # (-score, user) pairs, so that iterating goes from the highest score down and
+        # users with the same score are ordered by name
+        self.order = SortedList()
+        if scores:
+            for user, score in scores.items():
+                self.set(user, score)
+
+    @classmethod
+    def from_ranked(cls, ranked):
+        """
+        Build a board from ``(-score, user)`` pairs, such as the sorted runs returned by
+        worker processes, without inserting users one at a time.
+
+        Pairs with a score of zero or less are skipped.
+        """
+
+        board = cls()
+        ranked = [pair for pair in ranked if pair[0] < 0]
+        board.scores = {user: -negated for negated, user in ranked}
+        board.order = SortedList(ranked)
+        return board
+
+    def __len__(self):
+        return len(self.order)
+
+    def __contains__(self, user):
+        return user in self.scores
+
+    def get(self, user):
+        return self.scores.get(user, 0)
+
+    def set(self, user, score):
+        """
+        Set the score of a user, moving them to their new rank.
+
+        Parameters
+        ----------
+        user : str
+            The user whose score changed.
+        score : float
+            Their new score. Scores of zero or less remove the user from the board.
+        """
+
+        old = self.scores.get(user)
+        if old == score or (old is None and score <= 0):
+            return
+        self.version = next(_versions)
+        if old is not None:
+            self.order.remove((-old, user))
+            del self.scores[user]
+        if score > 0:
+            self.scores[user] = score
+            self.order.add((-score, user))
+
+    def top(self, n, start=0):
+        """
+        Return the users ranked ``start + 1`` to ``start + n``.
+
+        Parameters
+        ----------
+        n : int
+            The number of users to return.
+        start : int, optional
+            The number of higher ranked users to skip, by default 0.
+
+        Returns
+        -------
+        list of tuple
+            ``(user, score)`` pairs, from the highest score down.
+        """
+
+        return [(user, -negated) for negated, user in self.order.islice(start, start + n)]
+
+    def rank_of(self, user):
+        """
+        Return the rank of a user.
+
+        Parameters
+        ----------
+        user : str
+            The user to look up.
+
+        Returns
+        -------
+        int or None
+            One more than the number of users with a higher score, or None if the user is not
+            ranked.
+        """
+
+        score = self.scores.get(user)
+        if score is None:
+            return None
+        # (-score,) sorts before every (-score, user) pair with the same score
+        return self.order.bisect_left((-score,)) + 1
+
+    def users_around(self, user, k):
+        """
+        Return the users ranked around a user.
+
+        Parameters
+        ----------
+        user : str
+            The user to look up.
+        k : int
+            The number of users to return above and below the user.
+
+        Returns
+        -------
+        list of tuple
+            ``(rank, user, score)`` triples of up to ``2 * k + 1`` users, including the user
+            themselves, from the highest score down. Empty if the user is not ranked.
+        """
+
+        score = self.scores.get(user)
+        if score is None:
+            return []
+        index = self.order.index((-score, user))
+        return [(self.order.bisect_left((negated,)) + 1, neighbour, -negated)
+                for negated, neighbour in self.order.islice(max(index - k, 0), index + k + 1)]
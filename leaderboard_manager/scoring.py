@@ -6,13 +6,28 @@ This module provides functions to calculate scores for users based on their acti
 It factors in post frequencies, reactions, and other metrics to assign a user score.
 
 Functions:
+- in_timezone: Helper function converting an instant to the timezone of naive or aware posts.
+- timeframe_cutoff: Helper function returning the earliest time within a given timeframe.
 - post_within_timeframe: Helper function to check if a post falls within a given timeframe.
 - calculate_base_post_points: Calculates points based on the number of posts.
 - calculate_reaction_points: Calculates points based on the reactions received on posts.
 - calculate_diversity_multiplier: Determines a multiplier based on diversity of post content types.
+- count_recent_posts: Counts the posts of a user within a given timeframe.
 - calculate_frequency_decay: Adjusts score based on post frequency.
 - calculate_unique_reactor_bonus: Awards bonus points for unique reactors to a user's posts.
 - calculate_curator_bonus: Awards bonus points for posts marked by curators.
+- calculate_consistency_bonus: Awards bonus points for streaks of consecutive days with a post.
+- combine_breakdown: Combines the aggregated activity of a user into every component of their score.
+- combine_score: Combines the aggregated activity of a user into their score.
+- calculate_total_score: Calculates the total score of a user from all of the above.
+- calculate_score_breakdown: Calculates every component of a user's score in a single pass over their posts.
+- calculate_hot_score: Calculates a user's score with every post and reaction decayed by its age.
+
+The calculate_* functions each walk the posts of the user and are kept as the reference
+implementation; `calculate_score_breakdown` gives identical results in one traversal.
+
+Timeframes end at ``now``. When scoring many users, compute it once and pass it to every call
+so that all users are scored against the same instant.
 """
 
 from datetime import datetime, timedelta
@@ -23,10 +38,66 @@ from .config import (
     FREQUENCY_DECAY_THRESHOLD,
     FREQUENCY_DECAY_RATE,
     UNIQUE_REACTOR_BONUS,
-    CURATOR_BONUS)
+    CURATOR_BONUS,
+    CONSISTENCY_BONUS,
+    CONSISTENCY_STREAK_DAYS,
+    HOT_SCORE_HALF_LIFE)
 
 
-def post_within_timeframe(post, timeframe):
+def in_timezone(moment, tzinfo):
+    """
+    Convert an instant to the timezone of a set of posts.
+
+    Parameters
+    ----------
+    moment : datetime
+        The instant, naive or aware.
+    tzinfo : datetime.tzinfo or None
+        The timezone of the posts, None for naive timestamps.
+
+    Returns
+    -------
+    datetime
+        The same instant, comparable with the timestamps of the posts. Naive timestamps are
+        in local time, like datetime.now().
+    """
+
+    if moment.tzinfo is tzinfo:
+        return moment
+    return moment.astimezone(tzinfo) if tzinfo is not None else moment.astimezone().replace(tzinfo=None)
+
+
+def timeframe_cutoff(timeframe, tzinfo=None, now=None):
+    """
+    Determine the time after which posts fall within a specified timeframe.
+
+    Parameters
+    ----------
+    timeframe : str
+        The timeframe. Options are 'daily', 'weekly', or 'monthly'.
+    tzinfo : datetime.tzinfo, optional
+        The timezone of the posts, None for naive timestamps.
+    now : datetime, optional
+        The time the timeframe ends at, by default the current time. It is converted to
+        `tzinfo`, so a single instant can be shared by naive and aware posts.
+
+    Returns
+    -------
+    datetime or None
+        The cutoff, or None if the timeframe is unknown and no post falls within it.
+    """
+
+    now = datetime.now(tzinfo) if now is None else in_timezone(now, tzinfo)
+    if timeframe == 'daily':
+        return now - timedelta(days=1)
+    elif timeframe == 'weekly':
+        return now - timedelta(weeks=1)
+    elif timeframe == 'monthly':
+        return now - timedelta(days=30)
+    return None
+
+
+def post_within_timeframe(post, timeframe, now=None):
     """
     Determine if a post falls within a specified timeframe.
 
@@ -36,6 +107,8 @@ def post_within_timeframe(post, timeframe):
         The post for which the check is being made.
     timeframe : str
         The desired timeframe to check against. Options are 'daily', 'weekly', or 'monthly'.
+    now : datetime, optional
+        The time the timeframe ends at, by default the current time.
 
     Returns
     -------
@@ -43,14 +116,9 @@ def post_within_timeframe(post, timeframe):
         True if the post is within the specified timeframe, otherwise False.
     """
 
-    now = datetime.now()
-    if timeframe == 'daily':
-        return post.timestamp > now - timedelta(days=1)
-    elif timeframe == 'weekly':
-        return post.timestamp > now - timedelta(weeks=1)
-    elif timeframe == 'monthly':
-        return post.timestamp > now - timedelta(days=30)
-    return False
+    # Compare in the timezone of the post, so that both naive and aware timestamps work
+    cutoff = timeframe_cutoff(timeframe, post.timestamp.tzinfo, now)
+    return cutoff is not None and post.timestamp > cutoff
 
 
 def calculate_base_post_points(user):
@@ -112,7 +180,35 @@ def calculate_diversity_multiplier(user):
     return DIVERSITY_MULTIPLIER if len(unique_content_types) > 1 else 1
 
 
-def calculate_frequency_decay(user, timeframe='daily'):
+def count_recent_posts(user, timeframe, now=None):
+    """
+    Count the posts of a user within a specified timeframe.
+
+    The cutoff is computed once and looked up in the user's chronological post index, so the
+    count takes O(log n) in the number of posts.
+
+    Parameters
+    ----------
+    user : User
+        The user whose posts are counted.
+    timeframe : str
+        The timeframe. Options are 'daily', 'weekly', or 'monthly'.
+    now : datetime, optional
+        The time the timeframe ends at, by default the current time.
+
+    Returns
+    -------
+    int
+        The number of posts within the timeframe.
+    """
+
+    if not user.posts:
+        return 0
+    cutoff = timeframe_cutoff(timeframe, user.posts[0].timestamp.tzinfo, now)
+    return user.count_posts_since(cutoff) if cutoff is not None else 0
+
+
+def calculate_frequency_decay(user, timeframe='daily', now=None):
     """
     Calculate score decay if the user has posted too frequently within a given timeframe.
 
@@ -122,6 +218,8 @@ def calculate_frequency_decay(user, timeframe='daily'):
         The user for whom the decay is being calculated.
     timeframe : str, optional
         The timeframe for considering post frequency, by default 'daily'.
+    now : datetime, optional
+        The time the timeframe ends at, by default the current time.
 
     Returns
     -------
@@ -129,9 +227,9 @@ def calculate_frequency_decay(user, timeframe='daily'):
         The score decay based on post frequency.
     """
 
-    recent_posts = [post for post in user.posts if post_within_timeframe(post, timeframe)]
-    if len(recent_posts) > FREQUENCY_DECAY_THRESHOLD:
-        excess = len(recent_posts) - FREQUENCY_DECAY_THRESHOLD
+    recent_posts = count_recent_posts(user, timeframe, now)
+    if recent_posts > FREQUENCY_DECAY_THRESHOLD:
+        excess = recent_posts - FREQUENCY_DECAY_THRESHOLD
         return excess * BASE_POST_POINT * FREQUENCY_DECAY_RATE
     return 0
 
@@ -175,3 +273,199 @@ def calculate_curator_bonus(user):
 
     curator_reactions = sum(1 for post in user.posts for r in post.reactions if r.type == 'curator_pick')
     return curator_reactions * CURATOR_BONUS
+
+
+def calculate_consistency_bonus(user, now=None):
+    """
+    Calculate bonus points for posting on consecutive days.
+
+    CONSISTENCY_BONUS is awarded for every CONSISTENCY_STREAK_DAYS days of the user's current
+    streak, read from their activity bitmap rather than from their posts.
+
+    Parameters
+    ----------
+    user : User
+        The user for whom the bonus is being calculated.
+    now : datetime, optional
+        The time the streak is measured at, by default the current time.
+
+    Returns
+    -------
+    float
+        The bonus points for the current streak.
+    """
+
+    return user.current_streak(now) // CONSISTENCY_STREAK_DAYS * CONSISTENCY_BONUS
+
+
+def combine_breakdown(post_count, reaction_points, content_type_count, recent_post_count, unique_reactor_count,
+                      curator_pick_count, streak_days=0):
+    """
+    Combine the aggregated activity of a user into every component of their score.
+
+    Takes the same parameters as `combine_score`.
+
+    Returns
+    -------
+    dict
+        The components of the score, as returned by `calculate_score_breakdown`.
+    """
+
+    base_post_points = post_count * BASE_POST_POINT
+    diversity_multiplier = DIVERSITY_MULTIPLIER if content_type_count > 1 else 1
+    frequency_decay = 0
+    if recent_post_count > FREQUENCY_DECAY_THRESHOLD:
+        frequency_decay = (recent_post_count - FREQUENCY_DECAY_THRESHOLD) * BASE_POST_POINT * FREQUENCY_DECAY_RATE
+    unique_reactor_bonus = unique_reactor_count * UNIQUE_REACTOR_BONUS
+    curator_bonus = curator_pick_count * CURATOR_BONUS
+    consistency_bonus = streak_days // CONSISTENCY_STREAK_DAYS * CONSISTENCY_BONUS
+    total = ((base_post_points + reaction_points) * diversity_multiplier - frequency_decay
+             + unique_reactor_bonus + curator_bonus + consistency_bonus)
+    return {
+        'base_post_points': base_post_points,
+        'reaction_points': reaction_points,
+        'diversity_multiplier': diversity_multiplier,
+        'frequency_decay': frequency_decay,
+        'unique_reactor_bonus': unique_reactor_bonus,
+        'curator_bonus': curator_bonus,
+        'consistency_bonus': consistency_bonus,
+        'total': total,
+    }
+
+
+def combine_score(post_count, reaction_points, content_type_count, recent_post_count, unique_reactor_count,
+                  curator_pick_count, streak_days=0):
+    """
+    Combine the aggregated activity of a user into their score.
+
+    The base post points and reaction points are scaled by the diversity multiplier; the frequency
+    decay is then subtracted and the unique reactor, curator and consistency bonuses added.
+
+    Parameters
+    ----------
+    post_count : int
+        The number of posts made by the user.
+    reaction_points : float
+        The weighted sum of the reactions received on those posts.
+    content_type_count : int
+        The number of distinct content types among those posts.
+    recent_post_count : int
+        The number of those posts within the frequency decay timeframe.
+    unique_reactor_count : int
+        The number of distinct users who reacted to those posts.
+    curator_pick_count : int
+        The number of 'curator_pick' reactions received on those posts.
+    streak_days : int, optional
+        The length of the user's current streak of days with a post, by default 0.
+
+    Returns
+    -------
+    float
+        The score of the user.
+    """
+
+    return combine_breakdown(post_count, reaction_points, content_type_count, recent_post_count,
+                             unique_reactor_count, curator_pick_count, streak_days)['total']
+
+
+def calculate_total_score(user, timeframe='daily', now=None):
+    """
+    Calculate the total score of a user from all scoring rules.
+
+    Parameters
+    ----------
+    user : User
+        The user for whom the score is being calculated.
+    timeframe : str, optional
+        The timeframe for the frequency decay, by default 'daily'.
+    now : datetime, optional
+        The time the timeframe ends at, by default the current time.
+
+    Returns
+    -------
+    float
+        The total score of the user.
+    """
+
+    base = calculate_base_post_points(user) + calculate_reaction_points(user)
+    score = base * calculate_diversity_multiplier(user) - calculate_frequency_decay(user, timeframe, now)
+    return (score + calculate_unique_reactor_bonus(user) + calculate_curator_bonus(user)
+            + calculate_consistency_bonus(user, now))
+
+
+def calculate_score_breakdown(user, timeframe='daily', now=None):
+    """
+    Calculate every component of a user's score in a single pass over their posts and reactions.
+
+    The components are identical to those of the calculate_* functions, which walk the posts
+    once each. Recent posts are counted in the user's chronological post index.
+
+    Parameters
+    ----------
+    user : User
+        The user for whom the score is being calculated.
+    timeframe : str, optional
+        The timeframe for the frequency decay, by default 'daily'.
+    now : datetime, optional
+        The time the timeframe ends at, by default the current time.
+
+    Returns
+    -------
+    dict
+        The 'base_post_points', 'reaction_points', 'diversity_multiplier', 'frequency_decay',
+        'unique_reactor_bonus', 'curator_bonus' and 'consistency_bonus' of the user, and their
+        'total' score as computed by `calculate_total_score`.
+    """
+
+    reaction_points_of = REACTION_POINTS.get
+    generic = REACTION_POINTS['generic']
+    reaction_points = 0
+    content_types = set()
+    unique_reactors = set()
+    curator_picks = 0
+    for post in user.posts:
+        content_types.add(post.content_type)
+        for reaction in post.reactions:
+            reaction_type = reaction.type
+            reaction_points += reaction_points_of(reaction_type, generic)
+            unique_reactors.add(reaction.reactor)
+            if reaction_type == 'curator_pick':
+                curator_picks += 1
+
+    return combine_breakdown(len(user.posts), reaction_points, len(content_types),
+                             count_recent_posts(user, timeframe, now), len(unique_reactors), curator_picks,
+                             user.current_streak(now))
+
+
+def calculate_hot_score(user, half_life=HOT_SCORE_HALF_LIFE, now=None):
+    """
+    Calculate the hot score of a user: their post and reaction points, each decayed by the
+    age of its post so that it counts half every ``half_life`` seconds.
+
+    This walks every post and is the reference for the running scores of the hot module.
+
+    Parameters
+    ----------
+    user : User
+        The user for whom the score is being calculated.
+    half_life : float, optional
+        The half-life in seconds, by default HOT_SCORE_HALF_LIFE.
+    now : datetime, optional
+        The time the score is read at, by default the current time.
+
+    Returns
+    -------
+    float
+        The hot score.
+    """
+
+    now = (now or datetime.now()).timestamp()
+    total = 0
+    for post in user.posts:
+        points = BASE_POST_POINT
+        for reaction in post.reactions:
+            points += REACTION_POINTS.get(reaction.type, REACTION_POINTS['generic'])
+            if reaction.type == 'curator_pick':
+                points += CURATOR_BONUS
+        total += points * 2.0 ** (min(post.timestamp.timestamp() - now, 0.0) / half_life)
+    return total
@@ -0,0 +1,168 @@
+"""
+Snapshots Module
+----------------
+
+This module freezes leaderboards into snapshots, so that past boards can be shown and rank
+movements ("▲3", "▼1") computed without going back to the history of the channels.
+
+A snapshot holds the ranked users of a board with their ranks and scores. For storage, ranks
+and scores are delta-encoded: both are monotonic down a board, so every value is stored as its
+(small, non-negative) difference from the one before, written as a variable-length integer
+and compressed. Scores are kept to SCORE_SCALE-ths of a point.
+
+Functions:
+- rank_movements: Diffs two snapshots of a board in linear time.
+- format_movement: Renders a rank movement as "▲3", "▼1" or "🆕".
+
+Classes:
+- Snapshot: The ranked users of a board at one point in time.
+"""
+
+import zlib
+
+# Scores are stored as integers, in this fraction of a point
+SCORE_SCALE = 100
+
+
+def _pack(values):
+    """Encode non-negative integers as LEB128 variable-length integers."""
+    data = bytearray()
+    for value in values:
+        while value > 0x7F:
+            data.append(value & 0x7F | 0x80)
+            value >>= 7
+        data.append(value)
+    return zlib.compress(bytes(data))
+
+
+def _unpack(data):
+    values = []
+    value = shift = 0
+    for byte in zlib.decompress(data):
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    return values
+
+
+class Snapshot:
+    """
+    The ranked users of a board at one point in time.
+
+    Attributes
+    ----------
+    taken_at : float
+        The Unix timestamp the snapshot was taken at.
+    users : list of str
+        The users, from the highest score down.
+    ranks : list of int
+        The competition rank of every user.
+    scores : list of float
+        The score of every user.
+    """
+
+    __slots__ = ('taken_at', 'users', 'ranks', 'scores')
+
+    def __init__(self, taken_at, users, ranks, scores):
+        self.taken_at = taken_at
+        self.users = users
+        self.ranks = ranks
+        self.scores = scores
+
+    @classmethod
+    def from_board(cls, board, taken_at):
+        """Take a snapshot of a `Board`, in one pass over its users."""
+        users = []
+        ranks = []
+        scores = []
+        rank = 0
+        for index, (user, score) in enumerate(board.top(len(board)), 1):
+            score = round(score * SCORE_SCALE) / SCORE_SCALE
+            if not scores or score != scores[-1]:
+                rank = index
+            users.append(user)
+            ranks.append(rank)
+            scores.append(score)
+        return cls(taken_at, users, ranks, scores)
+
+    def __len__(self):
+        return len(self.users)
+
+    def top(self, n, start=0):
+        """Return ``(rank, user, score)`` triples of the users ranked ``start + 1`` to ``start + n``."""
+        end = start + n
+        return list(zip(self.ranks[start:end], self.users[start:end], self.scores[start:end]))
+
+    def rank_map(self):
+        """Return the rank of every user, by user."""
+        return dict(zip(self.users, self.ranks))
+
+    def encode(self):
+        """
+        Encode the snapshot for storage.
+
+        Returns
+        -------
+        tuple of bytes
+            The compressed user names, rank deltas and score deltas.
+        """
+
+        scores = [round(score * SCORE_SCALE) for score in self.scores]
+        return (zlib.compress("\n".join(self.users).encode('utf-8')),
+                _pack(rank - previous for previous, rank in zip([1] + self.ranks, self.ranks)),
+                _pack(scores[:1] + [previous - score for previous, score in zip(scores, scores[1:])]))
+
+    @classmethod
+    def decode(cls, taken_at, users, ranks, scores):
+        """Rebuild a snapshot from the output of `encode`."""
+        users = zlib.decompress(users).decode('utf-8')
+        ranks_list = []
+        rank = 1
+        for delta in _unpack(ranks):
+            rank += delta
+            ranks_list.append(rank)
+        scores_list = []
+        score = None
+        for delta in _unpack(scores):
+            score = delta if score is None else score - delta
+            scores_list.append(score / SCORE_SCALE)
+        return cls(taken_at, users.split("\n") if users else [], ranks_list, scores_list)
+
+
+def rank_movements(previous, current):
+    """
+    Compute how far every user of a snapshot moved since a previous snapshot.
+
+    Parameters
+    ----------
+    previous : Snapshot or dict or None
+        The earlier snapshot, or its `Snapshot.rank_map`.
+    current : Snapshot
+        The later snapshot.
+
+    Returns
+    -------
+    list
+        For every user of ``current``, in order, the number of ranks they climbed (negative if
+        they fell), or None if they were not ranked in ``previous``.
+    """
+
+    if previous is None:
+        return [None] * len(current)
+    ranks = previous if isinstance(previous, dict) else previous.rank_map()
+    return [None if ranks.get(user) is None else ranks[user] - rank
+            for user, rank in zip(current.users, current.ranks)]
+
+
+def format_movement(movement):
+    """Render a rank movement as "▲3", "▼1", "🆕" for a newcomer, or nothing when unchanged."""
+    if movement is None:
+        return "🆕"
+    if movement > 0:
+        return f"▲{movement}"
+    if movement < 0:
+        return f"▼{-movement}"
+    return ""
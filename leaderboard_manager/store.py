@@ -0,0 +1,255 @@
+"""
+Store Module
+------------
+
+This module persists what the leaderboard cog has already crawled, so that a restart only
+needs to fetch the messages posted since the last shutdown instead of the whole history of
+every channel.
+
+Four tables are kept in a local SQLite database:
+- messages: the post of every scored message.
+- reactions: the reactions on those posts.
+- checkpoints: the id of the last message whose history has been processed, per channel.
+- snapshots: past leaderboards, encoded by the snapshots module.
+
+Writes are not committed individually; callers group them and call `MessageStore.commit`.
+"""
+
+import sqlite3
+from datetime import datetime, timezone
+
+from .ingest import PostBatch
+from .models import Post
+from .snapshots import Snapshot
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    message_id INTEGER PRIMARY KEY,
+    channel_id INTEGER NOT NULL,
+    user TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    content_type TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_channel ON messages (channel_id);
+CREATE TABLE IF NOT EXISTS reactions (
+    message_id INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    reactor INTEGER
+);
+CREATE INDEX IF NOT EXISTS reactions_message ON reactions (message_id);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    channel_id INTEGER PRIMARY KEY,
+    last_message_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    snapshot_id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    channel_key TEXT NOT NULL,
+    time_frame TEXT NOT NULL,
+    taken_at REAL NOT NULL,
+    users BLOB NOT NULL,
+    ranks BLOB NOT NULL,
+    scores BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_board ON snapshots (guild_id, channel_key, time_frame, taken_at);
+"""
+
+
+class MessageStore:
+    """
+    SQLite backed store of scored messages and per-channel crawl checkpoints.
+
+    Parameters
+    ----------
+    path : str
+        Path of the database file. ':memory:' keeps everything in memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.connection.commit()
+
+    def load_posts(self, channel_ids, after=None, limit=None):
+        """
+        Load the stored posts of some channels, oldest first.
+
+        Parameters
+        ----------
+        channel_ids : iterable of int
+            The channels whose posts are loaded.
+        after : int, optional
+            Only load the posts of messages after this message id, to load the posts in pages.
+        limit : int, optional
+            The largest number of posts to load, by default all of them.
+
+        Returns
+        -------
+        PostBatch
+            The posts with their reactions.
+        """
+
+        batch = PostBatch()
+        channel_ids = list(channel_ids)
+        if not channel_ids:
+            return batch
+        placeholders = ", ".join("?" * len(channel_ids))
+        posts = {}
+        for message_id, channel_id, user, created_at, content_type in self.connection.execute(
+                "SELECT message_id, channel_id, user, created_at, content_type FROM messages "
+                f"WHERE channel_id IN ({placeholders}) AND message_id > ? ORDER BY message_id LIMIT ?",
+                channel_ids + [-1 if after is None else after, -1 if limit is None else limit]):
+            post = posts[message_id] = Post(content_type, datetime.fromtimestamp(created_at, timezone.utc),
+                                            compact=True)
+            batch.append(message_id, channel_id, user, post)
+        if not batch:
+            return batch
+        for message_id, reaction_type, reactor in self.connection.execute(
+                "SELECT reactions.message_id, type, reactor FROM reactions "
+                "JOIN messages ON messages.message_id = reactions.message_id "
+                f"WHERE channel_id IN ({placeholders}) AND reactions.message_id BETWEEN ? AND ?",
+                channel_ids + [batch.message_ids[0], batch.message_ids[-1]]):
+            posts[message_id].add_reaction(reaction_type, reactor)
+        return batch
+
+    def save_batch(self, batch):
+        """Insert or replace the posts of a batch, with their reactions."""
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?)",
+            ((message_id, channel_id, user, post.timestamp.timestamp(), post.content_type)
+             for message_id, channel_id, user, post in zip(batch.message_ids, batch.channel_ids,
+                                                           batch.authors, batch.posts)))
+        self.connection.executemany(
+            "DELETE FROM reactions WHERE message_id = ?", ((message_id,) for message_id in batch.message_ids))
+        self.connection.executemany(
+            "INSERT INTO reactions VALUES (?, ?, ?)",
+            ((message_id, reaction.type, reaction.reactor)
+             for message_id, post in zip(batch.message_ids, batch.posts) for reaction in post.reactions))
+
+    def update_content(self, message_id, content_type):
+        """Update the content type of an edited message."""
+        self.connection.execute(
+            "UPDATE messages SET content_type = ? WHERE message_id = ?", (content_type, message_id))
+
+    def add_reaction(self, message_id, reaction_type, reactor):
+        self.connection.execute("INSERT INTO reactions VALUES (?, ?, ?)", (message_id, reaction_type, reactor))
+
+    def remove_reaction(self, message_id, reaction_type, reactor):
+        """Remove one reaction of the given type by the reactor (None for an unknown reactor)."""
+        self.connection.execute(
+            "DELETE FROM reactions WHERE rowid = (SELECT rowid FROM reactions "
+            "WHERE message_id = ? AND type = ? AND reactor IS ? LIMIT 1)", (message_id, reaction_type, reactor))
+
+    def replace_reactions(self, message_id, reactions=()):
+        """Replace the reactions of a message, such as when they are cleared."""
+        self.connection.execute("DELETE FROM reactions WHERE message_id = ?", (message_id,))
+        self.connection.executemany("INSERT INTO reactions VALUES (?, ?, ?)",
+                                    ((message_id, reaction.type, reaction.reactor) for reaction in reactions))
+
+    def delete_messages(self, message_ids):
+        """Remove deleted messages and their reactions from the store."""
+        message_ids = [(message_id,) for message_id in message_ids]
+        self.connection.executemany("DELETE FROM messages WHERE message_id = ?", message_ids)
+        self.connection.executemany("DELETE FROM reactions WHERE message_id = ?", message_ids)
+
+    def get_checkpoint(self, channel_id):
+        """
+        Return the id of the last processed message of a channel.
+
+        Parameters
+        ----------
+        channel_id : int
+            The channel to look up.
+
+        Returns
+        -------
+        int or None
+            The message id, or None if the channel has never been crawled.
+        """
+
+        row = self.connection.execute(
+            "SELECT last_message_id FROM checkpoints WHERE channel_id = ?", (channel_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_checkpoint(self, channel_id, message_id):
+        """Move the checkpoint of a channel forward to ``message_id``; it never moves backwards."""
+        self.connection.execute(
+            "INSERT INTO checkpoints VALUES (?, ?) ON CONFLICT (channel_id) "
+            "DO UPDATE SET last_message_id = MAX(last_message_id, excluded.last_message_id)",
+            (channel_id, message_id))
+
+    def save_snapshot(self, guild_id, channel_key, time_frame, snapshot):
+        """
+        Store a snapshot of a board.
+
+        Parameters
+        ----------
+        guild_id : int
+            The guild of the board.
+        channel_key : str
+            The channel of the board.
+        time_frame : str
+            The time frame of the board, such as 'weekly'.
+        snapshot : Snapshot
+            The snapshot.
+
+        Returns
+        -------
+        int
+            The id of the stored snapshot.
+        """
+
+        return self.connection.execute(
+            "INSERT INTO snapshots (guild_id, channel_key, time_frame, taken_at, users, ranks, scores) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (guild_id, channel_key, time_frame, snapshot.taken_at, *snapshot.encode())).lastrowid
+
+    def load_snapshot(self, snapshot_id):
+        """
+        Load a stored snapshot.
+
+        Returns
+        -------
+        tuple or None
+            ``(guild_id, channel_key, time_frame, Snapshot)``, or None if there is no such snapshot.
+        """
+
+        row = self.connection.execute(
+            "SELECT guild_id, channel_key, time_frame, taken_at, users, ranks, scores FROM snapshots "
+            "WHERE snapshot_id = ?", (snapshot_id,)).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], row[2], Snapshot.decode(*row[3:])
+
+    def latest_snapshot(self, guild_id, channel_key, time_frame, before=None):
+        """
+        Load the latest snapshot of a board, optionally taken before a given time.
+
+        Returns
+        -------
+        tuple or None
+            ``(snapshot_id, Snapshot)``, or None if the board has no snapshot.
+        """
+
+        row = self.connection.execute(
+            "SELECT snapshot_id, taken_at, users, ranks, scores FROM snapshots "
+            "WHERE guild_id = ? AND channel_key = ? AND time_frame = ? AND taken_at < ? "
+            "ORDER BY taken_at DESC LIMIT 1",
+            (guild_id, channel_key, time_frame, before if before is not None else float('inf'))).fetchone()
+        if row is None:
+            return None
+        return row[0], Snapshot.decode(*row[1:])
+
+    def list_snapshots(self, guild_id, channel_key, time_frame, limit=10):
+        """Return ``(snapshot_id, taken_at)`` pairs of the latest snapshots of a board, newest first."""
+        return self.connection.execute(
+            "SELECT snapshot_id, taken_at FROM snapshots WHERE guild_id = ? AND channel_key = ? AND time_frame = ? "
+            "ORDER BY taken_at DESC LIMIT ?", (guild_id, channel_key, time_frame, limit)).fetchall()
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,458 @@
+"""
+Mock Data Module
+----------------
+
+This module generates synthetic guilds to load-test the leaderboard offline, from a thousand
+posts up to ten million.
+
+A `SyntheticGuild` is fully determined by its parameters and seed. It models a community in
+which a few members post most of the content (posts are spread over members by Pareto weights),
+reactions come in bursts (a few posts collect most of them), posts share links, images,
+videos, audio and files among plain chat, and curators hand out curator picks.
+
+Messages are generated lazily, oldest first and a channel at a time, so only the members are
+held in memory. The same messages can be consumed as:
+- `batches`: `PostBatch` pages for `GuildState.ingest`.
+- `build_users`: `User` objects holding `Post` and `Reaction` objects, for the scoring
+  functions. Every post is held in memory, so this suits the smaller sizes.
+- `FakeChannel.history`: fake discord.py messages, for the crawl and the ingest pipeline.
+
+Both paths yield the same posts and reactions, so they can be checked against each other.
+
+Functions:
+- snowflake: Builds a Discord-style snowflake id from a timestamp.
+
+Classes:
+- MessageRecord: One generated message, as plain values.
+- FakeUser, FakeRole, FakeGuild, FakeEmoji, FakeAttachment, FakeReaction, FakeMessage: Stand-ins
+  for the discord.py objects the leaderboard reads.
+- FakeChannel: A text channel whose history is generated on the fly.
+- SyntheticGuild: The generator.
+"""
+
+import asyncio
+import math
+import random
+from collections import namedtuple
+from datetime import datetime, timezone
+from itertools import accumulate
+
+from ..config import EMOJI_REACTION_TYPES
+from ..ingest import PostBatch, reaction_type
+from ..models import Post, User
+
+# Milliseconds between the Unix epoch and the Discord epoch (2015-01-01)
+DISCORD_EPOCH = 1420070400000
+SECONDS_PER_DAY = 86400
+
+# Shape of the Pareto distribution of posts over members; lower is more skewed
+POSTER_ALPHA = 1.2
+# Average number of posts per member, when the number of members is not given
+POSTS_PER_USER = 20
+# Fraction of messages that are plain chat and not posts
+CHAT_FRACTION = 0.15
+# Content types of the posts, with their relative frequencies
+CONTENT_MIX = {'image': 45, 'link': 25, 'video': 12, 'audio': 8, 'file': 10}
+# Log-normal parameters of the number of reactions per post: a median of about 1.6, with
+# the occasional post in the hundreds
+REACTION_MU = 0.5
+REACTION_SIGMA = 1.2
+MAX_REACTIONS = 500
+# Reaction emoji with their relative frequencies; custom emoji are given as :name:
+EMOJI_MIX = {'❤️': 35, '😂': 18, '😮': 10, '🔥': 12, '👍': 10, ':catjam:': 8, ':pepelaugh:': 7}
+# Chance of a reaction being a super reaction
+SUPER_FRACTION = 0.03
+# Fraction of the members holding the curator role, and the chance of a post with an average
+# number of reactions being picked; it grows with the reactions of the post
+CURATOR_FRACTION = 0.002
+CURATOR_PICK_RATE = 0.01
+CURATOR_ROLE = 'Curator'
+# Emoji of the curator picks
+CURATOR_PICK_EMOJI = EMOJI_REACTION_TYPES['curator_pick'][0]
+
+ATTACHMENTS = {
+    'image': (('photo.png', 'image/png'), ('sketch.jpg', 'image/jpeg'), ('scan.jpeg', None)),
+    'video': (('clip.mp4', 'video/mp4'), ('take.mov', None)),
+    'audio': (('demo.mp3', 'audio/mpeg'), ('loop.wav', 'audio/wav')),
+    'file': (('notes.pdf', 'application/pdf'), ('project.zip', 'application/zip')),
+}
+
+
+def snowflake(timestamp, worker=0, increment=0):
+    """
+    Build a Discord-style snowflake id.
+
+    Parameters
+    ----------
+    timestamp : float
+        Seconds since the Unix epoch.
+    worker : int, optional
+        The 10 bits between the timestamp and the increment, by default 0.
+    increment : int, optional
+        The lowest 12 bits, by default 0.
+
+    Returns
+    -------
+    int
+        The id, increasing with the timestamp like real Discord ids.
+    """
+
+    return (int(timestamp * 1000) - DISCORD_EPOCH) << 22 | (worker & 0x3FF) << 12 | (increment & 0xFFF)
+
+
+# One generated message. ``content_type`` is None for plain chat, and ``reactions`` holds
+# ``(emoji, burst, reactor index)`` triples
+MessageRecord = namedtuple('MessageRecord', 'id channel_id author timestamp content_type reactions')
+
+
+class FakeRole:
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeUser:
+    """A member of a synthetic guild, standing in for discord.Member."""
+
+    __slots__ = ('id', 'name', 'bot', 'roles')
+
+    def __init__(self, id, name, roles=()):
+        self.id = id
+        self.name = name
+        self.bot = False
+        self.roles = list(roles)
+
+    def __eq__(self, other):
+        return isinstance(other, FakeUser) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class FakeGuild:
+    __slots__ = ('id', 'name', 'shard_id')
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+        self.shard_id = 0
+
+
+class FakeEmoji:
+    """A custom emoji; unicode emoji are plain strings, as in discord.py."""
+
+    __slots__ = ('id', 'name', 'animated')
+
+    def __init__(self, id, name, animated=False):
+        self.id = id
+        self.name = name
+        self.animated = animated
+
+    def __str__(self):
+        return f"<{'a' if self.animated else ''}:{self.name}:{self.id}>"
+
+
+class FakeAttachment:
+    __slots__ = ('filename', 'content_type', 'url')
+
+    def __init__(self, filename, content_type, url):
+        self.filename = filename
+        self.content_type = content_type
+        self.url = url
+
+
+class FakeReaction:
+    """The reactions of one emoji on a message, standing in for discord.Reaction."""
+
+    __slots__ = ('emoji', 'normal', 'burst', 'me')
+
+    def __init__(self, emoji, normal, burst):
+        self.emoji = emoji
+        # The members who reacted, without and with a super reaction
+        self.normal = normal
+        self.burst = burst
+        self.me = False
+
+    @property
+    def normal_count(self):
+        return len(self.normal)
+
+    @property
+    def burst_count(self):
+        return len(self.burst)
+
+    @property
+    def count(self):
+        return len(self.normal) + len(self.burst)
+
+    async def users(self, limit=None, after=None, type=None):
+        """Yield the members who reacted; ``type`` takes discord.ReactionType.normal or burst."""
+        kind = getattr(type, 'name', type)
+        users = self.normal if kind == 'normal' else self.burst if kind == 'burst' else self.normal + self.burst
+        for user in users[:limit]:
+            yield user
+
+
+class FakeMessage:
+    __slots__ = ('id', 'channel', 'guild', 'author', 'content', 'attachments', 'reactions', 'created_at')
+
+    def __init__(self, id, channel, author, content, attachments, reactions, created_at):
+        self.id = id
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.attachments = attachments
+        self.reactions = reactions
+        self.created_at = created_at
+
+
+class FakeChannel:
+    """
+    A text channel of a `SyntheticGuild`, whose history is generated on the fly.
+
+    The history is generated anew on every call, so it can be crawled any number of times, in
+    constant memory when walked oldest first.
+    """
+
+    def __init__(self, guild, index, id, name, posts):
+        self.synthetic = guild
+        self.guild = guild.guild
+        self.index = index
+        self.id = id
+        self.name = name
+        # Number of messages in the channel
+        self.posts = posts
+        # Every message of the channel is older than the generator's `now`
+        self.last_message_id = snowflake(guild.now, index)
+
+    async def history(self, limit=100, before=None, after=None, oldest_first=None):
+        """
+        Yield the messages of the channel, like discord.TextChannel.history.
+
+        ``before`` and ``after`` take anything with an ``id``, or a datetime.
+        """
+
+        before = self._bound(before)
+        after = self._bound(after)
+        if oldest_first is None:
+            oldest_first = after is not None
+        messages = self.synthetic.messages(self.index)
+        if not oldest_first:
+            messages = reversed(list(messages))
+        yielded = 0
+        for message in messages:
+            if after is not None and message.id <= after or before is not None and message.id >= before:
+                continue
+            if limit is not None and yielded >= limit:
+                return
+            yielded += 1
+            if yielded % 100 == 0:
+                # One history request per 100 messages, as with Discord
+                await asyncio.sleep(0)
+            yield message
+
+    @staticmethod
+    def _bound(bound):
+        if bound is None:
+            return None
+        if isinstance(bound, datetime):
+            return snowflake(bound.timestamp())
+        return bound.id
+
+
+class SyntheticGuild:
+    """
+    A seeded, synthetic guild.
+
+    Parameters
+    ----------
+    posts : int
+        The number of messages, plain chat included, across every channel.
+    users : int, optional
+        The number of members. By default there is one per POSTS_PER_USER messages.
+    channels : int, optional
+        The number of channels, by default 1. Messages are split evenly between them.
+    days : float, optional
+        The number of days the messages span, up to ``now``, by default 30.
+    seed : int, optional
+        The seed of the generator, by default 0.
+    now : float, optional
+        The Unix timestamp of the end of the span, by default the current time.
+    chat_fraction : float, optional
+        The fraction of messages that are plain chat, by default CHAT_FRACTION.
+    """
+
+    def __init__(self, posts, users=None, channels=1, days=30, seed=0, now=None, chat_fraction=CHAT_FRACTION):
+        self.posts = posts
+        self.days = days
+        self.seed = seed
+        self.now = now if now is not None else datetime.now(timezone.utc).timestamp()
+        self.chat_fraction = chat_fraction
+        start = self.now - days * SECONDS_PER_DAY
+        rng = random.Random(seed)
+
+        # Ids of members, emoji and channels are snowflakes of different days before the first
+        # message, so that they never collide with each other or with message ids
+        self.guild = FakeGuild(snowflake(start - 4 * SECONDS_PER_DAY), f"synthetic-{seed}")
+        n_users = users if users is not None else max(10, posts // POSTS_PER_USER)
+        curators = set(rng.sample(range(n_users), max(1, int(n_users * CURATOR_FRACTION))))
+        role = FakeRole(CURATOR_ROLE)
+        first_user = snowflake(start - 3 * SECONDS_PER_DAY)
+        self.users = [FakeUser(first_user + index, f"user{index}", [role] if index in curators else ())
+                      for index in range(n_users)]
+        self.curators = sorted(curators)
+        # The same weights drive who posts and who reacts: active members do both
+        self.cum_weights = list(accumulate(rng.paretovariate(POSTER_ALPHA) for _ in range(n_users)))
+
+        self.content_types = list(CONTENT_MIX)
+        self.content_weights = list(accumulate(CONTENT_MIX.values()))
+        first_emoji = snowflake(start - 2 * SECONDS_PER_DAY)
+        self.emoji = [FakeEmoji(first_emoji + index, emoji.strip(':')) if emoji.startswith(':') else emoji
+                      for index, emoji in enumerate(EMOJI_MIX)]
+        self.emoji_weights = list(accumulate(EMOJI_MIX.values()))
+
+        first_channel = snowflake(start - SECONDS_PER_DAY)
+        self.channels = [FakeChannel(self, index, first_channel + index, f"sharing-{index}",
+                                     posts // channels + (index < posts % channels))
+                         for index in range(channels)]
+
+    def records(self, channel_index=None):
+        """
+        Generate the messages of a channel, or of every channel one after the other, oldest first.
+
+        Yields
+        ------
+        MessageRecord
+        """
+
+        if channel_index is None:
+            for channel in self.channels:
+                yield from self.records(channel.index)
+            return
+
+        channel = self.channels[channel_index]
+        rng = random.Random(f"{self.seed}:{channel_index}")
+        population = range(len(self.users))
+        span = self.days * SECONDS_PER_DAY
+        mean_reactions = math.exp(REACTION_MU + REACTION_SIGMA ** 2 / 2)
+        last_id = 0
+        # Sorted uniform positions are drawn from the latest down, so that the messages come
+        # out in time order without being generated up front
+        position = 1.0
+        for remaining in range(channel.posts, 0, -1):
+            position *= rng.random() ** (1 / remaining)
+            timestamp = self.now - position * span
+            message_id = max(snowflake(timestamp, channel_index), last_id + 1)
+            last_id = message_id
+            author = rng.choices(population, cum_weights=self.cum_weights)[0]
+
+            if rng.random() < self.chat_fraction:
+                yield MessageRecord(message_id, channel.id, author, timestamp, None, ())
+                continue
+            content_type = rng.choices(self.content_types, cum_weights=self.content_weights)[0]
+            count = min(MAX_REACTIONS, int(rng.lognormvariate(REACTION_MU, REACTION_SIGMA)))
+            reactions = []
+            if count:
+                seen = set()
+                for reactor, emoji in zip(rng.choices(population, cum_weights=self.cum_weights, k=count),
+                                          rng.choices(range(len(self.emoji)), cum_weights=self.emoji_weights, k=count)):
+                    # Members react at most once with every emoji
+                    if reactor != author and (reactor, emoji) not in seen:
+                        seen.add((reactor, emoji))
+                        reactions.append((emoji, rng.random() < SUPER_FRACTION, reactor))
+            if rng.random() < CURATOR_PICK_RATE * (1 + count) / (1 + mean_reactions):
+                curator = rng.choice(self.curators)
+                if curator != author:
+                    reactions.append((-1, False, curator))
+            yield MessageRecord(message_id, channel.id, author, timestamp, content_type, tuple(reactions))
+
+    def emoji_of(self, index):
+        """Return the emoji of a reaction record; -1 stands for the curator pick emoji."""
+        return CURATOR_PICK_EMOJI if index < 0 else self.emoji[index]
+
+    def is_curator(self, user_index):
+        return bool(self.users[user_index].roles)
+
+    def reaction_types(self, record):
+        """Return the ``(reaction type, reactor id)`` pairs of a record, as the ingest pipeline scores them."""
+        return [(reaction_type(self.emoji_of(emoji), burst, self.is_curator(reactor)), self.users[reactor].id)
+                for emoji, burst, reactor in record.reactions]
+
+    def batches(self, page_size=100, channel_index=None):
+        """
+        Generate the posts as `PostBatch` pages, the way the crawl ingests them.
+
+        Plain chat is skipped, so pages may hold fewer than ``page_size`` posts.
+
+        Yields
+        ------
+        PostBatch
+        """
+
+        batch = PostBatch()
+        messages = 0
+        for record in self.records(channel_index):
+            messages += 1
+            if record.content_type is not None:
+                post = Post(record.content_type, datetime.fromtimestamp(record.timestamp, timezone.utc), compact=True)
+                for kind, reactor in self.reaction_types(record):
+                    post.add_reaction(kind, reactor)
+                batch.append(record.id, record.channel_id, self.users[record.author].name, post)
+            if messages == page_size:
+                yield batch
+                batch = PostBatch()
+                messages = 0
+        if messages:
+            yield batch
+
+    def build_users(self, channel_index=None):
+        """
+        Build the members who posted, with their posts and reactions.
+
+        Returns
+        -------
+        dict
+            `User` objects by name.
+        """
+
+        users = {}
+        for record in self.records(channel_index):
+            if record.content_type is None:
+                continue
+            name = self.users[record.author].name
+            user = users.get(name)
+            if user is None:
+                user = users[name] = User(name)
+            post = Post(record.content_type, datetime.fromtimestamp(record.timestamp, timezone.utc))
+            user.add_post(post)
+            for kind, reactor in self.reaction_types(record):
+                post.add_reaction(kind, reactor)
+        return users
+
+    def messages(self, channel_index):
+        """Generate the messages of a channel as fake discord.py messages, oldest first."""
+        channel = self.channels[channel_index]
+        for record in self.records(channel_index):
+            yield self.message(channel, record)
+
+    def message(self, channel, record):
+        """Build the fake discord.py message of a record."""
+        content = f"gm, message {record.id}"
+        attachments = []
+        if record.content_type == 'link':
+            content = f"Have a look: https://example.com/share/{record.id}"
+        elif record.content_type is not None:
+            options = ATTACHMENTS[record.content_type]
+            filename, content_type = options[record.id % len(options)]
+            attachments.append(FakeAttachment(filename, content_type, f"https://cdn.example.com/{record.id}/{filename}"))
+            content = ""
+        by_emoji = {}
+        for emoji, burst, reactor in record.reactions:
+            reaction = by_emoji.get(emoji)
+            if reaction is None:
+                reaction = by_emoji[emoji] = FakeReaction(self.emoji_of(emoji), [], [])
+            (reaction.burst if burst else reaction.normal).append(self.users[reactor])
+        return FakeMessage(record.id, channel, self.users[record.author], content, attachments,
+                           list(by_emoji.values()), datetime.fromtimestamp(record.timestamp, timezone.utc))
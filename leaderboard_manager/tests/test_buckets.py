@@ -0,0 +1,112 @@
+import math
+
+import pytest
+
+from ..buckets import DAY_SLOTS, ActivityBitmap, DayBuckets, day_number
+from ..config import REACTION_POINTS
+from .mock_data import SyntheticGuild
+
+# The last day of the synthetic guild's span
+TODAY = 20600
+
+
+def bitmap(days):
+    activity = ActivityBitmap()
+    for day in days:
+        activity.add(day)
+    return activity
+
+
+@pytest.mark.parametrize('days, today, streak', [
+    ((), TODAY, 0),
+    ((TODAY,), TODAY, 1),
+    ((TODAY - 1,), TODAY, 1),
+    ((TODAY - 2,), TODAY, 0),
+    ((TODAY - 2, TODAY - 1, TODAY), TODAY, 3),
+    ((TODAY - 3, TODAY - 2, TODAY - 1), TODAY, 3),
+    ((TODAY - 5, TODAY - 4, TODAY - 2, TODAY - 1, TODAY), TODAY, 3),
+    ((TODAY + 1,), TODAY, 0),
+    (range(TODAY - 100, TODAY + 1), TODAY, 101),
+])
+def test_streak(days, today, streak):
+    assert bitmap(days).streak(today) == streak
+
+
+def test_streak_follows_removed_posts():
+    activity = bitmap([TODAY - 2, TODAY - 1, TODAY - 1, TODAY])
+    activity.add(TODAY - 1, -1)
+    assert activity.streak(TODAY) == 3
+    activity.add(TODAY - 1, -1)
+    assert activity.streak(TODAY) == 1
+    # Removing a post from before the first day seen is a no-op
+    activity.add(TODAY - 10, -1)
+    assert activity.streak(TODAY) == 1
+    assert activity.active_days(TODAY - 2, TODAY) == 2
+
+
+@pytest.mark.parametrize('days, first, last, active', [
+    ((), TODAY - 7, TODAY, 0),
+    ((TODAY - 9, TODAY - 3, TODAY - 3, TODAY), TODAY - 6, TODAY, 2),
+    ((TODAY - 9, TODAY - 3, TODAY), TODAY - 20, TODAY + 5, 3),
+    ((TODAY - 9, TODAY - 3, TODAY), TODAY - 2, TODAY - 1, 0),
+    ((TODAY - 9, TODAY - 3, TODAY), TODAY, TODAY - 1, 0),
+    (range(TODAY - 100, TODAY + 1, 2), TODAY - 29, TODAY, 15),
+])
+def test_active_days(days, first, last, active):
+    assert bitmap(days).active_days(first, last) == active
+
+
+def synthetic_buckets():
+    """Return the buckets of every synthetic user, with their posts as (day, content type, reactions)."""
+    guild = SyntheticGuild(2000, days=45, seed=2, now=(TODAY + 0.5) * 86400)
+    buckets = {}
+    posts = {}
+    for name, user in guild.build_users().items():
+        buckets[name] = user_buckets = DayBuckets()
+        posts[name] = []
+        for post in user.posts:
+            day = day_number(post.timestamp.timestamp())
+            user_buckets.add_post(day, post.content_type_code)
+            for reaction in post.reactions:
+                user_buckets.add_reaction(day, REACTION_POINTS.get(reaction.type, REACTION_POINTS['generic']),
+                                          reaction.reactor, reaction.type == 'curator_pick')
+            posts[name].append((day, post.content_type_code, post.reactions))
+    return buckets, posts
+
+
+def expected_window(posts, days, today):
+    first = -math.inf if days is None else today - days
+    posts = [post for post in posts if first < post[0] <= today]
+    reactions = [reaction for post in posts for reaction in post[2]]
+    return (len(posts),
+            sum(REACTION_POINTS.get(reaction.type, REACTION_POINTS['generic']) for reaction in reactions),
+            len({post[1] for post in posts}),
+            sum(1 for post in posts if post[0] == today),
+            len({reaction.reactor for reaction in reactions}),
+            sum(reaction.type == 'curator_pick' for reaction in reactions))
+
+
+@pytest.mark.parametrize('days', [1, 7, 14, DAY_SLOTS, None])
+def test_window_matches_the_posts_it_spans(days):
+    buckets, posts = synthetic_buckets()
+    for name, user_buckets in buckets.items():
+        window = user_buckets.window(days, TODAY)
+        expected = expected_window(posts[name], days, TODAY)
+        assert window[:6] == pytest.approx(expected), name
+        streak = user_buckets.activity.streak(TODAY)
+        assert window[6] == (streak if days is None else min(streak, days))
+
+
+def test_window_forgets_days_that_left_the_ring():
+    buckets = DayBuckets()
+    buckets.add_post(TODAY - DAY_SLOTS, 2)
+    buckets.add_reaction(TODAY - DAY_SLOTS, 2, 1, False)
+    buckets.add_post(TODAY, 3)
+    buckets.add_reaction(TODAY, 3, 2, False)
+    assert buckets.window(DAY_SLOTS, TODAY)[:6] == (1, 3, 1, 1, 1, 0)
+    assert buckets.window(None, TODAY)[:6] == (2, 5, 2, 1, 2, 0)
+    # A post on a day that left the ring only counts towards the all-time totals
+    buckets.add_post(TODAY - DAY_SLOTS, 2, -1)
+    buckets.add_reaction(TODAY - DAY_SLOTS, 2, 1, False, -1)
+    assert buckets.window(None, TODAY)[:6] == (1, 3, 1, 1, 1, 0)
+    assert buckets.window(DAY_SLOTS, TODAY)[:6] == (1, 3, 1, 1, 1, 0)
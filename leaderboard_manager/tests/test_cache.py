@@ -0,0 +1,43 @@
+from ..cache import RenderCache
+from ..ranking import Board
+
+
+def test_entries_expire_with_the_board_version():
+    cache = RenderCache()
+    board = Board({'ada': 10, 'bob': 7})
+    cache.put('daily', board.version, 'rendered')
+    assert cache.get('daily', board.version) == 'rendered'
+    board.set('bob', 7)
+    assert cache.get('daily', board.version) == 'rendered'
+    board.set('bob', 8)
+    assert cache.get('daily', board.version) is None
+    cache.put('daily', board.version, 'rendered again')
+    assert cache.get('daily', board.version) == 'rendered again'
+    assert len(cache) == 1
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = RenderCache(max_entries=2)
+    cache.put('a', 1, 'A')
+    cache.put('b', 1, 'B')
+    assert cache.get('a', 1) == 'A'
+    cache.put('c', 1, 'C')
+    assert len(cache) == 2
+    assert cache.get('b', 1) is None
+    assert (cache.get('a', 1), cache.get('c', 1)) == ('A', 'C')
+    # Replacing an entry refreshes it
+    cache.put('a', 2, 'A2')
+    cache.put('d', 1, 'D')
+    assert cache.get('c', 1) is None and cache.get('a', 2) == 'A2'
+
+
+def test_hits_and_misses_are_counted():
+    cache = RenderCache()
+    assert cache.hit_ratio == 0.0
+    cache.get('a', 1)
+    cache.put('a', 1, 'A')
+    cache.get('a', 1)
+    cache.get('a', 1)
+    cache.get('a', 2)
+    assert (cache.hits, cache.misses) == (2, 2)
+    assert cache.hit_ratio == 0.5
@@ -0,0 +1,492 @@
+import asyncio
+import contextlib
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+from cogs.leaderboard import HISTORY_PAGE_SIZE, SHARING_CATEGORY, Leaderboards
+from ..crawler import ChannelProgress
+from ..guild import BACKFILLING, FAILED, PENDING, READY
+from ..ingest import PostBatch, ingest_messages
+from ..metrics import REGISTRY
+from ..models import Post
+from ..snapshots import Snapshot
+from .mock_data import (CURATOR_PICK_EMOJI, CURATOR_ROLE, FakeAttachment, FakeChannel, FakeGuild, FakeMessage,
+                        FakeReaction, FakeRole, FakeUser, SyntheticGuild)
+
+NOW = datetime(2026, 6, 1, 12, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def cog(monkeypatch):
+    monkeypatch.setenv('LEADERBOARD_DB', ':memory:')
+    monkeypatch.setenv('LEADERBOARD_WORKERS', '0')
+    monkeypatch.setenv('LEADERBOARD_CURATOR_ROLE', CURATOR_ROLE)
+    monkeypatch.delenv('LEADERBOARD_CATEGORIES', raising=False)
+    cog = Leaderboards(SimpleNamespace(user=FakeUser(0, 'bot'), guilds=[]))
+    yield cog
+    REGISTRY.remove_collector(cog.collect_metrics)
+    cog.store.close()
+
+
+class PlainUser:
+    """A reactor as discord.py yields them when they are missing from the member cache: without roles."""
+
+    def __init__(self, id):
+        self.id = id
+        self.name = f"user{id}"
+        self.bot = False
+
+
+class UncachedGuild(FakeGuild):
+    """A guild whose member cache is empty, as without the members intent."""
+
+    __slots__ = ('members',)
+
+    def __init__(self, id, name, members):
+        super().__init__(id, name)
+        self.members = {member.id: member for member in members}
+
+    def get_member(self, id):
+        return None
+
+    async def fetch_member(self, id):
+        if id not in self.members:
+            raise discord.NotFound(SimpleNamespace(status=404, reason='Not Found'), 'Unknown Member')
+        return self.members[id]
+
+
+class MessageReaction(FakeReaction):
+    __slots__ = ('message',)
+
+
+def test_curators_are_found_among_plain_user_reactors(cog):
+    curator = FakeUser(1, 'curator', [FakeRole(CURATOR_ROLE)])
+    guild = UncachedGuild(100, 'guild', [curator, FakeUser(2, 'member')])
+    channel = SimpleNamespace(id=10, guild=guild)
+    # The third reactor left the guild
+    reaction = MessageReaction(CURATOR_PICK_EMOJI, [PlainUser(1), PlainUser(2), PlainUser(3)], [])
+    message = FakeMessage(1000, channel, FakeUser(4, 'author'), 'https://example.com/art', [], [reaction], NOW)
+    reaction.message = message
+    batch = asyncio.run(ingest_messages([message], None, cog.get_reactors, cog.is_curator, cog.emoji_table))
+    reactions = sorted((reaction.reactor, reaction.type) for reaction in batch.posts[0].reactions)
+    assert reactions == [(1, 'curator_pick'), (2, 'generic'), (3, 'generic')]
+
+
+def tracked_state(cog, authors=None):
+    """Return the state of a guild tracking one channel, with a stored image post for every
+    message id of ``authors``, a dict of message ids to authors."""
+    state = cog.get_state(100)
+    state.channels[10] = SimpleNamespace(id=10, name='art', guild=SimpleNamespace(id=100))
+    batch = PostBatch()
+    for message_id, author in (authors or {1000: 'author'}).items():
+        batch.append(message_id, 10, author, Post('image', NOW))
+    state.ingest(batch)
+    cog.store.save_batch(batch)
+    return state
+
+
+def reaction_payload(emoji, user_id, message_id=1000, member=None):
+    return SimpleNamespace(guild_id=100, channel_id=10, message_id=message_id, emoji=emoji, burst=False,
+                           member=member, user_id=user_id)
+
+
+@pytest.mark.parametrize('fetch_reactors, recorded', [('curator', {'heart': None, 'generic': 7}),
+                                                      ('all', {'heart': 7, 'generic': 7}),
+                                                      ('none', {'heart': None, 'generic': None})])
+def test_live_reactions_record_the_reactors_backfills_look_up(cog, fetch_reactors, recorded):
+    cog.fetch_reactors = fetch_reactors
+    state = tracked_state(cog)
+    asyncio.run(cog.on_raw_reaction_add(reaction_payload('❤️', 7)))
+    asyncio.run(cog.on_raw_reaction_add(reaction_payload(CURATOR_PICK_EMOJI, 7)))
+    post = state.messages[1000][3]
+    assert {reaction.type: reaction.reactor for reaction in post.reactions} == recorded
+    stored = cog.store.load_posts([10]).posts[0]
+    assert {reaction.type: reaction.reactor for reaction in stored.reactions} == recorded
+    # Removing the reactions finds them whether their reactor was recorded or not
+    asyncio.run(cog.on_raw_reaction_remove(reaction_payload('❤️', 7)))
+    assert [reaction.type for reaction in post.reactions] == ['generic']
+
+
+def edit_payload(state, message_id, content, attachments=()):
+    message = FakeMessage(message_id, state.channels[10], FakeUser(4, 'author'), content, list(attachments), [], NOW)
+    return SimpleNamespace(guild_id=100, channel_id=10, message_id=message_id, message=message)
+
+
+def test_live_edits_rescore_the_messages(cog):
+    state = tracked_state(cog)
+    score = state.get_board('<#10>', None).get('author')
+    asyncio.run(cog.on_raw_message_edit(edit_payload(state, 1000, 'https://example.com/art')))
+    assert state.messages[1000][3].content_type == 'link'
+    assert cog.store.load_posts([10]).posts[0].content_type == 'link'
+    # An edit that adds an image to plain chat scores the message as a new post
+    attachment = FakeAttachment('art.png', 'image/png', 'https://cdn.example.com/art.png')
+    asyncio.run(cog.on_raw_message_edit(edit_payload(state, 1001, 'my latest', [attachment])))
+    assert state.messages[1001][3].content_type == 'image'
+    assert cog.store.load_posts([10]).message_ids == [1000, 1001]
+    assert state.get_board('<#10>', None).get('author') > score
+    # An edit that removes what a message shared unscores it
+    asyncio.run(cog.on_raw_message_edit(edit_payload(state, 1000, 'never mind')))
+    assert 1000 not in state.messages
+    assert cog.store.load_posts([10]).message_ids == [1001]
+    assert state.get_board('<#10>', None).get('author') == score
+
+
+def test_live_deletes_unscore_the_messages(cog):
+    state = tracked_state(cog, {1000: 'ada', 1001: 'ada', 1002: 'bob', 1003: 'cy'})
+    asyncio.run(cog.on_raw_message_delete(SimpleNamespace(guild_id=100, channel_id=10, message_id=1000)))
+    # Bulk deletes include messages that were never scored
+    asyncio.run(cog.on_raw_bulk_message_delete(SimpleNamespace(guild_id=100, channel_id=10,
+                                                                message_ids={1001, 1002, 2000})))
+    assert state.messages.keys() == {1003}
+    assert cog.store.load_posts([10]).message_ids == [1003]
+    board = state.get_board('<#10>', None)
+    assert [user for user, points in board.top(10) if points] == ['cy']
+
+
+def test_reaction_removals_fall_back_to_reactions_of_unknown_reactors(cog):
+    cog.fetch_reactors = 'curator'
+    state = tracked_state(cog)
+    curator = FakeUser(8, 'curator', [FakeRole(CURATOR_ROLE)])
+    # Hearts are recorded without their reactor, curator picks with theirs
+    asyncio.run(cog.on_raw_reaction_add(reaction_payload('❤️', 7)))
+    asyncio.run(cog.on_raw_reaction_add(reaction_payload(CURATOR_PICK_EMOJI, 8, member=curator)))
+    asyncio.run(cog.on_raw_reaction_remove(reaction_payload('❤️', 9)))
+    post = state.messages[1000][3]
+    assert [(reaction.type, reaction.reactor) for reaction in post.reactions] == [('curator_pick', 8)]
+    # Another reactor's pick is not removed in place of a reaction that is gone
+    asyncio.run(cog.on_raw_reaction_remove(reaction_payload(CURATOR_PICK_EMOJI, 7)))
+    asyncio.run(cog.on_raw_reaction_remove(reaction_payload('❤️', 7)))
+    assert [(reaction.type, reaction.reactor) for reaction in post.reactions] == [('curator_pick', 8)]
+    stored = cog.store.load_posts([10]).posts[0]
+    assert [(reaction.type, reaction.reactor) for reaction in stored.reactions] == [('curator_pick', 8)]
+
+
+class Context:
+    """Stands in for commands.Context, keeping the sent messages."""
+
+    def __init__(self, guild_id=100, channel_id=10):
+        self.guild = SimpleNamespace(id=guild_id)
+        self.channel = SimpleNamespace(id=channel_id)
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(message)
+
+
+def test_leaderboard_shows_tied_ranks_and_no_movement_against_a_snapshot(cog):
+    state = tracked_state(cog, {1000: 'ada', 1001: 'bob', 1002: 'cy'})
+    for message_id, reactors in ((1000, 3), (1001, 1), (1002, 1)):
+        for reactor in range(reactors):
+            state.add_reaction(message_id, 'heart', reactor)
+    board = state.get_board('<#10>', None)
+    cog.latest_snapshots[(100, '<#10>', 'alltime')] = (1, 0.0, Snapshot.from_board(board, 0.0).rank_map())
+    ctx = Context()
+    flags = SimpleNamespace(time_frame='alltime', channel_name=None, page=1)
+    asyncio.run(cog.leaderboard.callback(cog, ctx, flags=flags))
+    rows = [line.split('**')[:2] for line in ctx.sent[0].splitlines()[1:4]]
+    assert rows == [['1. ', 'ada'], ['2. ', 'bob'], ['2. ', 'cy']]
+    assert '▲' not in ctx.sent[0] and '▼' not in ctx.sent[0]
+
+
+class TextChannel(FakeChannel, discord.abc.Messageable):
+    """A synthetic channel that the cog recognizes as messageable."""
+
+
+class FlakyChannel(TextChannel):
+    """A synthetic channel whose history stops after ``stop_after`` messages: it raises ``error``, or
+    waits for ``gate`` to be set when there is none."""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.stop_after = None
+        self.error = None
+        self.gate = asyncio.Event()
+
+    async def history(self, **kwargs):
+        yielded = 0
+        async for message in super().history(**kwargs):
+            if yielded == self.stop_after:
+                if self.error is not None:
+                    raise self.error
+                await self.gate.wait()
+            yielded += 1
+            yield message
+
+
+def synthetic_guild(cog, posts=300, channels=2, seed=0, channel_type=TextChannel):
+    """Return a synthetic guild and a stand-in for its discord.Guild, with every channel in the sharing category."""
+    synthetic = SyntheticGuild(posts, channels=channels, seed=seed, now=NOW.timestamp())
+    synthetic.channels = [channel_type(synthetic, channel.index, channel.id, channel.name, channel.posts)
+                          for channel in synthetic.channels]
+    guild = SimpleNamespace(id=synthetic.guild.id, name=synthetic.guild.name, shard_id=0,
+                            categories=[SimpleNamespace(name=SHARING_CATEGORY, channels=list(synthetic.channels))])
+    cog.client.guilds.append(guild)
+    return synthetic, guild
+
+
+def count_crawls(cog):
+    """Record the id of every channel the cog crawls."""
+    crawled = []
+    crawl = cog.get_history_of_channel
+
+    async def counting(channel, progress=None):
+        crawled.append(channel.id)
+        return await crawl(channel, progress)
+
+    cog.get_history_of_channel = counting
+    return crawled
+
+
+def test_ready_does_not_crawl_the_shards_again(cog):
+    synthetic, guild = synthetic_guild(cog)
+    crawled = count_crawls(cog)
+
+    async def connect():
+        await cog.on_shard_ready(0)
+        backfill = cog.backfills[guild.id]
+        await backfill
+        await cog.on_ready()
+        assert cog.backfills[guild.id] is backfill
+
+    asyncio.run(connect())
+    assert sorted(crawled) == sorted(channel.id for channel in synthetic.channels)
+    assert cog.guilds[guild.id].status == READY
+
+
+def test_clear_emoji_of_a_message_deleted_while_fetched(cog):
+    state = tracked_state(cog)
+
+    async def fetch_message(message_id):
+        await cog.on_raw_message_delete(SimpleNamespace(guild_id=100, channel_id=10, message_id=message_id))
+        return FakeMessage(message_id, state.channels[10], FakeUser(4, 'author'), 'https://example.com/art', [],
+                           [], NOW)
+
+    state.channels[10].fetch_message = fetch_message
+    asyncio.run(cog.on_raw_reaction_clear_emoji(reaction_payload('❤️', None)))
+    assert 1000 not in state.messages
+    assert not cog.store.load_posts([10])
+
+
+def test_forum_channels_are_not_tracked(cog):
+    synthetic, guild = synthetic_guild(cog)
+    # Forum channels are not messageable and have no history
+    guild.categories[0].channels.append(SimpleNamespace(id=1, name='forum'))
+    crawled = count_crawls(cog)
+
+    async def connect():
+        await cog.on_shard_ready(0)
+        await cog.backfills[guild.id]
+
+    asyncio.run(connect())
+    state = cog.guilds[guild.id]
+    assert state.channels.keys() == {channel.id for channel in synthetic.channels}
+    assert 1 not in crawled
+    assert state.status == READY
+
+
+@pytest.mark.parametrize('cancel', [False, True])
+def test_events_deferred_while_loading_are_replayed(cog, monkeypatch, cancel):
+    monkeypatch.setattr('cogs.leaderboard.STORE_LOAD_PAGE_SIZE', 2)
+    batch = PostBatch()
+    for message_id in range(1000, 1006):
+        batch.append(message_id, 10, 'author', Post('image', NOW))
+    cog.store.save_batch(batch)
+    state = cog.get_state(100)
+    channel = state.channels[10] = SimpleNamespace(id=10, name='art', guild=SimpleNamespace(id=100))
+
+    async def load():
+        task = asyncio.create_task(cog.load_stored_messages(state, [channel]))
+        # Let the first page load, then react to a loaded message and to one still in the store
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert 1000 in state.messages and 1005 not in state.messages
+        await cog.on_raw_reaction_add(reaction_payload('❤️', 7, message_id=1000))
+        await cog.on_raw_reaction_add(reaction_payload('❤️', 7, message_id=1005))
+        assert len(state.deferred) == 2
+        if cancel:
+            task.cancel()
+        with pytest.raises(asyncio.CancelledError) if cancel else contextlib.nullcontext():
+            await task
+
+    asyncio.run(load())
+    assert state.deferred is None
+    reacted = {message_id for message_id, entry in state.messages.items() if entry[3].reactions}
+    # Cancelled loads replay the events too; those about messages that were not loaded are lost
+    assert reacted == ({1000} if cancel else {1000, 1005})
+
+
+def test_crawl_resumes_after_the_checkpoint(cog):
+    synthetic, guild = synthetic_guild(cog, channels=1)
+    channel = synthetic.channels[0]
+    cog.track_channel(channel)
+    message_ids = [message.id for message in synthetic.messages(channel.index)]
+    cog.store.set_checkpoint(channel.id, message_ids[99])
+    progress = ChannelProgress(channel.name)
+    asyncio.run(cog.get_history_of_channel(channel, progress))
+    assert progress.fetched == len(message_ids) - 100
+    state = cog.guilds[guild.id]
+    assert state.messages and min(state.messages) > message_ids[99]
+    assert cog.store.get_checkpoint(channel.id) == message_ids[-1]
+    assert channel.id in state.caught_up
+
+
+def test_backfill_goes_from_pending_to_ready(cog):
+    synthetic, guild = synthetic_guild(cog)
+    state = cog.get_state(guild.id)
+    statuses = []
+    crawl = cog.get_history_of_channel
+
+    async def recording(channel, progress=None):
+        statuses.append(state.status)
+        return await crawl(channel, progress)
+
+    cog.get_history_of_channel = recording
+
+    async def backfill():
+        assert state.status == PENDING
+        assert cog.start_backfill(guild)
+        await cog.backfills[guild.id]
+        # A complete backfill is not started again
+        assert not cog.start_backfill(guild)
+
+    asyncio.run(backfill())
+    assert statuses == [BACKFILLING, BACKFILLING]
+    assert state.status == READY
+    assert state.caught_up == state.channels.keys()
+    assert state.describe_backfill() == "History fully processed."
+
+
+def test_backfill_that_raises_is_pending_again(cog, monkeypatch):
+    synthetic, guild = synthetic_guild(cog)
+    state = cog.get_state(guild.id)
+
+    async def load_stored_messages(state, channels):
+        raise discord.DiscordServerError(SimpleNamespace(status=503, reason='Service Unavailable'), 'Unavailable')
+
+    monkeypatch.setattr(cog, 'load_stored_messages', load_stored_messages)
+
+    async def backfill():
+        cog.start_backfill(guild)
+        with pytest.raises(discord.DiscordServerError):
+            await cog.backfills[guild.id]
+
+    asyncio.run(backfill())
+    assert state.status == PENDING and not state.caught_up
+
+
+def stopped_in(cog, message_ids, channel):
+    """Whether the backfill stopped in ``channel`` after its first history page, and crawled the others."""
+    state = cog.get_state(channel.guild.id)
+    return (cog.store.get_checkpoint(channel.id) == message_ids[HISTORY_PAGE_SIZE - 1]
+            and state.caught_up == state.channels.keys() - {channel.id})
+
+
+def test_failed_channels_are_crawled_again_on_resume(cog):
+    synthetic, guild = synthetic_guild(cog, posts=500, channel_type=FlakyChannel)
+    channel = synthetic.channels[0]
+    channel.stop_after = 150
+    channel.error = discord.Forbidden(SimpleNamespace(status=403, reason='Forbidden'), 'Missing Access')
+    message_ids = [message.id for message in synthetic.messages(channel.index)]
+    state = cog.get_state(guild.id)
+    crawled = count_crawls(cog)
+
+    async def backfill():
+        cog.start_backfill(guild)
+        await cog.backfills[guild.id]
+
+    asyncio.run(backfill())
+    assert state.status == FAILED
+    assert stopped_in(cog, message_ids, channel)
+    assert state.describe_backfill() == "History partially processed: 1 channels could not be crawled."
+    channel.stop_after = None
+    asyncio.run(backfill())
+    assert crawled == [channel.id, synthetic.channels[1].id, channel.id]
+    # The second crawl starts after the last committed page
+    assert state.crawler.progress[channel.id].fetched == len(message_ids) - HISTORY_PAGE_SIZE
+    assert state.status == READY
+
+
+def test_cancelled_backfill_resumes_where_it_stopped(cog):
+    synthetic, guild = synthetic_guild(cog, posts=500, channel_type=FlakyChannel)
+    channel = synthetic.channels[0]
+    channel.stop_after = 150
+    message_ids = [message.id for message in synthetic.messages(channel.index)]
+    state = cog.get_state(guild.id)
+    crawled = count_crawls(cog)
+
+    async def cancel():
+        cog.start_backfill(guild)
+        while not stopped_in(cog, message_ids, channel):
+            await asyncio.sleep(0)
+        assert state.status == BACKFILLING
+        assert cog.cancel_backfill(guild.id)
+        with pytest.raises(asyncio.CancelledError):
+            await cog.backfills[guild.id]
+        assert not cog.cancel_backfill(guild.id)
+
+    asyncio.run(cancel())
+    assert state.status == PENDING
+    assert state.describe_backfill() == "Waiting to process the history of this server."
+
+    async def resume():
+        assert cog.start_backfill(guild)
+        await cog.backfills[guild.id]
+
+    channel.stop_after = None
+    asyncio.run(resume())
+    assert crawled == [channel.id, synthetic.channels[1].id, channel.id]
+    assert state.crawler.progress[channel.id].fetched == len(message_ids) - HISTORY_PAGE_SIZE
+    assert state.status == READY
+
+
+def test_reconnects_crawl_the_channels_again(cog):
+    synthetic, guild = synthetic_guild(cog)
+    state = cog.get_state(guild.id)
+    crawled = count_crawls(cog)
+
+    async def reconnect():
+        await cog.on_shard_ready(0)
+        backfill = cog.backfills[guild.id]
+        await backfill
+        await cog.on_shard_disconnect(0)
+        assert not state.caught_up
+        await cog.on_shard_resumed(0)
+        assert cog.backfills[guild.id] is not backfill
+        await cog.backfills[guild.id]
+
+    asyncio.run(reconnect())
+    channel_ids = [channel.id for channel in synthetic.channels]
+    assert sorted(crawled) == sorted(channel_ids * 2)
+    # Only the messages after the checkpoints are fetched again
+    assert all(progress.fetched == 0 for progress in state.crawler.progress.values())
+    assert state.status == READY
+
+
+def test_channels_disconnected_during_the_crawl_are_crawled_again(cog):
+    synthetic, guild = synthetic_guild(cog, posts=500, channel_type=FlakyChannel)
+    channel = synthetic.channels[0]
+    channel.stop_after = 150
+    message_ids = [message.id for message in synthetic.messages(channel.index)]
+    state = cog.get_state(guild.id)
+    crawled = count_crawls(cog)
+
+    async def reconnect():
+        await cog.on_shard_ready(0)
+        backfill = cog.backfills[guild.id]
+        while not stopped_in(cog, message_ids, channel):
+            await asyncio.sleep(0)
+        await cog.on_shard_disconnect(0)
+        await cog.on_shard_resumed(0)
+        # The running backfill takes the reconnect over
+        assert cog.backfills[guild.id] is backfill
+        channel.gate.set()
+        await backfill
+
+    asyncio.run(reconnect())
+    # The channel finished crawling after the disconnect, but may have missed messages before it
+    assert crawled == [channel.id, synthetic.channels[1].id, channel.id, synthetic.channels[1].id]
+    assert cog.store.get_checkpoint(channel.id) == message_ids[-1]
+    assert state.status == READY
@@ -0,0 +1,103 @@
+import asyncio
+import inspect
+import logging
+from types import SimpleNamespace
+
+import discord.http
+import pytest
+
+from ..crawler import AdaptiveLimiter, HistoryCrawler, RateLimitWatcher, is_rate_limit
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        if record.name == RateLimitWatcher.LOGGER:
+            self.records.append(record)
+
+
+@pytest.fixture
+def root_records():
+    handler = Records()
+    root = logging.getLogger()
+    level = root.level
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    yield handler.records
+    root.removeHandler(handler)
+    root.setLevel(level)
+
+
+def test_markers_match_the_installed_discord_py():
+    source = inspect.getsource(discord.http)
+    for marker in RateLimitWatcher.MARKERS:
+        assert marker in source
+
+
+@pytest.mark.parametrize('level, message, args', [
+    (logging.WARNING, 'We are being rate limited. %s %s responded with 429. Retrying in %.2f seconds.',
+     ('GET', '/channels/1/messages', 1.5)),
+    (logging.WARNING, 'Global rate limit has been hit. Retrying in %.2f seconds.', (1.5,)),
+    (logging.DEBUG, 'A rate limit bucket (%s) has been exhausted. Pre-emptively rate limiting...', ('bucket',)),
+])
+def test_rate_limit_records_back_off(root_records, level, message, args):
+    limiter = AdaptiveLimiter(8, maximum=8)
+    with RateLimitWatcher(limiter):
+        logging.getLogger('discord.http').log(level, message, *args)
+    assert limiter.limit == 4
+    assert len(root_records) == (level >= logging.INFO)
+
+
+def test_other_records_pass_through_untouched(root_records):
+    logger = logging.getLogger('discord.http')
+    limiter = AdaptiveLimiter(8, maximum=8)
+    with RateLimitWatcher(limiter):
+        logger.debug('%s %s has received %s', 'GET', '/channels/1/messages', [])
+        logger.info('info')
+    assert limiter.limit == 8
+    assert [record.msg for record in root_records] == ['info']
+    assert logger.level == logging.NOTSET
+    assert not logger.filters
+
+
+def test_rate_limit_errors():
+    assert is_rate_limit(discord.RateLimited(30.0))
+    assert not is_rate_limit(ValueError())
+
+
+def test_overlapping_watchers_restore_the_logger(root_records):
+    logger = logging.getLogger('discord.http')
+    logger.setLevel(logging.WARNING)
+    first, second = AdaptiveLimiter(8, maximum=8), AdaptiveLimiter(8, maximum=8)
+    try:
+        a, b = RateLimitWatcher(first), RateLimitWatcher(second)
+        a.__enter__()
+        b.__enter__()
+        logger.debug('%s %s has received %s', 'GET', '/channels/1/messages', [])
+        a.__exit__(None, None, None)
+        assert logger.level == logging.DEBUG
+        logger.warning('We are being rate limited. %s %s responded with 429. Retrying in %.2f seconds.',
+                       'GET', '/channels/1/messages', 1.5)
+        b.__exit__(None, None, None)
+        assert logger.level == logging.WARNING
+        assert not logger.filters
+        assert first.limit == 8 and second.limit == 4
+        assert [record.levelno for record in root_records] == [logging.WARNING]
+    finally:
+        logger.setLevel(logging.NOTSET)
+
+
+def test_crawl_accepts_a_generator():
+    channels = [SimpleNamespace(id=channel_id, name=f'channel-{channel_id}') for channel_id in (1, 2, 3)]
+    seen = []
+
+    async def fetch(channel, progress):
+        progress.begin(channel.id, None)
+        seen.append(channel.id)
+
+    progress = asyncio.run(HistoryCrawler().crawl((channel for channel in channels), fetch))
+    assert sorted(seen) == [1, 2, 3]
+    assert set(progress) == {1, 2, 3}
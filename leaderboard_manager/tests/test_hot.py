@@ -0,0 +1,100 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from ..guild import GuildState
+from ..ingest import PostBatch
+from ..models import Post, User
+from ..scoring import calculate_hot_score
+
+HALF_LIFE = 6 * 60 * 60
+CHANNEL_ID = 1
+CHANNEL_KEY = "<#1>"
+USERS = ('ada', 'bob', 'cy')
+REACTION_TYPES = ('heart', 'wow', 'curator_pick', 'generic')
+
+
+def build_state(now, half_life=HALF_LIFE, posts=60, seed=0):
+    """Return a state fed posts in random time order, and the ids of their messages."""
+    rng = random.Random(seed)
+    batch = PostBatch()
+    for message_id in range(1, posts + 1):
+        post = Post('image', now - timedelta(hours=rng.uniform(0, 72)))
+        for _ in range(rng.randrange(4)):
+            post.add_reaction(rng.choice(REACTION_TYPES), rng.randrange(20))
+        batch.append(message_id, CHANNEL_ID, rng.choice(USERS), post)
+    state = GuildState(1, [], half_life)
+    state.ingest(batch)
+    return state, batch.message_ids
+
+
+def reference_scores(state, now):
+    users = {}
+    for channel_key, user, day, post in state.messages.values():
+        users.setdefault(user, User(user)).posts.append(post)
+    return {name: calculate_hot_score(user, HALF_LIFE, now) for name, user in users.items()}
+
+
+def assert_matches_reference(state, now):
+    expected = reference_scores(state, now)
+    scores = state.hot.get(CHANNEL_KEY, {})
+    assert scores.keys() >= expected.keys()
+    for user, score in scores.items():
+        assert score.value_at(now.timestamp(), HALF_LIFE) == pytest.approx(expected.get(user, 0), abs=1e-9), user
+
+
+def test_posts_added_out_of_order():
+    now = datetime(2026, 6, 1, 12, tzinfo=timezone.utc)
+    state, _ = build_state(now)
+    assert_matches_reference(state, now)
+    assert_matches_reference(state, now + timedelta(days=2))
+
+
+def test_removed_reactions_and_messages():
+    now = datetime(2026, 6, 1, 12, tzinfo=timezone.utc)
+    state, message_ids = build_state(now, seed=1)
+    rng = random.Random(1)
+    for message_id in rng.sample(message_ids, 30):
+        post = state.messages[message_id][3]
+        if post.reactions:
+            reaction = rng.choice(post.reactions)
+            assert state.remove_reaction(message_id, reaction.reactor, (reaction.type,)) is not None
+    assert_matches_reference(state, now)
+    state.remove_messages(message_ids)
+    assert all(score.value == 0 for score in state.hot[CHANNEL_KEY].values())
+
+
+def test_replaced_reactions():
+    now = datetime(2026, 6, 1, 12, tzinfo=timezone.utc)
+    state, message_ids = build_state(now, seed=2)
+    replacement = Post('image', now)
+    replacement.add_reaction('curator_pick', 5)
+    replacement.add_reaction('heart', 6)
+    for message_id in message_ids[::2]:
+        state.replace_reactions(message_id)
+    for message_id in message_ids[1::4]:
+        state.replace_reactions(message_id, replacement.reactions)
+    assert_matches_reference(state, now)
+
+
+def test_hot_board_ranks_by_the_current_value():
+    now = datetime.now(timezone.utc)
+    state, _ = build_state(now, seed=3)
+    board = state.get_hot_board(CHANNEL_KEY)
+    expected = reference_scores(state, now)
+    assert [user for user, _ in board.top(len(USERS))] == sorted(expected, key=expected.get, reverse=True)
+    for user, value in board.top(len(USERS)):
+        assert value == pytest.approx(expected[user], abs=0.01)
+
+
+def test_disabled_hot_scores():
+    now = datetime(2026, 6, 1, 12, tzinfo=timezone.utc)
+    state, message_ids = build_state(now, half_life=None)
+    state.add_reaction(message_ids[0], 'heart', 1)
+    state.replace_reactions(message_ids[1])
+    state.remove_messages(message_ids[2:4])
+    assert state.hot == {}
+    assert len(state.get_board(CHANNEL_KEY, None))
+    with pytest.raises(ValueError):
+        state.get_hot_board(CHANNEL_KEY)
@@ -0,0 +1,53 @@
+import pytest
+
+from ..config import EMOJI_REACTION_TYPES
+from ..ingest import DEFAULT_EMOJI_TABLE, EmojiTable, emoji_key, reaction_type
+from .mock_data import FakeEmoji
+
+CATJAM = FakeEmoji(1001, 'catjam')
+
+
+@pytest.mark.parametrize('emoji, key', [
+    ('❤️', '❤'),
+    ('❤', '❤'),
+    (CATJAM, 1001),
+    ('<:catjam:1001>', 1001),
+    ('<a:catjam:1001>', 1001),
+    ('1001', 1001),
+    (1001, 1001),
+])
+def test_emoji_key(emoji, key):
+    assert emoji_key(emoji) == key
+
+
+def test_default_table_follows_the_configuration():
+    for kind, emoji_list in EMOJI_REACTION_TYPES.items():
+        for emoji in emoji_list:
+            assert DEFAULT_EMOJI_TABLE.reaction_type(emoji, curator=True) == kind
+            if kind != 'curator_pick':
+                assert DEFAULT_EMOJI_TABLE.reaction_type(emoji) == kind
+    assert DEFAULT_EMOJI_TABLE.reaction_type('🏅') == 'generic'
+    assert DEFAULT_EMOJI_TABLE.reaction_type('🔥') == 'generic'
+    assert DEFAULT_EMOJI_TABLE.reaction_type('❤️', burst=True) == 'super'
+    assert reaction_type('❤', curator=True) == 'heart'
+
+
+def test_custom_emoji_and_curator_picks():
+    table = EmojiTable({'heart': ['❤️', '<:catjam:1001>'], 'curator_pick': ['❤️', 1002]})
+    assert table.lookup(CATJAM) == ('heart', 'heart')
+    assert table.lookup('<:renamed:1001>') == ('heart', 'heart')
+    assert table.lookup('❤') == ('heart', 'curator_pick')
+    assert table.lookup(FakeEmoji(1002, 'medal')) == ('generic', 'curator_pick')
+    assert table.lookup('😮') == EmojiTable.GENERIC
+    assert reaction_type(CATJAM, curator=True, table=table) == 'heart'
+    assert reaction_type(FakeEmoji(1002, 'medal'), curator=True, table=table) == 'curator_pick'
+
+
+@pytest.mark.parametrize('mapping', [
+    {'sparkle': ['✨']},
+    {'super': ['✨']},
+    {'heart': ['✨'], 'wow': ['✨']},
+])
+def test_invalid_mappings(mapping):
+    with pytest.raises(ValueError):
+        EmojiTable(mapping)
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from ..config import CONSISTENCY_BONUS, CONSISTENCY_STREAK_DAYS
+from ..leaderboard import format_leaderboard, generate_leaderboard
+from ..models import Post, User
+from ..scoring import calculate_consistency_bonus, calculate_total_score
+from .mock_data import SyntheticGuild
+
+# Hours before now of the posts of every test user: a day, a week, a month and older
+POST_AGES = (1, 30, 24 * 10, 24 * 40)
+
+
+def build_user(name, now, reactions=1):
+    user = User(name)
+    for hours in POST_AGES:
+        post = Post('image', now - timedelta(hours=hours))
+        for reactor in range(reactions):
+            post.add_reaction('heart', reactor)
+        user.add_post(post)
+    return user
+
+
+@pytest.mark.parametrize('timeframe, posts', [('daily', 1), ('weekly', 2), ('14d', 3), ('monthly', 3),
+                                              ('alltime', 4)])
+@pytest.mark.parametrize('tzinfo', [None, timezone.utc])
+def test_time_frames_rank_naive_and_aware_posts(timeframe, posts, tzinfo):
+    users = [build_user('few', datetime.now(tzinfo)), build_user('many', datetime.now(tzinfo), reactions=3)]
+    rows = generate_leaderboard(users, timeframe)
+    assert [row.user.username for row in rows] == ['many', 'few']
+    assert [row.breakdown['base_post_points'] for row in rows] == [posts, posts]
+
+
+def test_naive_and_aware_users_share_a_board():
+    now = datetime.now(timezone.utc)
+    users = [build_user('naive', datetime.now()), build_user('aware', now, reactions=2)]
+    rows = generate_leaderboard(users, 'weekly', now=now)
+    assert [(row.rank, row.user.username) for row in rows] == [(1, 'aware'), (2, 'naive')]
+
+
+def test_ties_share_a_rank_across_pages():
+    now = datetime.now(timezone.utc)
+    users = [build_user(name, now, reactions) for name, reactions in
+             (('a', 3), ('b', 2), ('c', 2), ('d', 2), ('e', 1))]
+    rows = generate_leaderboard(users, 'alltime', limit=None, now=now)
+    assert [(row.rank, row.user.username) for row in rows] == [(1, 'a'), (2, 'b'), (2, 'c'), (2, 'd'), (5, 'e')]
+    page = generate_leaderboard(users, 'alltime', limit=2, start=2, now=now)
+    assert [(row.rank, row.user.username) for row in page] == [(2, 'c'), (2, 'd')]
+    assert format_leaderboard(page).splitlines()[0] == f"2. c - {rows[2].score:g} points"
+
+
+def test_scores_match_the_reference_functions():
+    now = datetime(2026, 6, 1, tzinfo=timezone.utc)
+    users = list(SyntheticGuild(1500, days=40, seed=3, now=now.timestamp()).build_users().values())
+    rows = generate_leaderboard(users, 'alltime', limit=None, now=now)
+    assert len(rows) == len(users)
+    assert [row.score for row in rows] == sorted((row.score for row in rows), reverse=True)
+    for row in rows:
+        assert row.score == pytest.approx(calculate_total_score(row.user, 'daily', now))
+        assert row.breakdown['total'] == pytest.approx(row.score)
+
+    # A time frame scores a user as if the posts made within it were all of their posts, with
+    # their streak capped at the length of the time frame
+    cutoff = now - timedelta(weeks=1)
+    rows = generate_leaderboard(users, 'weekly', limit=None, now=now)
+    assert {row.user.username for row in rows} == {user.username for user in users if user.count_posts_since(cutoff)}
+    for row in rows:
+        recent = User(row.user.username)
+        for post in row.user.posts:
+            if post.timestamp > cutoff:
+                copy = Post(post.content_type, post.timestamp)
+                copy.reactions = list(post.reactions)
+                recent.add_post(copy)
+        streak = min(recent.current_streak(now), 7)
+        expected = (calculate_total_score(recent, 'daily', now) - calculate_consistency_bonus(recent, now)
+                    + streak // CONSISTENCY_STREAK_DAYS * CONSISTENCY_BONUS)
+        assert row.score == pytest.approx(expected), row.user.username
+
+
+def test_unknown_time_frame():
+    with pytest.raises(ValueError):
+        generate_leaderboard([], 'fortnightly')
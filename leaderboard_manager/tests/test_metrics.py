@@ -0,0 +1,45 @@
+import pytest
+
+from ..metrics import Histogram, Registry
+
+
+def test_counters_with_the_same_labels_are_shared():
+    registry = Registry()
+    registry.counter('crawled_total', 'Messages crawled', guild=1).inc()
+    registry.counter('crawled_total', guild=1).inc(4)
+    registry.counter('crawled_total', guild=2).inc()
+    assert registry.counter('crawled_total', guild=1).value == 5
+    assert registry.counter('crawled_total', guild=2).value == 1
+    with pytest.raises(ValueError):
+        registry.gauge('crawled_total', guild=1)
+
+
+def test_histogram_buckets_include_their_upper_bound():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 1.0, 1.5):
+        histogram.observe(value)
+    assert histogram.counts == [2, 2, 1]
+    samples = list(histogram.samples('latency', ()))
+    assert samples[:3] == [('latency_bucket', (('le', '0.1'),), 2), ('latency_bucket', (('le', '1.0'),), 4),
+                           ('latency_bucket', (('le', '+Inf'),), 5)]
+    assert samples[3:] == [('latency_count', (), 5), ('latency_sum', (), pytest.approx(3.15))]
+
+
+def test_render_labels_and_collectors():
+    registry = Registry()
+    registry.counter('crawled_total', 'Messages crawled', channel='b"\\\n', guild=1).inc(2)
+    registry.histogram('seconds', buckets=(1.0,)).observe(0.5)
+    registry.add_collector(lambda registry: registry.gauge('guilds', 'Guilds').set(3))
+    assert registry.render().splitlines() == [
+        '# HELP crawled_total Messages crawled',
+        '# TYPE crawled_total counter',
+        'crawled_total{channel="b\\"\\\\\\n",guild="1"} 2',
+        '# HELP guilds Guilds',
+        '# TYPE guilds gauge',
+        'guilds 3',
+        '# TYPE seconds histogram',
+        'seconds_bucket{le="1.0"} 1',
+        'seconds_bucket{le="+Inf"} 1',
+        'seconds_count 1',
+        'seconds_sum 0.5',
+    ]
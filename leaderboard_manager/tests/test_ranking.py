@@ -0,0 +1,55 @@
+from ..ranking import Board
+
+# Scores with ties, and the competition ranks they give
+SCORES = {'ada': 10, 'bob': 7, 'cy': 7, 'dee': 7, 'eve': 3, 'fay': 0}
+RANKS = {'ada': 1, 'bob': 2, 'cy': 2, 'dee': 2, 'eve': 5}
+
+
+def test_top_keeps_rank_order():
+    board = Board(SCORES)
+    assert board.top(3) == [('ada', 10), ('bob', 7), ('cy', 7)]
+    assert board.top(3, start=3) == [('dee', 7), ('eve', 3)]
+    assert len(board) == 5 and 'fay' not in board
+
+
+def test_top_follows_score_changes():
+    board = Board(SCORES)
+    version = board.version
+    board.set('eve', 8)
+    assert board.version != version
+    assert board.top(2) == [('ada', 10), ('eve', 8)]
+    board.set('ada', 0)
+    assert 'ada' not in board and board.get('ada') == 0
+    assert board.top(1) == [('eve', 8)]
+    version = board.version
+    board.set('eve', 8)
+    assert board.version == version
+
+
+def test_tied_users_share_a_rank():
+    board = Board(SCORES)
+    assert {user: board.rank_of(user) for user in SCORES} == {**RANKS, 'fay': None}
+
+
+def test_users_around():
+    board = Board(SCORES)
+    assert board.users_around('cy', 1) == [(2, 'bob', 7), (2, 'cy', 7), (2, 'dee', 7)]
+    assert board.users_around('ada', 2) == [(1, 'ada', 10), (2, 'bob', 7), (2, 'cy', 7)]
+    assert board.users_around('eve', 1) == [(2, 'dee', 7), (5, 'eve', 3)]
+    assert board.users_around('fay', 1) == []
+
+
+def test_ranks_follow_score_changes():
+    board = Board(SCORES)
+    board.set('eve', 7)
+    assert board.rank_of('eve') == 2
+    board.set('ada', 7)
+    assert [board.rank_of(user) for user in ('ada', 'bob', 'eve')] == [1, 1, 1]
+    board.set('bob', 0)
+    assert board.rank_of('bob') is None
+
+
+def test_from_ranked_matches_inserting():
+    board = Board.from_ranked(sorted((-score, user) for user, score in SCORES.items()))
+    assert board.top(len(board)) == Board(SCORES).top(len(SCORES))
+    assert {user: board.rank_of(user) for user in RANKS} == RANKS
@@ -0,0 +1,128 @@
+import math
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from ..columnar import COMPONENTS, ColumnarScores, np
+from ..models import Post, User
+from ..scoring import (calculate_base_post_points, calculate_consistency_bonus, calculate_curator_bonus,
+                       calculate_diversity_multiplier, calculate_frequency_decay, calculate_reaction_points,
+                       calculate_score_breakdown, calculate_total_score, calculate_unique_reactor_bonus)
+from .mock_data import SyntheticGuild
+
+# The end of the synthetic guild's span, fixed so that every run scores the same posts
+NOW = datetime(2026, 6, 1, 12, tzinfo=timezone.utc)
+TIME_FRAMES = ('daily', 'weekly', 'monthly', 'alltime')
+
+
+def close(a, b):
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+
+
+def synthetic_users(posts=3000, seed=0):
+    return SyntheticGuild(posts, days=14, seed=seed, now=NOW.timestamp()).build_users()
+
+
+@pytest.fixture(scope='module')
+def users():
+    return list(synthetic_users().values())
+
+
+def reference_breakdown(user, timeframe, now):
+    return {
+        'base_post_points': calculate_base_post_points(user),
+        'reaction_points': calculate_reaction_points(user),
+        'diversity_multiplier': calculate_diversity_multiplier(user),
+        'frequency_decay': calculate_frequency_decay(user, timeframe, now),
+        'unique_reactor_bonus': calculate_unique_reactor_bonus(user),
+        'curator_bonus': calculate_curator_bonus(user),
+        'consistency_bonus': calculate_consistency_bonus(user, now),
+        'total': calculate_total_score(user, timeframe, now),
+    }
+
+
+def test_synthetic_users_exercise_every_component(users):
+    totals = {component: 0 for component in COMPONENTS}
+    for user in users:
+        for component, value in reference_breakdown(user, 'daily', NOW).items():
+            totals[component] += value != (1 if component == 'diversity_multiplier' else 0)
+    assert all(totals.values()), totals
+
+
+@pytest.mark.parametrize('timeframe', TIME_FRAMES)
+def test_breakdown_matches_the_reference(users, timeframe):
+    for user in users:
+        breakdown = calculate_score_breakdown(user, timeframe, NOW)
+        expected = reference_breakdown(user, timeframe, NOW)
+        assert breakdown.keys() == expected.keys()
+        for component, value in expected.items():
+            assert close(breakdown[component], value), (user.username, component)
+
+
+@pytest.mark.parametrize('timeframe', TIME_FRAMES)
+def test_update_score_matches_the_reference(users, timeframe):
+    for user in users:
+        assert close(user.update_score(timeframe, NOW), calculate_total_score(user, timeframe, NOW))
+
+
+def test_update_score_follows_added_and_removed_posts_and_reactions():
+    users = list(synthetic_users(posts=600, seed=1).values())
+    rng = random.Random(0)
+    reactors = list(range(50)) + [reaction.reactor for user in users for post in user.posts
+                                  for reaction in post.reactions]
+    now = NOW
+    for step in range(400):
+        user = rng.choice(users)
+        action = rng.random()
+        if action < 0.2 or not user.posts:
+            hours = rng.choice((0.5, 2, 30, 24 * 8))
+            user.add_post(Post(rng.choice(('image', 'link', 'video')), now - timedelta(hours=hours)))
+        elif action < 0.6:
+            rng.choice(user.posts).add_reaction(rng.choice(('heart', 'wow', 'curator_pick', 'generic')),
+                                                rng.choice(reactors))
+        else:
+            post = rng.choice(user.posts)
+            if post.reactions:
+                reaction = rng.choice(post.reactions)
+                assert post.remove_reaction(reaction.reactor, (reaction.type,)) is not None
+        if step % 50 == 49:
+            # Time passing moves posts out of the frequency decay timeframe and ends streaks
+            now += timedelta(hours=rng.choice((1, 12, 36)))
+        for user in users:
+            assert close(user.update_score('daily', now), calculate_total_score(user, 'daily', now)), step
+
+
+def test_update_score_follows_a_post_without_reactions():
+    # Neither the recent post count nor the streak changes, only the post count and diversity
+    user = User('user')
+    user.add_post(Post('image', NOW - timedelta(days=3)))
+    user.update_score('daily', NOW)
+    user.add_post(Post('link', NOW - timedelta(days=3, hours=1)))
+    assert close(user.update_score('daily', NOW), calculate_total_score(user, 'daily', NOW))
+
+
+def test_update_score_follows_a_changed_content_type():
+    user = User('user')
+    user.add_post(Post('image', NOW - timedelta(days=3)))
+    post = Post('image', NOW - timedelta(days=3, hours=1))
+    user.add_post(post)
+    user.update_score('daily', NOW)
+    post.content_type = 'link'
+    assert user.content_types == {'image': 1, 'link': 1}
+    assert close(user.update_score('daily', NOW), calculate_total_score(user, 'daily', NOW))
+
+
+@pytest.mark.parametrize('use_numpy', [
+    False, pytest.param(True, marks=pytest.mark.skipif(np is None, reason="NumPy is not installed"))])
+@pytest.mark.parametrize('timeframe', TIME_FRAMES)
+def test_columnar_scores_match_the_reference(users, use_numpy, timeframe):
+    columns = ColumnarScores.from_users(users, use_numpy=use_numpy)
+    assert columns.use_numpy is use_numpy
+    breakdown = columns.breakdown(timeframe, NOW)
+    by_name = {user.username: user for user in users}
+    for index, username in enumerate(columns.usernames):
+        expected = calculate_score_breakdown(by_name[username], timeframe, NOW)
+        for component in COMPONENTS:
+            assert close(float(breakdown[component][index]), expected[component]), (username, component)
+    assert columns.scores(timeframe, NOW).keys() == by_name.keys()
@@ -0,0 +1,35 @@
+import pytest
+
+from ..ranking import Board
+from ..snapshots import Snapshot, rank_movements
+
+
+def test_snapshot_ranks_ties_like_the_board():
+    board = Board({'ada': 10.004, 'bob': 7.5, 'cy': 7.5, 'dee': 1})
+    snapshot = Snapshot.from_board(board, 100.0)
+    assert snapshot.top(4) == [(1, 'ada', 10.0), (2, 'bob', 7.5), (2, 'cy', 7.5), (4, 'dee', 1.0)]
+    assert snapshot.rank_map() == {user: board.rank_of(user) for user in board.scores}
+
+
+@pytest.mark.parametrize('scores', [
+    {},
+    {'ada': 1},
+    {'ada': 10, 'bob': 7.25, 'cy': 7.25, 'dee': 0.01, 'ünï 🎨': 3},
+    {f"user{index}": 1000 - index // 3 * 0.5 for index in range(1000)},
+])
+def test_encode_round_trips(scores):
+    snapshot = Snapshot.from_board(Board(scores), 1700000000.5)
+    decoded = Snapshot.decode(snapshot.taken_at, *snapshot.encode())
+    assert decoded.taken_at == snapshot.taken_at
+    assert decoded.users == snapshot.users
+    assert decoded.ranks == snapshot.ranks
+    assert decoded.scores == snapshot.scores
+
+
+def test_rank_movements_compare_snapshots():
+    previous = Snapshot.from_board(Board({'ada': 10, 'bob': 7, 'cy': 5}), 1.0)
+    current = Snapshot.from_board(Board({'ada': 10, 'bob': 4, 'cy': 5, 'dee': 6}), 2.0)
+    assert current.users == ['ada', 'dee', 'cy', 'bob']
+    assert rank_movements(previous, current) == [0, None, 0, -2]
+    assert rank_movements(previous.rank_map(), current) == [0, None, 0, -2]
+    assert rank_movements(None, current) == [None] * 4
@@ -0,0 +1,62 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from ..ingest import PostBatch
+from ..models import Post
+from ..store import MessageStore
+
+NOW = datetime(2026, 6, 1, 12, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def store():
+    # Posts of three channels with interleaved message ids, so that pages of the first two
+    # span reactions of the third
+    rng = random.Random(0)
+    batch = PostBatch()
+    for message_id in rng.sample(range(1, 1000), 200):
+        post = Post(rng.choice(('image', 'link', 'video')), NOW - timedelta(minutes=message_id))
+        for _ in range(rng.randrange(4)):
+            post.add_reaction(rng.choice(('heart', 'wow', 'curator_pick')), rng.choice((None, 1, 2, 3)))
+        batch.append(message_id, rng.choice((10, 20, 30)), f"user{rng.randrange(5)}", post)
+    store = MessageStore(':memory:')
+    store.save_batch(batch)
+    store.commit()
+    return store
+
+
+def rows(batch):
+    return [(message_id, channel_id, user, post.content_type, post.timestamp,
+             sorted((reaction.type, reaction.reactor or 0) for reaction in post.reactions))
+            for message_id, channel_id, user, post in zip(batch.message_ids, batch.channel_ids, batch.authors,
+                                                          batch.posts)]
+
+
+@pytest.mark.parametrize('limit', [1, 7, 50, 1000])
+def test_paged_loads_match_a_full_load(store, limit):
+    full = rows(store.load_posts([10, 20]))
+    assert full and {row[1] for row in full} == {10, 20}
+    assert [row[0] for row in full] == sorted(row[0] for row in full)
+    paged = []
+    after = None
+    while True:
+        batch = store.load_posts([10, 20], after, limit)
+        if not batch:
+            break
+        assert len(batch) <= limit
+        paged.extend(rows(batch))
+        after = batch.message_ids[-1]
+    assert paged == full
+
+
+def test_checkpoints_never_move_backwards():
+    store = MessageStore(':memory:')
+    assert store.get_checkpoint(10) is None
+    store.set_checkpoint(10, 50)
+    store.set_checkpoint(10, 30)
+    assert store.get_checkpoint(10) == 50
+    store.set_checkpoint(10, 70)
+    store.set_checkpoint(20, 5)
+    assert (store.get_checkpoint(10), store.get_checkpoint(20)) == (70, 5)
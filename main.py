@@ -51,8 +51,9 @@ async def main():
     load_dotenv()
     logging.info("Environment variables loaded.")
 
-    # Initialize the bot
-    client = commands.Bot(command_prefix="/", intents=INTENTS)
+    # Initialize the bot. AutoShardedBot asks Discord for the recommended number of shards,
+    # so the same bot can serve many guilds with one gateway connection per shard.
+    client = commands.AutoShardedBot(command_prefix="/", intents=INTENTS)
     logging.info("Bot initialized.")
 
     # import matplotlib.pyplot as plt